@@ -0,0 +1,4 @@
+"""
+Offline benchmark harness: synthetic mailboxes, local IMAP/SMTP stand-ins and a
+fake OpenAI-compatible endpoint. Run with ``python -m benchmarks.run``.
+"""
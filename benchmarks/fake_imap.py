@@ -0,0 +1,325 @@
+"""
+Minimal in-process IMAP4rev1 server for benchmarks.
+
+Implements just what EmailReceiver uses: LOGIN, SELECT (with UIDVALIDITY),
+UID SEARCH (ALL / UNSEEN / UID ranges), UID FETCH (UID, FLAGS, RFC822,
+BODYSTRUCTURE, BODY[.PEEK][section]<partial>), UID STORE +FLAGS, IDLE, NOOP,
+CLOSE and LOGOUT. An optional per-command delay simulates network latency.
+While a client is in IDLE, messages appended to the mailbox are announced
+with EXISTS; drop_connections() simulates a server-side disconnect.
+"""
+
+import email
+import re
+import select
+import socket
+import socketserver
+import threading
+import time
+from email.message import Message
+from typing import Dict, List, Optional
+
+_COMMAND_RE = re.compile(r"^(\S+) (?:(UID) )?(\S+)(?: (.*))?$", re.IGNORECASE)
+_FETCH_ITEM_RE = re.compile(
+    r"BODY(?P<peek>\.PEEK)?\[(?P<section>[^\]]*)\](?:<(?P<start>\d+)\.(?P<length>\d+)>)?"
+    r"|RFC822\.SIZE|RFC822|BODYSTRUCTURE|FLAGS|UID",
+    re.IGNORECASE,
+)
+
+
+def _quote(value: Optional[str]) -> str:
+    if value is None:
+        return "NIL"
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _parse_set(message_set: str, highest: int) -> set:
+    """Expand an IMAP sequence set such as ``1:5,9,12:*``."""
+    result = set()
+    for part in message_set.split(","):
+        lo, _, hi = part.partition(":")
+        lo = highest if lo == "*" else int(lo)
+        hi = lo if not hi else (highest if hi == "*" else int(hi))
+        lo, hi = min(lo, hi), max(lo, hi)
+        result.update(range(lo, hi + 1))
+    return result
+
+
+def _raw_payload(part: Message) -> bytes:
+    payload = part.get_payload()
+    if isinstance(payload, list):
+        return b""
+    return payload.encode("ascii", "surrogateescape")
+
+
+def _bodystructure(part: Message) -> str:
+    """Render a BODYSTRUCTURE (without envelope data for message/rfc822)."""
+    if part.is_multipart():
+        children = "".join(_bodystructure(child) for child in part.get_payload())
+        return f"({children} {_quote(part.get_content_subtype().upper())})"
+
+    params = [(key.upper(), value) for key, value in part.get_params(header="content-type")[1:]]
+    params_text = "(" + " ".join(f"{_quote(k)} {_quote(v)}" for k, v in params) + ")" if params else "NIL"
+    encoding = (part.get("Content-Transfer-Encoding") or "7bit").upper()
+    payload = _raw_payload(part)
+    fields = [
+        _quote(part.get_content_maintype().upper()), _quote(part.get_content_subtype().upper()),
+        params_text, "NIL", "NIL", _quote(encoding), str(len(payload)),
+    ]
+    if part.get_content_maintype() == "text":
+        fields.append(str(payload.count(b"\n") + 1))
+    disposition = part.get_content_disposition()
+    if disposition:
+        filename = part.get_filename()
+        disposition_params = f"({_quote('FILENAME')} {_quote(filename)})" if filename else "NIL"
+        disposition_text = f"({_quote(disposition.upper())} {disposition_params})"
+    else:
+        disposition_text = "NIL"
+    fields += ["NIL", disposition_text, "NIL"]
+    return "(" + " ".join(fields) + ")"
+
+
+def _section(msg: Message, section: str) -> bytes:
+    """Return the raw bytes of a BODY[section] fetch."""
+    upper = section.upper()
+    if upper.startswith("HEADER.FIELDS"):
+        wanted = {name.lower() for name in re.findall(r"[\w-]+", upper[len("HEADER.FIELDS"):])}
+        lines = [f"{name}: {value}" for name, value in msg.items() if name.lower() in wanted]
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("utf-8", "surrogateescape")
+    if upper in ("", "TEXT"):
+        raw = msg.as_bytes()
+        return raw if upper == "" else raw.split(b"\n\n", 1)[-1]
+
+    part = msg
+    for index in section.split("."):
+        if part.is_multipart():
+            part = part.get_payload()[int(index) - 1]
+        elif index != "1":
+            return b""
+    return _raw_payload(part)
+
+
+class FakeMailbox:
+    """Thread-safe message store shared by all connections."""
+
+    def __init__(self, messages: List[bytes], uidvalidity: int = 1):
+        self.uidvalidity = uidvalidity
+        self.lock = threading.Lock()
+        self.messages: List[Dict] = []
+        for raw in messages:
+            self.append(raw)
+
+    def append(self, raw: bytes) -> int:
+        with self.lock:
+            uid = self.messages[-1]["uid"] + 1 if self.messages else 1
+            self.messages.append({"uid": uid, "raw": raw, "msg": email.message_from_bytes(raw), "seen": False})
+            return uid
+
+    def reset_flags(self):
+        with self.lock:
+            for message in self.messages:
+                message["seen"] = False
+
+
+class _IMAPHandler(socketserver.StreamRequestHandler):
+    def send(self, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.wfile.write(data)
+
+    def handle(self):
+        mailbox: FakeMailbox = self.server.mailbox
+        with self.server.lock:
+            self.server.connections.add(self.connection)
+        try:
+            self._serve(mailbox)
+        except OSError:
+            pass
+        finally:
+            with self.server.lock:
+                self.server.connections.discard(self.connection)
+
+    def _serve(self, mailbox: FakeMailbox):
+        self.send("* OK [CAPABILITY IMAP4rev1 UIDPLUS IDLE] fake IMAP ready\r\n")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            match = _COMMAND_RE.match(line.decode("utf-8", "replace").rstrip("\r\n"))
+            if not match:
+                self.send("* BAD malformed command\r\n")
+                continue
+            tag, uid_prefix, command, args = match.group(1), match.group(2), match.group(3).upper(), match.group(4) or ""
+            if self.server.latency:
+                time.sleep(self.server.latency)
+            self.server.commands += 1
+
+            if command == "CAPABILITY":
+                self.send(f"* CAPABILITY IMAP4rev1 UIDPLUS IDLE\r\n{tag} OK CAPABILITY completed\r\n")
+            elif command == "LOGIN":
+                self.send(f"{tag} OK LOGIN completed\r\n")
+            elif command in ("SELECT", "EXAMINE"):
+                with mailbox.lock:
+                    exists = len(mailbox.messages)
+                    next_uid = mailbox.messages[-1]["uid"] + 1 if mailbox.messages else 1
+                self.send(f"* {exists} EXISTS\r\n* 0 RECENT\r\n"
+                          f"* OK [UIDVALIDITY {mailbox.uidvalidity}] UIDs valid\r\n"
+                          f"* OK [UIDNEXT {next_uid}] next UID\r\n"
+                          f"{tag} OK [READ-WRITE] {command} completed\r\n")
+            elif command == "SEARCH":
+                self.send(f"* SEARCH {' '.join(map(str, self._search(mailbox, args, bool(uid_prefix))))}\r\n"
+                          f"{tag} OK SEARCH completed\r\n")
+            elif command == "FETCH":
+                self._fetch(mailbox, tag, args, bool(uid_prefix))
+            elif command == "STORE":
+                self._store(mailbox, args, bool(uid_prefix))
+                self.send(f"{tag} OK STORE completed\r\n")
+            elif command == "IDLE":
+                if not self._idle(mailbox, tag):
+                    return
+            elif command in ("NOOP", "CLOSE", "CHECK"):
+                self.send(f"{tag} OK {command} completed\r\n")
+            elif command == "LOGOUT":
+                self.send(f"* BYE logging out\r\n{tag} OK LOGOUT completed\r\n")
+                return
+            else:
+                self.send(f"{tag} BAD unsupported command {command}\r\n")
+
+    def _idle(self, mailbox: FakeMailbox, tag: str) -> bool:
+        """Announce new messages until the client sends DONE; False if it disconnected."""
+        with mailbox.lock:
+            known = len(mailbox.messages)
+        self.send("+ idling\r\n")
+        while True:
+            readable, _, _ = select.select([self.connection], [], [], 0.05)
+            if readable:
+                line = self.rfile.readline()
+                if not line:
+                    return False
+                if line.strip().upper() == b"DONE":
+                    self.send(f"{tag} OK IDLE terminated\r\n")
+                    return True
+                self.send("* BAD expected DONE\r\n")
+            with mailbox.lock:
+                exists = len(mailbox.messages)
+            if exists != known:
+                self.send(f"* {exists} EXISTS\r\n")
+                known = exists
+
+    def _select(self, mailbox: FakeMailbox, message_set: str, by_uid: bool) -> List[tuple]:
+        """Return (sequence number, message) pairs matching ``message_set``."""
+        with mailbox.lock:
+            messages = list(mailbox.messages)
+        if not messages:
+            return []
+        highest = messages[-1]["uid"] if by_uid else len(messages)
+        wanted = _parse_set(message_set, highest)
+        return [
+            (number, message) for number, message in enumerate(messages, start=1)
+            if (message["uid"] if by_uid else number) in wanted
+        ]
+
+    def _search(self, mailbox: FakeMailbox, criteria: str, by_uid: bool) -> List[int]:
+        tokens = criteria.upper().split()
+        matches = self._select(mailbox, "1:*", by_uid=False)
+        index = 0
+        while index < len(tokens):
+            token = tokens[index]
+            if token == "UNSEEN":
+                matches = [(n, m) for n, m in matches if not m["seen"]]
+            elif token == "SEEN":
+                matches = [(n, m) for n, m in matches if m["seen"]]
+            elif token == "UID":
+                index += 1
+                highest = matches[-1][1]["uid"] if matches else 0
+                # Like real servers, "n:*" still matches the highest UID
+                wanted = _parse_set(tokens[index], max(highest, 1))
+                matches = [(n, m) for n, m in matches if m["uid"] in wanted]
+            index += 1
+        return [m["uid"] if by_uid else n for n, m in matches]
+
+    def _fetch(self, mailbox: FakeMailbox, tag: str, args: str, by_uid: bool):
+        message_set, _, items = args.partition(" ")
+        requested = list(_FETCH_ITEM_RE.finditer(items))
+        for number, message in self._select(mailbox, message_set, by_uid):
+            parts = []
+            if by_uid:
+                parts.append(f"UID {message['uid']}".encode())
+            for item in requested:
+                name = item.group(0).upper()
+                if name == "UID":
+                    if not by_uid:
+                        parts.append(f"UID {message['uid']}".encode())
+                elif name == "FLAGS":
+                    parts.append(b"FLAGS (\\Seen)" if message["seen"] else b"FLAGS ()")
+                elif name == "RFC822.SIZE":
+                    parts.append(f"RFC822.SIZE {len(message['raw'])}".encode())
+                elif name == "RFC822":
+                    message["seen"] = True
+                    parts.append(b"RFC822 {%d}\r\n" % len(message["raw"]) + message["raw"])
+                elif name == "BODYSTRUCTURE":
+                    parts.append(b"BODYSTRUCTURE " + _bodystructure(message["msg"]).encode("utf-8"))
+                else:
+                    section = item.group("section")
+                    data = message["raw"] if section == "" else _section(message["msg"], section)
+                    label = f"BODY[{section}]"
+                    if item.group("start") is not None:
+                        start = int(item.group("start"))
+                        data = data[start:start + int(item.group("length"))]
+                        label += f"<{start}>"
+                    if not item.group("peek"):
+                        message["seen"] = True
+                    parts.append(label.encode() + b" {%d}\r\n" % len(data) + data)
+            self.send(b"* %d FETCH (" % number + b" ".join(parts) + b")\r\n")
+        self.send(f"{tag} OK FETCH completed\r\n")
+
+    def _store(self, mailbox: FakeMailbox, args: str, by_uid: bool):
+        message_set, _, change = args.partition(" ")
+        change = change.upper()
+        if "\\SEEN" not in change:
+            return
+        for _, message in self._select(mailbox, message_set, by_uid):
+            message["seen"] = not change.startswith("-")
+
+
+class FakeIMAPServer(socketserver.ThreadingTCPServer):
+    """
+    Serve a FakeMailbox on 127.0.0.1
+
+    Usage:
+        server = FakeIMAPServer(FakeMailbox(raw_messages), latency_ms=20)
+        server.start()  # IMAP_SERVER=127.0.0.1 IMAP_PORT=server.port IMAP_USE_SSL=false
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, mailbox: FakeMailbox, latency_ms: float = 0.0, port: int = 0):
+        super().__init__(("127.0.0.1", port), _IMAPHandler)
+        self.mailbox = mailbox
+        self.latency = latency_ms / 1000.0
+        self.commands = 0
+        self.lock = threading.Lock()
+        self.connections = set()
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def start(self) -> "FakeIMAPServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def drop_connections(self):
+        """Close every client connection without a BYE, like a server restart or a NAT timeout."""
+        with self.lock:
+            connections = list(self.connections)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,138 @@
+"""
+Fake OpenAI-compatible chat completions endpoint for benchmarks.
+
+Answers classification (single and batched), combined classify + reply and
+reply prompts with well-formed responses, after a configurable latency.
+A configurable share of requests fails with HTTP 500 or 429 so fallback paths
+are exercised. Point the pipeline at it with OPENAI_API_BASE=server.api_base.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Keyword hints used to pick a plausible category for the synthetic mailbox
+_HINTS = (
+    ("Technical Issue", ("crash", "error", "not working", "broken", "闪退", "错误")),
+    ("Billing & Payment", ("charged", "invoice", "refund", "payment", "扣费", "发票", "paiement", "facture")),
+    ("Product Inquiry", ("what is", "how does", "specifications", "哪些功能")),
+    ("Feature Request", ("add a", "would like a", "implement", "深色模式")),
+)
+_EMAIL_SECTION_RE = re.compile(r"### Email (\d+)\n(.*?)(?=\n### Email \d+\n|\Z)", re.S)
+
+
+def _guess_category(text: str) -> str:
+    text = text.lower()
+    for category, hints in _HINTS:
+        if any(hint in text for hint in hints):
+            return category
+    return "Other"
+
+
+def _email_text(prompt: str) -> str:
+    """The part of a prompt after the email subject, so instructions don't skew the guess."""
+    for marker in ("Email Subject:", "原始主题："):
+        if marker in prompt:
+            return prompt[prompt.index(marker):]
+    return prompt
+
+
+def _answer(prompt: str) -> str:
+    """Build the assistant message the pipeline expects for this prompt."""
+    if "### Email 1" in prompt:
+        return json.dumps([
+            {"id": int(number), "category": _guess_category(section), "confidence": 0.9}
+            for number, section in _EMAIL_SECTION_RE.findall(prompt)
+        ])
+    if '"reply"' in prompt:
+        return json.dumps({
+            "category": _guess_category(_email_text(prompt)), "confidence": 0.9,
+            "reply": "您好，感谢您的来信。我们已收到您的问题，将尽快处理并回复您。\n\nCustomer Support Team",
+        }, ensure_ascii=False)
+    if '"category"' in prompt:
+        return json.dumps({"category": _guess_category(_email_text(prompt)), "confidence": 0.9})
+    return "您好，感谢您的来信。我们已收到您的问题，将尽快处理并回复您。\n\nCustomer Support Team"
+
+
+class _ChatHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server: "FakeLLMServer" = self.server
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with server.lock:
+            server.requests += 1
+            delay = max(0.0, server.random.gauss(server.latency, server.jitter))
+            fail = server.random.random() < server.error_rate
+            status = server.random.choice((500, 429))
+        time.sleep(delay)
+
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"unknown path {self.path}", "type": "invalid_request_error"}})
+            return
+        if fail:
+            with server.lock:
+                server.errors += 1
+            self._send_json(status, {"error": {"message": "injected failure", "type": "server_error"}})
+            return
+
+        prompt = "\n".join(message.get("content", "") for message in request.get("messages", []))
+        content = _answer(prompt)
+        self._send_json(200, {
+            "id": f"chatcmpl-bench-{server.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                      "total_tokens": (len(prompt) + len(content)) // 4},
+        })
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    """
+    Serve /v1/chat/completions on 127.0.0.1
+
+    Args:
+        latency_ms: Mean response delay
+        jitter_ms: Standard deviation of the delay
+        error_rate: Share of requests answered with HTTP 500/429
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, latency_ms: float = 300.0, jitter_ms: float = 50.0, error_rate: float = 0.0,
+                 port: int = 0, seed: int = 0):
+        super().__init__(("127.0.0.1", port), _ChatHandler)
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    @property
+    def api_base(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def start(self) -> "FakeLLMServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,92 @@
+"""
+Minimal in-process SMTP server for benchmarks.
+
+Accepts EHLO/HELO, AUTH PLAIN/LOGIN, MAIL, RCPT, DATA, RSET, NOOP and QUIT
+without TLS (run the sender with SMTP_USE_TLS=false). Messages are counted,
+not stored. Optional per-command latency and a transient failure rate on
+DATA (451) exercise retry paths.
+"""
+
+import random
+import socketserver
+import threading
+import time
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, text: str):
+        self.wfile.write(text.encode("ascii") + b"\r\n")
+
+    def handle(self):
+        server: "FakeSMTPServer" = self.server
+        self.reply("220 fake SMTP ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("utf-8", "replace").strip()
+            verb = command.split(" ", 1)[0].upper()
+            if server.latency:
+                time.sleep(server.latency)
+
+            if verb == "EHLO":
+                self.wfile.write(b"250-fake\r\n250-AUTH PLAIN LOGIN\r\n250-8BITMIME\r\n250 SIZE 52428800\r\n")
+            elif verb == "HELO":
+                self.reply("250 fake")
+            elif verb == "AUTH":
+                if command.upper().startswith("AUTH LOGIN"):
+                    # Username and password arrive on the following lines
+                    self.reply("334 VXNlcm5hbWU6")
+                    self.rfile.readline()
+                    self.reply("334 UGFzc3dvcmQ6")
+                    self.rfile.readline()
+                self.reply("235 2.7.0 Authentication successful")
+            elif verb in ("MAIL", "RCPT", "RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b".\n", b""):
+                    pass
+                if server.error_rate and server.random.random() < server.error_rate:
+                    self.reply("451 4.3.0 Temporary failure, try again later")
+                    continue
+                with server.lock:
+                    server.delivered += 1
+                self.reply("250 OK queued")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+    """
+    Serve SMTP on 127.0.0.1
+
+    Usage:
+        server = FakeSMTPServer(latency_ms=5).start()  # SMTP_SERVER=127.0.0.1 SMTP_PORT=server.port
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, latency_ms: float = 0.0, error_rate: float = 0.0, port: int = 0, seed: int = 0):
+        super().__init__(("127.0.0.1", port), _SMTPHandler)
+        self.latency = latency_ms / 1000.0
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.delivered = 0
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def start(self) -> "FakeSMTPServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
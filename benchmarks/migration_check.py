@@ -0,0 +1,99 @@
+"""
+Offline check that upgrading an old review database keeps every row.
+
+Builds an email_reviews table the way the original code wrote it (no unique
+index, email_id = per-session IMAP sequence number, so two daily runs both
+hold ids 1-3), opens it with the current ReviewDatabase and verifies that no
+row or review decision was dropped:
+
+    python -m benchmarks.migration_check
+
+Exits non-zero on failure.
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+
+# Schema and rows as written before saves became upserts
+_BASELINE_SCHEMA = """
+CREATE TABLE email_reviews (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    email_id TEXT,
+    sender TEXT,
+    subject TEXT,
+    category TEXT,
+    confidence REAL,
+    original_body TEXT,
+    suggested_reply TEXT,
+    status TEXT,
+    reviewer_notes TEXT,
+    received_date TEXT,
+    risk_flag TEXT,
+    created_at TEXT
+)
+"""
+_BASELINE_ROWS = [
+    # (email_id, sender, subject, status, created_at)
+    ("1", "alice@example.com", "Refund for order 1001", "approved", "2024-05-01T09:00:00"),
+    ("2", "bob@example.com", "Where is my parcel", "pending_review", "2024-05-01T09:00:00"),
+    ("3", "carol@example.com", "Invoice request", "rejected", "2024-05-01T09:00:00"),
+    ("1", "dave@example.com", "Broken zipper", "pending_review", "2024-05-02T09:00:00"),
+    ("2", "erin@example.com", "Change address", "approved", "2024-05-02T09:00:00"),
+    ("3", "frank@example.com", "Size exchange", "pending_review", "2024-05-02T09:00:00"),
+    ("4", "grace@example.com", "Only once", "pending_review", "2024-05-02T09:00:00"),
+]
+
+
+def _write_baseline_db(path: str):
+    conn = sqlite3.connect(path)
+    conn.execute(_BASELINE_SCHEMA)
+    conn.executemany(
+        "INSERT INTO email_reviews (email_id, sender, subject, status, created_at) VALUES (?, ?, ?, ?, ?)",
+        _BASELINE_ROWS,
+    )
+    conn.commit()
+    conn.close()
+
+
+def run_check() -> list:
+    """Return a list of failure messages (empty when the upgrade kept everything)."""
+    from review_database import ReviewDatabase
+
+    failures = []
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "baseline.db")
+        _write_baseline_db(path)
+        db = ReviewDatabase(path)
+        # Opening twice must not rewrite ids again
+        db.close()
+        db = ReviewDatabase(path)
+        with db._connect() as conn:
+            rows = conn.execute("SELECT email_id, sender, status FROM email_reviews ORDER BY id").fetchall()
+        db.close()
+
+    if len(rows) != len(_BASELINE_ROWS):
+        failures.append(f"expected {len(_BASELINE_ROWS)} rows after upgrade, found {len(rows)}")
+    expected = [(sender, status) for _, sender, _, status, _ in _BASELINE_ROWS]
+    if [(sender, status) for _, sender, status in rows] != expected:
+        failures.append(f"senders/statuses changed: {rows}")
+    ids = [email_id for email_id, _, _ in rows]
+    if len(set(ids)) != len(ids):
+        failures.append(f"email_ids still repeat: {ids}")
+    if "4" not in ids:
+        failures.append("an email_id that never repeated was rewritten")
+    return failures
+
+
+def main() -> int:
+    failures = run_check()
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print(f"OK: upgrade kept all {len(_BASELINE_ROWS)} baseline rows")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,362 @@
+"""
+Offline benchmark runner.
+
+Generates a synthetic mailbox, serves it from a local IMAP server, points the
+pipeline at a local SMTP server and a fake OpenAI-compatible endpoint, then
+times each stage and the full run_daily_pipeline:
+
+    python -m benchmarks.run --emails 300 --llm-latency-ms 200 --save-baseline main
+    python -m benchmarks.run --emails 300 --llm-latency-ms 200 --compare main
+
+Run it as its own process: config.py reads the environment at import, so the
+pipeline modules are imported only after the stand-in servers are configured.
+Latency samples are per unit of work: one email for fetch, one request for
+classify (a whole batch when LLM_CLASSIFY_BATCH_SIZE > 1), one reply, one
+save_reviews batch for persist and one SMTP message for send.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.fake_imap import FakeIMAPServer, FakeMailbox
+from benchmarks.fake_llm import FakeLLMServer
+from benchmarks.fake_smtp import FakeSMTPServer
+from benchmarks.synthetic_mailbox import CHARSETS, LAYOUTS, SIZES, generate_messages
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+STAGES = ("fetch_full", "fetch_partial", "classify", "reply", "persist", "send", "pipeline")
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+def _rss_bytes() -> int:
+    """Current resident set size; falls back to the (monotonic) peak where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class _RSSSampler:
+    """Track the peak RSS of the process while a stage runs, sampling every ``interval`` seconds."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak = _rss_bytes()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, _rss_bytes())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _rss_bytes())
+
+
+def _measure(name: str, emails: int, work: Callable[[Callable[[float], None]], None],
+             trace_memory: bool = False) -> Dict:
+    """
+    Time ``work(record)`` and collect the latencies it records
+
+    Peak memory is the process RSS peak during the stage. With ``trace_memory``
+    the tracemalloc peak of Python allocations is reported too; tracing slows
+    allocation-heavy stages considerably, so timings from such runs should not
+    be compared with untraced ones.
+    """
+    samples = []
+    if trace_memory:
+        tracemalloc.start()
+    with _RSSSampler() as rss:
+        start = time.perf_counter()
+        work(samples.append)
+        elapsed = time.perf_counter() - start
+    result = {
+        "stage": name,
+        "emails": emails,
+        "seconds": round(elapsed, 4),
+        "emails_per_sec": round(emails / elapsed, 2) if elapsed else None,
+        "p50_ms": _ms(_percentile(samples, 0.50)),
+        "p99_ms": _ms(_percentile(samples, 0.99)),
+        "peak_rss_mb": round(rss.peak / 1e6, 1),
+    }
+    if trace_memory:
+        result["traced_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 1e6, 2)
+        tracemalloc.stop()
+    return result
+
+
+def _configure_environment(args, workdir: str, imap: FakeIMAPServer, smtp: FakeSMTPServer, llm: FakeLLMServer):
+    os.environ.update({
+        "IMAP_SERVER": "127.0.0.1",
+        "IMAP_PORT": str(imap.port),
+        "IMAP_USE_SSL": "false",
+        "SMTP_SERVER": "127.0.0.1",
+        "SMTP_PORT": str(smtp.port),
+        "SMTP_USE_TLS": "false",
+        "EMAIL_ADDRESS": "bench@example.com",
+        "EMAIL_APP_PASSWORD": "bench",
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_API_BASE": llm.api_base,
+        "DATA_DIR": os.path.join(workdir, "data"),
+        "CSV_OUTPUT_DIR": os.path.join(workdir, "review_output"),
+        "PIPELINE_CONCURRENCY": str(args.concurrency),
+    })
+    os.environ.pop("SQLITE_DB_PATH", None)
+    os.environ.pop("LLM_CACHE_PATH", None)
+    if not args.cache:
+        os.environ["LLM_CACHE_ENABLED"] = "false"
+
+
+def run_benchmarks(args) -> Dict:
+    messages = generate_messages(args.emails, seed=args.seed, sizes=args.sizes, charsets=args.charsets,
+                                 layouts=args.layouts, attachment_kb=args.attachment_kb)
+    mailbox = FakeMailbox([message["raw"] for message in messages])
+    imap = FakeIMAPServer(mailbox, latency_ms=args.imap_latency_ms).start()
+    smtp = FakeSMTPServer(latency_ms=args.smtp_latency_ms, error_rate=args.smtp_error_rate).start()
+    llm = FakeLLMServer(latency_ms=args.llm_latency_ms, jitter_ms=args.llm_jitter_ms,
+                        error_rate=args.llm_error_rate).start()
+    workdir = tempfile.mkdtemp(prefix="aftersale-bench-")
+    _configure_environment(args, workdir, imap, smtp, llm)
+
+    # Imported only now so config.py sees the stand-in servers
+    from config import LLM_CLASSIFY_BATCH_SIZE, PIPELINE_PERSIST_BATCH
+    from email_classifier import EmailClassifier
+    from email_receiver import EmailReceiver
+    from email_reply_generator import ReplyGenerator
+    from email_sender import EmailSender, approved_reply_messages
+    from main import run_daily_pipeline
+    from review_database import ReviewDatabase
+    try:
+        # Import up front so the client's import time is not charged to the first stage
+        import openai  # noqa: F401
+    except ImportError:
+        print("⚠️  openai is not installed: LLM stages will measure the rule-based fallback")
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    stages = [stage for stage in STAGES if stage in args.stages]
+    results = []
+    fetched: List[Dict] = []
+    reviews: List[Dict] = []
+
+    def fetch(mode: str):
+        def work(record):
+            mailbox.reset_flags()
+            receiver = EmailReceiver()
+            receiver.connect()
+            try:
+                last = time.perf_counter()
+                for email in receiver.iter_emails(incremental=False, fetch_mode=mode):
+                    now = time.perf_counter()
+                    record(now - last)
+                    last = now
+                    if mode == "full":
+                        fetched.append(email)
+            finally:
+                receiver.disconnect()
+        return work
+
+    def need_emails():
+        if not fetched:
+            fetch("full")(lambda latency: None)
+        return fetched
+
+    if "fetch_full" in stages:
+        results.append(_measure("fetch_full", args.emails, fetch("full"), args.trace_memory))
+    if "fetch_partial" in stages:
+        results.append(_measure("fetch_partial", args.emails, fetch("partial"), args.trace_memory))
+
+    if {"classify", "reply", "persist", "send"} & set(stages):
+        emails = need_emails()
+        classifier = EmailClassifier(use_llm=True)
+        reply_generator = ReplyGenerator()
+
+        def timed(func):
+            def call(*call_args):
+                start = time.perf_counter()
+                value = func(*call_args)
+                return value, time.perf_counter() - start
+            return call
+
+        def classify(record):
+            chunks = [emails[i:i + LLM_CLASSIFY_BATCH_SIZE] for i in range(0, len(emails), LLM_CLASSIFY_BATCH_SIZE)]
+            call = timed(lambda chunk: classifier.classify_batch(
+                [(email.get("subject", ""), email.get("body", "")) for email in chunk]
+            ))
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                for chunk, (classified, latency) in zip(chunks, pool.map(call, chunks)):
+                    record(latency)
+                    for email, (category, confidence) in zip(chunk, classified):
+                        reviews.append({**email, "category": category, "confidence": confidence,
+                                        "risk_flag": "low"})
+
+        def reply(record):
+            call = timed(lambda review: reply_generator.generate_reply(review, review["category"], use_llm=True))
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                for review, (text, latency) in zip(reviews, pool.map(call, reviews)):
+                    record(latency)
+                    review["reply"] = text
+
+        # Later stages need classified and drafted reviews even when these stages are not reported
+        for name, work in (("classify", classify), ("reply", reply)):
+            if name in stages:
+                results.append(_measure(name, len(emails), work, args.trace_memory))
+            else:
+                work(lambda latency: None)
+
+        if "persist" in stages:
+            db = ReviewDatabase(os.path.join(workdir, "persist.db"))
+
+            def persist(record):
+                for start in range(0, len(reviews), PIPELINE_PERSIST_BATCH):
+                    began = time.perf_counter()
+                    db.save_reviews(reviews[start:start + PIPELINE_PERSIST_BATCH])
+                    record(time.perf_counter() - began)
+            results.append(_measure("persist", len(reviews), persist, args.trace_memory))
+
+        if "send" in stages:
+            outgoing = approved_reply_messages(
+                {"email_id": review["id"], "from": review.get("from", ""), "subject": review.get("subject", ""),
+                 "suggested_reply": review.get("reply", "")}
+                for review in reviews
+            )
+
+            def send(record):
+                sender = EmailSender()
+                try:
+                    for message in outgoing:
+                        began = time.perf_counter()
+                        sender.deliver(message)
+                        record(time.perf_counter() - began)
+                finally:
+                    sender.disconnect()
+            results.append(_measure("send", len(outgoing), send, args.trace_memory))
+
+    if "pipeline" in stages:
+        def pipeline(record):
+            mailbox.reset_flags()
+            # The pipeline prints every review; keep the report readable
+            with contextlib.redirect_stdout(io.StringIO()):
+                run_daily_pipeline(concurrency=args.concurrency)
+        results.append(_measure("pipeline", args.emails, pipeline, args.trace_memory))
+
+    imap.stop()
+    smtp.stop()
+    llm.stop()
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "params": {key: value for key, value in vars(args).items()
+                   if key not in ("save_baseline", "compare", "verbose", "stages")},
+        "llm_requests": llm.requests,
+        "llm_errors": llm.errors,
+        "smtp_delivered": smtp.delivered,
+        "imap_commands": imap.commands,
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 / 1e6, 1),
+        "stages": results,
+    }
+
+
+def _cell(value: Optional[float], width: int, digits: int = 1) -> str:
+    return f"{'-':>{width}}" if value is None else f"{value:>{width}.{digits}f}"
+
+
+def _print_report(report: Dict, baseline: Dict = None):
+    previous = {stage["stage"]: stage for stage in (baseline or {}).get("stages", [])}
+    print(f"\n{'stage':<14}{'emails':>8}{'seconds':>10}{'emails/s':>11}{'p50 ms':>10}{'p99 ms':>10}{'RSS MB':>10}"
+          + (f"{'traced MB':>11}" if any("traced_peak_mb" in stage for stage in report["stages"]) else ""))
+    for stage in report["stages"]:
+        line = (f"{stage['stage']:<14}{stage['emails']:>8}{stage['seconds']:>10.2f}"
+                f"{_cell(stage['emails_per_sec'], 11)}{_cell(stage['p50_ms'], 10)}{_cell(stage['p99_ms'], 10)}"
+                f"{stage['peak_rss_mb']:>10.1f}")
+        if "traced_peak_mb" in stage:
+            line += f"{stage['traced_peak_mb']:>11.1f}"
+        old = previous.get(stage["stage"])
+        if old and old.get("emails_per_sec") and stage.get("emails_per_sec"):
+            throughput = stage["emails_per_sec"] / old["emails_per_sec"] - 1
+            line += f"   vs baseline: {throughput:+.0%} emails/s"
+            if stage.get("p99_ms") and old.get("p99_ms"):
+                line += f", {stage['p99_ms'] / old['p99_ms'] - 1:+.0%} p99"
+        print(line)
+    print(f"\nLLM requests {report['llm_requests']} ({report['llm_errors']} injected errors), "
+          f"IMAP commands {report['imap_commands']}, SMTP delivered {report['smtp_delivered']}, "
+          f"max RSS {report['max_rss_mb']} MB")
+
+
+def _baseline_path(name: str) -> str:
+    return os.path.join(BASELINE_DIR, f"{name}.json")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmarks")
+    parser.add_argument("--emails", type=int, default=200, help="synthetic mailbox size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sizes", nargs="+", default=list(SIZES), choices=list(SIZES))
+    parser.add_argument("--charsets", nargs="+", default=list(CHARSETS))
+    parser.add_argument("--layouts", nargs="+", default=list(LAYOUTS), choices=list(LAYOUTS))
+    parser.add_argument("--attachment-kb", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=8, help="PIPELINE_CONCURRENCY and stage worker threads")
+    parser.add_argument("--imap-latency-ms", type=float, default=0.0, help="delay per IMAP command")
+    parser.add_argument("--smtp-latency-ms", type=float, default=0.0, help="delay per SMTP command")
+    parser.add_argument("--smtp-error-rate", type=float, default=0.0, help="share of messages answered with 451")
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=30.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="share of LLM requests failing")
+    parser.add_argument("--cache", action="store_true", help="keep the LLM result cache enabled")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="also report tracemalloc peaks (slows the run; don't compare its timings)")
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=STAGES)
+    parser.add_argument("--save-baseline", metavar="NAME", help="write results to benchmarks/baselines/NAME.json")
+    parser.add_argument("--compare", metavar="NAME", help="show changes against a saved baseline")
+    parser.add_argument("--verbose", action="store_true", help="keep INFO logging from the pipeline")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        with open(_baseline_path(args.compare), encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    report = run_benchmarks(args)
+    _print_report(report, baseline)
+
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(_baseline_path(args.save_baseline), "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n✅ Baseline saved: {_baseline_path(args.save_baseline)}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+Synthetic customer-support mailbox generator.
+Produces raw RFC 822 messages covering body sizes, charsets, multipart layouts and attachments.
+"""
+
+import random
+from datetime import datetime, timedelta
+from email.charset import Charset, BASE64, QP
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import format_datetime
+from typing import Dict, List, Sequence
+
+SIZES = {"small": 200, "medium": 2_000, "large": 20_000}
+CHARSETS = ("utf-8", "gbk", "iso-8859-1")
+LAYOUTS = ("plain", "html", "alternative", "attachment")
+
+_TOPICS = {
+    "Technical Issue": ("the app crashes on startup", "I get an error when I log in", "sync is not working",
+                        "the export button is broken"),
+    "Billing & Payment": ("I was charged twice this month", "please send the invoice for order",
+                          "I would like a refund", "my subscription payment failed"),
+    "Product Inquiry": ("what is included in the pro plan", "how does the team workspace work",
+                        "tell me about the specifications"),
+    "Feature Request": ("could you add a dark mode", "we would like a CSV export",
+                        "please implement calendar sync"),
+    "Other": ("thanks for the quick help last week", "who should I contact about a partnership",
+              "just wanted to say the new release looks great"),
+}
+_CHINESE = ("应用启动后闪退", "登录时一直提示错误", "本月被重复扣费", "请开具发票", "希望增加深色模式", "请问专业版包含哪些功能")
+_LATIN = ("le paiement a échoué", "la facture du mois dernier", "l'application ne démarre pas", "mañana por favor")
+_SUBJECTS = ("Help needed", "Question about my account", "Urgent", "Re: your last email", "Hello", "Support request")
+_FILLER = ("account", "order", "device", "yesterday", "customer", "version", "settings", "team", "report",
+           "android", "iphone", "browser", "update", "number", "please", "again", "today", "support")
+
+_CHARSET_ENCODING = {"utf-8": BASE64, "gbk": BASE64, "iso-8859-1": QP}
+
+
+def _body_text(rng: random.Random, category: str, charset: str, size: int) -> str:
+    lines = [rng.choice(_TOPICS[category]) + "."]
+    if charset == "gbk":
+        lines.append(rng.choice(_CHINESE) + "。")
+    elif charset == "iso-8859-1":
+        lines.append(rng.choice(_LATIN) + ".")
+    length = sum(len(line) for line in lines)
+    while length < size:
+        line = " ".join(rng.choice(_FILLER) for _ in range(rng.randint(8, 16))) + "."
+        lines.append(line)
+        length += len(line) + 1
+    return "\n".join(lines)
+
+
+def _text_part(text: str, subtype: str, charset: str) -> MIMEText:
+    cs = Charset(charset)
+    cs.body_encoding = _CHARSET_ENCODING.get(charset, BASE64)
+    return MIMEText(text, subtype, cs)
+
+
+def _html(text: str) -> str:
+    paragraphs = "".join(f"<p>{line}</p>" for line in text.split("\n"))
+    return f"<html><head><style>p {{ margin: 0 }}</style></head><body>{paragraphs}</body></html>"
+
+
+def generate_messages(count: int, seed: int = 0, sizes: Sequence[str] = tuple(SIZES),
+                      charsets: Sequence[str] = CHARSETS, layouts: Sequence[str] = LAYOUTS,
+                      attachment_kb: int = 256) -> List[Dict]:
+    """
+    Build ``count`` random support emails
+
+    Args:
+        count: Number of messages
+        seed: Random seed; the same arguments always produce the same mailbox
+        sizes: Body size classes to draw from (keys of SIZES)
+        charsets: Body charsets to draw from
+        layouts: "plain", "html", "alternative" (text + html) or "attachment"
+            (multipart/mixed with a binary attachment)
+        attachment_kb: Attachment size for the "attachment" layout
+
+    Returns:
+        List of {"raw": bytes, "category": str, "size": str, "charset": str, "layout": str}
+    """
+    rng = random.Random(seed)
+    start = datetime(2026, 2, 1, 8, 0)
+    messages = []
+    for number in range(count):
+        category = rng.choice(list(_TOPICS))
+        size, charset, layout = rng.choice(sizes), rng.choice(charsets), rng.choice(layouts)
+        text = _body_text(rng, category, charset, SIZES[size])
+
+        if layout == "plain":
+            msg = _text_part(text, "plain", charset)
+        elif layout == "html":
+            msg = _text_part(_html(text), "html", charset)
+        else:
+            msg = MIMEMultipart("alternative" if layout == "alternative" else "mixed")
+            msg.attach(_text_part(text, "plain", charset))
+            if layout == "alternative":
+                msg.attach(_text_part(_html(text), "html", charset))
+            else:
+                attachment = MIMEApplication(rng.randbytes(attachment_kb * 1024), "octet-stream")
+                attachment.add_header("Content-Disposition", "attachment", filename=f"log-{number}.bin")
+                msg.attach(attachment)
+
+        msg["From"] = f"customer{number}@example.com"
+        msg["To"] = "support@example.com"
+        msg["Subject"] = f"{rng.choice(_SUBJECTS)} #{number}"
+        msg["Date"] = format_datetime(start + timedelta(minutes=number))
+        msg["Message-ID"] = f"<bench-{seed}-{number}@example.com>"
+        messages.append({
+            "raw": msg.as_bytes(),
+            "category": category,
+            "size": size,
+            "charset": charset,
+            "layout": layout,
+        })
+    return messages
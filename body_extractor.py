@@ -0,0 +1,276 @@
+"""
+Bounded, charset-aware extraction of an email's text body.
+
+The chosen part is transfer-decoded and charset-decoded a chunk at a time,
+and HTML goes through an incremental tag-stripping parser; reading stops as
+soon as the character budget is filled, so the cost per message does not grow
+with the size of the part.
+"""
+
+import binascii
+import codecs
+import email.message
+import re
+from html.parser import HTMLParser
+from typing import Iterable, Iterator, Optional, Union
+
+from config import EMAIL_BODY_MAX_CHARS
+
+# Encoded characters read per step; small enough that stopping early saves real work
+_CHUNK_SIZE = 16 * 1024
+# Text handed to the HTML parser per feed, so a full budget is noticed quickly
+_FEED_SIZE = 4096
+# Upper bound on encoded input scanned per part, e.g. for newsletters that are mostly CSS
+_MAX_SCAN_BYTES = 512 * 1024
+# Extra plain-text characters read so leading whitespace does not eat into the budget
+_PLAIN_SLACK = 256
+
+# Mail labelled with these charsets routinely uses characters only their supersets define
+_CHARSET_ALIASES = {
+    "gb2312": "gb18030",
+    "gbk": "gb18030",
+    "x-gbk": "gb18030",
+    "cp936": "gb18030",
+    "big5": "big5hkscs",
+    "x-big5": "big5hkscs",
+    "ks_c_5601-1987": "cp949",
+    "euc-kr": "cp949",
+}
+# Guess for undeclared charsets that turn out not to be UTF-8
+_FALLBACK_CHARSET = "gb18030"
+
+_WHITESPACE_RE = re.compile(rb"\s+")
+_QP_CUT_ESCAPE_RE = re.compile(rb"=[0-9A-Fa-f]?$")
+_SPACES_RE = re.compile(r"\s+")
+_LINE_SPACES_RE = re.compile(r" *\n *")
+
+
+def _codec(charset: Optional[str]) -> Optional[str]:
+    """Normalise a declared charset to a Python codec name; None if unknown or missing."""
+    if not charset:
+        return None
+    charset = charset.strip().strip('"').lower()
+    charset = _CHARSET_ALIASES.get(charset, charset)
+    try:
+        return codecs.lookup(charset).name
+    except LookupError:
+        return None
+
+
+def decode_bytes(data: bytes, charset: Optional[str] = None) -> str:
+    """Decode a complete byte string (e.g. a header fragment) with the declared or guessed charset."""
+    codec = _codec(charset)
+    if codec:
+        return data.decode(codec, errors="ignore")
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return data.decode(_FALLBACK_CHARSET, errors="ignore")
+
+
+class _TextDecoder:
+    """
+    Incremental decoder for a declared charset; an undeclared one is read as
+    UTF-8 and switches to the fallback charset at the first invalid chunk
+    """
+
+    def __init__(self, charset: Optional[str]):
+        codec = _codec(charset)
+        self.sniffing = codec is None
+        self.decoder = codecs.getincrementaldecoder(codec or "utf-8")(errors="strict" if self.sniffing else "ignore")
+
+    def decode(self, data: bytes, final: bool = False) -> str:
+        try:
+            return self.decoder.decode(data, final)
+        except UnicodeDecodeError:
+            if not self.sniffing:
+                raise
+            self.sniffing = False
+            self.decoder = codecs.getincrementaldecoder(_FALLBACK_CHARSET)(errors="ignore")
+            return self.decoder.decode(data, final)
+
+
+def _to_bytes(window: Union[str, bytes]) -> bytes:
+    if isinstance(window, bytes):
+        return window
+    # Same conversion as Message.get_payload(decode=True)
+    try:
+        return window.encode("ascii", "surrogateescape")
+    except UnicodeEncodeError:
+        return window.encode("raw-unicode-escape")
+
+
+def _iter_transfer_decoded(payload: Union[str, bytes], transfer_encoding: str) -> Iterator[bytes]:
+    """
+    Yield the transfer-decoded bytes of a part payload a chunk at a time
+
+    The payload may be cut off (partial IMAP fetches); an incomplete trailing
+    base64 quantum or quoted-printable escape is dropped.
+    """
+    transfer_encoding = (transfer_encoding or "").strip().lower()
+    limit = min(len(payload), _MAX_SCAN_BYTES)
+    pending = b""
+    for start in range(0, limit, _CHUNK_SIZE):
+        data = _to_bytes(payload[start:start + _CHUNK_SIZE])
+        last = start + _CHUNK_SIZE >= limit
+        if transfer_encoding == "base64":
+            data = pending + _WHITESPACE_RE.sub(b"", data)
+            usable = len(data) - len(data) % 4
+            pending = data[usable:]
+            if usable:
+                try:
+                    yield binascii.a2b_base64(data[:usable])
+                except binascii.Error:
+                    return
+        elif transfer_encoding == "quoted-printable":
+            data = pending + data
+            # Cut at a line end so no soft break or =XX escape is split between chunks
+            cut = len(data) if last else data.rfind(b"\n") + 1
+            pending = data[cut:]
+            if cut:
+                yield binascii.a2b_qp(_QP_CUT_ESCAPE_RE.sub(b"", data[:cut]) if last else data[:cut])
+        else:
+            yield data
+
+
+class _HTMLTextReducer(HTMLParser):
+    """Collect the visible text of an HTML document until ``max_chars`` are gathered."""
+
+    _SKIPPED = {"script", "style", "head", "title", "noscript", "template", "svg"}
+    _BLOCKS = {
+        "address", "article", "blockquote", "br", "dd", "div", "dl", "dt", "footer", "h1", "h2", "h3",
+        "h4", "h5", "h6", "header", "hr", "li", "ol", "p", "pre", "section", "table", "td", "th", "tr", "ul",
+    }
+
+    def __init__(self, max_chars: int):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.parts = []
+        self.size = 0
+        self.skip_depth = 0
+        self.full = False
+
+    def _break(self):
+        if self.parts and not self.parts[-1].endswith("\n"):
+            self.parts.append("\n")
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "body":
+            # A missing </head> must not hide the whole body
+            self.skip_depth = 0
+        elif tag in self._SKIPPED:
+            self.skip_depth += 1
+        elif tag in self._BLOCKS:
+            self._break()
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in self._BLOCKS:
+            self._break()
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIPPED:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag in self._BLOCKS:
+            self._break()
+
+    def handle_data(self, data):
+        if self.skip_depth or self.full:
+            return
+        text = _SPACES_RE.sub(" ", data)
+        if not text.strip():
+            if self.parts and not self.parts[-1].endswith((" ", "\n")):
+                self.parts.append(" ")
+            return
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= self.max_chars:
+            self.full = True
+
+    def text(self) -> str:
+        return _LINE_SPACES_RE.sub("\n", "".join(self.parts)).strip()[:self.max_chars]
+
+
+def text_from_chunks(chunks: Iterable[bytes], charset: Optional[str], subtype: str = "plain",
+                     max_chars: int = EMAIL_BODY_MAX_CHARS) -> str:
+    """
+    Decode transfer-decoded body chunks into at most ``max_chars`` of text
+
+    Args:
+        chunks: Body bytes in order (already transfer-decoded)
+        charset: Declared charset of the part (None to guess UTF-8, then GB18030)
+        subtype: "plain" or "html"; HTML is reduced to its visible text
+        max_chars: Character budget; no more input is read once it is filled
+
+    Returns:
+        The stripped body text
+    """
+    decoder = _TextDecoder(charset)
+    if subtype == "html":
+        reducer = _HTMLTextReducer(max_chars)
+        for chunk in chunks:
+            text = decoder.decode(chunk)
+            for start in range(0, len(text), _FEED_SIZE):
+                reducer.feed(text[start:start + _FEED_SIZE])
+                if reducer.full:
+                    return reducer.text()
+        reducer.feed(decoder.decode(b"", final=True))
+        reducer.close()
+        return reducer.text()
+
+    parts, size = [], 0
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        parts.append(text)
+        size += len(text)
+        if size >= max_chars + _PLAIN_SLACK:
+            break
+    return "".join(parts).strip()[:max_chars]
+
+
+def decode_body(data: Union[str, bytes], transfer_encoding: str, charset: Optional[str],
+                subtype: str = "plain", max_chars: int = EMAIL_BODY_MAX_CHARS) -> str:
+    """Extract text from a raw (possibly truncated) part payload, e.g. a BODY.PEEK[1]<0.n> slice."""
+    return text_from_chunks(_iter_transfer_decoded(data, transfer_encoding), charset, subtype, max_chars)
+
+
+def extract_body(msg: email.message.Message, max_chars: int = EMAIL_BODY_MAX_CHARS) -> str:
+    """
+    Extract the body text of a parsed message
+
+    The first inline text/plain part is preferred; if there is none, or it is
+    blank, the first inline text/html part is reduced to text. Attachments are
+    never read.
+
+    Args:
+        msg: Parsed message
+        max_chars: Character budget
+
+    Returns:
+        At most ``max_chars`` characters of body text ("" if there is no text part)
+    """
+    parts = {}
+    for part in msg.walk():
+        if part.is_multipart() or part.get_content_disposition() == "attachment":
+            continue
+        subtype = part.get_content_subtype() if part.get_content_maintype() == "text" else ""
+        if subtype in ("plain", "html") and subtype not in parts:
+            parts[subtype] = part
+            if len(parts) == 2:
+                break
+
+    for subtype in ("plain", "html"):
+        part = parts.get(subtype)
+        if part is None:
+            continue
+        transfer_encoding = str(part.get("Content-Transfer-Encoding", "")).strip().lower()
+        if transfer_encoding in ("base64", "quoted-printable"):
+            payload = part.get_payload()
+        else:
+            # get_payload() would turn raw 8bit bytes into replacement characters; only the bytes are usable
+            payload, transfer_encoding = part.get_payload(decode=True), ""
+        if not isinstance(payload, (str, bytes)):
+            continue
+        text = decode_body(payload, transfer_encoding, part.get_content_charset(), subtype, max_chars)
+        if text:
+            return text
+    return ""
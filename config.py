@@ -14,14 +14,65 @@ IMAP_USE_SSL = _get_env_bool("IMAP_USE_SSL", True)
 SMTP_SERVER = os.getenv("SMTP_SERVER", "")
 SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
 SMTP_USE_TLS = _get_env_bool("SMTP_USE_TLS", True)
+# Bulk sending: parallel authenticated sessions, messages per session before a
+# fresh login (0 = unlimited) and idle seconds after which a NOOP health check runs.
+SMTP_BULK_SESSIONS = max(1, int(os.getenv("SMTP_BULK_SESSIONS", "1")))
+SMTP_MAX_MESSAGES_PER_SESSION = max(0, int(os.getenv("SMTP_MAX_MESSAGES_PER_SESSION", "0")))
+SMTP_NOOP_IDLE_SECONDS = float(os.getenv("SMTP_NOOP_IDLE_SECONDS", "30"))
+# Outbox sender worker: provider quota (token bucket) and retry policy
+OUTBOX_RATE_PER_MINUTE = max(1.0, float(os.getenv("OUTBOX_RATE_PER_MINUTE", "60")))
+OUTBOX_BURST = max(1, int(os.getenv("OUTBOX_BURST", "10")))
+OUTBOX_MAX_ATTEMPTS = max(1, int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5")))
+OUTBOX_BACKOFF_SECONDS = float(os.getenv("OUTBOX_BACKOFF_SECONDS", "30"))
+OUTBOX_MAX_BACKOFF_SECONDS = float(os.getenv("OUTBOX_MAX_BACKOFF_SECONDS", "3600"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "5"))
+# A message still 'sending' this long after it was claimed belongs to a dead worker
+OUTBOX_LEASE_SECONDS = max(1.0, float(os.getenv("OUTBOX_LEASE_SECONDS", "600")))
 
 EMAIL_ADDRESS = os.getenv("EMAIL_ADDRESS", "")
 EMAIL_APP_PASSWORD = os.getenv("EMAIL_APP_PASSWORD", "")
 PROCESS_UNSEEN_ONLY = _get_env_bool("PROCESS_UNSEEN_ONLY", True)
+# Number of messages requested per IMAP FETCH round trip.
+IMAP_FETCH_BATCH_SIZE = max(1, int(os.getenv("IMAP_FETCH_BATCH_SIZE", "500")))
+# In "full" fetch mode, a batch is split so one FETCH downloads at most this many
+# bytes of messages (by RFC822.SIZE); a single larger message is fetched alone.
+IMAP_FETCH_BATCH_BYTES = max(1, int(os.getenv("IMAP_FETCH_BATCH_BYTES", str(16 * 1024 * 1024))))
+# Only search for UIDs above the last processed checkpoint stored in SQLite.
+IMAP_INCREMENTAL_SYNC = _get_env_bool("IMAP_INCREMENTAL_SYNC", True)
+# "full" downloads whole RFC822 messages; "partial" reads BODYSTRUCTURE and only
+# fetches the headers plus the first IMAP_PARTIAL_BODY_BYTES of the text part
+# (a larger slice when that one holds no text, e.g. an HTML <head>).
+IMAP_FETCH_MODE = os.getenv("IMAP_FETCH_MODE", "full").strip().lower()
+IMAP_PARTIAL_BODY_BYTES = max(256, int(os.getenv("IMAP_PARTIAL_BODY_BYTES", "4096")))
+# Several mailboxes: a JSON file listing accounts and folders (see SETUP.md).
+# When set, run_daily_pipeline shards the mailboxes across INGEST_WORKERS
+# processes, each with its own IMAP session, instead of reading EMAIL_ADDRESS.
+MAILBOXES_FILE = os.getenv("MAILBOXES_FILE", "")
+INGEST_WORKERS = max(1, int(os.getenv("INGEST_WORKERS", str(min(4, os.cpu_count() or 1)))))
+# Characters of body text kept per email (body_extractor.py stops reading the
+# part once this many are decoded; HTML is reduced to its visible text first).
+EMAIL_BODY_MAX_CHARS = max(100, int(os.getenv("EMAIL_BODY_MAX_CHARS", "1000")))
+# Daemon mode (python main.py --daemon): the IMAP session waits in IDLE and is
+# re-issued every IMAP_IDLE_REFRESH_SECONDS (RFC 2177 asks for less than 29 minutes).
+# Servers without IDLE are polled every IMAP_POLL_SECONDS; dropped connections are
+# retried with exponential backoff capped at IMAP_RECONNECT_MAX_SECONDS.
+IMAP_IDLE_REFRESH_SECONDS = max(30, int(os.getenv("IMAP_IDLE_REFRESH_SECONDS", str(25 * 60))))
+IMAP_POLL_SECONDS = max(1.0, float(os.getenv("IMAP_POLL_SECONDS", "60")))
+IMAP_RECONNECT_MAX_SECONDS = max(1.0, float(os.getenv("IMAP_RECONNECT_MAX_SECONDS", "300")))
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+# OpenAI-compatible endpoint, e.g. a proxy or the benchmark's fake server; empty uses the default
+OPENAI_API_BASE = os.getenv("OPENAI_API_BASE", "")
 LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
 
+# Maximum number of emails classified/drafted concurrently by the pipeline.
+# 1 keeps the original strictly sequential behaviour.
+PIPELINE_CONCURRENCY = max(1, int(os.getenv("PIPELINE_CONCURRENCY", "8")))
+PIPELINE_PERSIST_BATCH = max(1, int(os.getenv("PIPELINE_PERSIST_BATCH", "100")))
+# Record each email's finished stages (fetched, classified, drafted, persisted)
+# in SQLite so an interrupted run resumes where it stopped instead of starting over
+PIPELINE_RESUME = _get_env_bool("PIPELINE_RESUME", True)
+
 EMAIL_CATEGORIES = [
     "Technical Issue",
     "Billing & Payment",
@@ -33,6 +84,69 @@ EMAIL_CATEGORIES = [
 CSV_OUTPUT_DIR = os.getenv("CSV_OUTPUT_DIR", "review_output")
 DATA_DIR = os.getenv("DATA_DIR", "data")
 SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", os.path.join(DATA_DIR, "aftersale.db"))
+# Page cache per connection in KiB, and how long a writer waits for a lock
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_BUSY_TIMEOUT_SECONDS = float(os.getenv("SQLITE_BUSY_TIMEOUT_SECONDS", "30"))
+# FTS5 tokenizer for review search: "unicode61" (word based) or "trigram"
+# (substring matching, better for Chinese text; queries need 3+ characters)
+SQLITE_FTS_TOKENIZER = os.getenv("SQLITE_FTS_TOKENIZER", "unicode61").strip().lower()
+
+# Pack up to this many emails (within the token budget) into one classification request.
+# 1 disables batching.
+LLM_CLASSIFY_BATCH_SIZE = max(1, int(os.getenv("LLM_CLASSIFY_BATCH_SIZE", "1")))
+LLM_CLASSIFY_BATCH_TOKENS = max(500, int(os.getenv("LLM_CLASSIFY_BATCH_TOKENS", "6000")))
+
+# Cascade mode: accept the keyword rules when the best category beats the
+# runner-up by at least CLASSIFY_RULE_MARGIN keyword hits; only ambiguous
+# emails go on to the local model and the LLM
+CLASSIFY_CASCADE = _get_env_bool("CLASSIFY_CASCADE", False)
+CLASSIFY_RULE_MARGIN = max(1, int(os.getenv("CLASSIFY_RULE_MARGIN", "2")))
+
+# Classify and draft with one structured LLM response instead of two calls
+LLM_COMBINED_MODE = _get_env_bool("LLM_COMBINED_MODE", False)
+
+# Near-duplicate detection: emails whose SimHash differs by at most
+# NEAR_DUP_MAX_DISTANCE bits reuse the first email's classification; its draft
+# is reused only for identical content (flagged high risk), see main._member_reply
+NEAR_DUP_ENABLED = _get_env_bool("NEAR_DUP_ENABLED", True)
+NEAR_DUP_MAX_DISTANCE = max(0, int(os.getenv("NEAR_DUP_MAX_DISTANCE", "3")))
+NEAR_DUP_HISTORY_DAYS = max(0, int(os.getenv("NEAR_DUP_HISTORY_DAYS", "3")))
+
+# Local TF-IDF / naive Bayes classifier trained from reviewed history
+# (python local_classifier.py train). Its answer is used when the predicted
+# probability reaches LOCAL_MODEL_THRESHOLD; other emails go to the LLM.
+LOCAL_MODEL_ENABLED = _get_env_bool("LOCAL_MODEL_ENABLED", True)
+LOCAL_MODEL_PATH = os.getenv("LOCAL_MODEL_PATH", os.path.join(DATA_DIR, "local_classifier.npz"))
+LOCAL_MODEL_THRESHOLD = float(os.getenv("LOCAL_MODEL_THRESHOLD", "0.85"))
+# Review statuses whose category is trusted as a training label
+LOCAL_MODEL_TRAIN_STATUSES = [
+    status.strip() for status in os.getenv("LOCAL_MODEL_TRAIN_STATUSES", "approved").split(",") if status.strip()
+]
+LOCAL_MODEL_MIN_SAMPLES = max(1, int(os.getenv("LOCAL_MODEL_MIN_SAMPLES", "50")))
+LOCAL_MODEL_MAX_FEATURES = max(100, int(os.getenv("LOCAL_MODEL_MAX_FEATURES", "50000")))
+
+# Metrics (metrics.py): per-stage and per-LLM-call counters and latency histograms.
+# METRICS_PROM_FILE writes the Prometheus text format after each run (e.g. for
+# node_exporter's textfile collector); METRICS_HTTP_PORT serves /metrics while
+# the process runs (0 disables it); a JSON summary of each run goes to METRICS_SUMMARY_DIR.
+METRICS_ENABLED = _get_env_bool("METRICS_ENABLED", True)
+METRICS_PROM_FILE = os.getenv("METRICS_PROM_FILE", "")
+METRICS_HTTP_PORT = int(os.getenv("METRICS_HTTP_PORT", "0"))
+METRICS_SUMMARY_DIR = os.getenv("METRICS_SUMMARY_DIR", os.path.join(DATA_DIR, "metrics"))
+
+# Profiling (python main.py --profile [DIR]): per-stage cProfile hotspots and
+# tracemalloc allocation sites, written to a run_<timestamp> folder under PROFILE_DIR.
+# Nothing is installed unless the switch is given.
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(DATA_DIR, "profiles"))
+PROFILE_TOP_N = max(1, int(os.getenv("PROFILE_TOP_N", "30")))
+# Stack depth recorded per allocation; 0 skips tracemalloc and keeps only cProfile
+PROFILE_TRACE_FRAMES = max(0, int(os.getenv("PROFILE_TRACE_FRAMES", "10")))
+
+# Content-hash cache for LLM classification and reply results
+LLM_CACHE_ENABLED = _get_env_bool("LLM_CACHE_ENABLED", True)
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(DATA_DIR, "llm_cache.db"))
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = max(1, int(os.getenv("LLM_CACHE_MAX_ENTRIES", "50000")))
 
 REPLY_TEMPLATE = os.getenv("REPLY_TEMPLATE", "")
 TONE_GUIDANCE = os.getenv("TONE_GUIDANCE", "专业、友好、耐心")
@@ -3,25 +3,98 @@ AI-based email classification using LLM.
 Supports OpenAI GPT models or rule-based classification.
 """
 
-from typing import Dict, Tuple
-from config import EMAIL_CATEGORIES, OPENAI_API_KEY, LLM_MODEL
+from typing import Dict, Iterable, List, Optional, Tuple
+from config import (
+    EMAIL_CATEGORIES, OPENAI_API_KEY, OPENAI_API_BASE, LLM_MODEL, LLM_CACHE_ENABLED,
+    LLM_CLASSIFY_BATCH_SIZE, LLM_CLASSIFY_BATCH_TOKENS, LOCAL_MODEL_ENABLED, LOCAL_MODEL_THRESHOLD,
+    CLASSIFY_CASCADE, CLASSIFY_RULE_MARGIN,
+)
+from llm_cache import LLMCache
+from local_classifier import LocalClassifier
+import metrics
+from collections import Counter
 import logging
 import json
+import re
+import threading
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Bump whenever the classification prompt changes so stale cache entries are ignored
+CLASSIFY_PROMPT_VERSION = "classify-v1"
+
+# Keyword index for the rule-based classifier, built once at import.
+# Order matters: ties go to the category listed first.
+_RULES = (
+    ("Technical Issue", ("error", "bug", "crash", "not working", "broken", "issue", "problem")),
+    ("Billing & Payment", ("invoice", "payment", "billing", "subscription", "charge", "refund", "price")),
+    ("Product Inquiry", ("what is", "how does", "tell me about", "specifications", "features")),
+    ("Feature Request", ("feature request", "request", "add", "implement", "could you", "would like")),
+)
+
+
+_CODE_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+def _estimate_tokens(text: str) -> int:
+    """Rough token estimate; conservative for CJK text, which is close to one token per character."""
+    return len(text) // 3 + 1
+
+
+def _rule_scores(combined_text: str) -> List[int]:
+    """Keyword hit count per _RULES entry for lowercased text."""
+    count = combined_text.count
+    return [sum(map(count, keywords)) for _, keywords in _RULES]
+
+
+def _score_rules(combined_text: str) -> Tuple[str, float]:
+    """Score lowercased text against the keyword index and return (category, confidence)."""
+    best_category, best_score = "Other", 0
+    for (category, _), score in zip(_RULES, _rule_scores(combined_text)):
+        if score > best_score:
+            best_category, best_score = category, score
+    if best_score:
+        return best_category, min(0.7, best_score * 0.1)
+    return "Other", 0.3
+
+
+def _rules_margin(combined_text: str) -> int:
+    """How many keyword hits the best category has over the runner-up."""
+    scores = sorted(_rule_scores(combined_text), reverse=True)
+    return scores[0] - scores[1]
+
 
 class EmailClassifier:
-    def __init__(self, use_llm: bool = True):
+    def __init__(self, use_llm: bool = True, cache: LLMCache = None, use_local: bool = LOCAL_MODEL_ENABLED,
+                 local_model: Optional[LocalClassifier] = None,
+                 local_threshold: float = LOCAL_MODEL_THRESHOLD,
+                 cascade: bool = CLASSIFY_CASCADE, rule_margin: int = CLASSIFY_RULE_MARGIN):
         self.use_llm = use_llm
         self.categories = EMAIL_CATEGORIES
+        self.cache = cache
+        # Trained model answers first when confident; see local_classifier.py
+        self.local_model = local_model
+        self.local_threshold = local_threshold
+        if use_local and self.local_model is None:
+            self.local_model = LocalClassifier.load()
+            if self.local_model:
+                logger.info(f"✅ Local classifier loaded ({self.local_model.meta.get('samples', '?')} training samples)")
+        # Cascade order: confident rules -> confident local model -> LLM
+        self.cascade = cascade
+        self.rule_margin = rule_margin
+        self.tier_counts = Counter()
+        self._tier_lock = threading.Lock()
         
         if use_llm:
             try:
                 import openai
                 openai.api_key = OPENAI_API_KEY
+                if OPENAI_API_BASE:
+                    openai.api_base = OPENAI_API_BASE
                 self.openai = openai
+                if self.cache is None and LLM_CACHE_ENABLED:
+                    self.cache = LLMCache()
                 logger.info("✅ OpenAI LLM initialized")
             except ImportError:
                 logger.warning("⚠️  OpenAI not installed, falling back to rule-based classification")
@@ -38,13 +111,84 @@ class EmailClassifier:
         Returns:
             Tuple of (category, confidence_score)
         """
+        result = self.classify_without_llm(subject, body)
+        if result:
+            return result
+        return self._escalate(subject, body)
+
+    def classify_without_llm(self, subject: str, body: str) -> Optional[Tuple[str, float]]:
+        """Return a confident (category, confidence) from the rules or local model, or None"""
+        results = [None]
+        self._classify_cheap([(subject, body)], results)
+        return results[0]
+
+    def record_tier(self, tier: str, count: int = 1):
+        if not count:
+            return
+        with self._tier_lock:
+            self.tier_counts[tier] += count
+        metrics.CLASSIFY_TIERS.inc(count, tier=tier)
+
+    def tier_stats(self) -> Dict[str, Dict[str, float]]:
+        """Emails answered per cascade tier ("rules", "local", "llm") and their share of the total"""
+        with self._tier_lock:
+            counts = dict(self.tier_counts)
+        total = sum(counts.values())
+        return {
+            tier: {"count": count, "rate": count / total}
+            for tier, count in counts.items()
+        }
+
+    def _escalate(self, subject: str, body: str) -> Tuple[str, float]:
+        """Classify with the LLM, or the rules when no LLM is available"""
         if self.use_llm:
+            self.record_tier("llm")
             return self._classify_with_llm(subject, body)
         else:
+            self.record_tier("rules")
             return self._classify_rule_based(subject, body)
 
+    def _classify_cheap(self, emails: List[Tuple[str, str]], results: List) -> List[int]:
+        """
+        Fill ``results`` with confident rule and local-model answers
+        
+        Returns:
+            Indexes of the emails that still need the LLM (or rule fallback)
+        """
+        pending = list(range(len(emails)))
+        if self.cascade:
+            ambiguous = []
+            for index in pending:
+                combined_text = (emails[index][0] + " " + emails[index][1]).lower()
+                if _rules_margin(combined_text) >= self.rule_margin:
+                    results[index] = _score_rules(combined_text)
+                else:
+                    ambiguous.append(index)
+            self.record_tier("rules", len(pending) - len(ambiguous))
+            pending = ambiguous
+
+        if self.local_model and pending:
+            predictions = self.local_model.predict_many([emails[index] for index in pending])
+            uncertain = []
+            for index, (category, confidence) in zip(pending, predictions):
+                if confidence >= self.local_threshold:
+                    results[index] = (category, confidence)
+                else:
+                    uncertain.append(index)
+            self.record_tier("local", len(pending) - len(uncertain))
+            pending = uncertain
+        return pending
+
     def _classify_with_llm(self, subject: str, body: str) -> Tuple[str, float]:
         """Classify using OpenAI GPT"""
+        cache_key = None
+        if self.cache:
+            cache_key = LLMCache.make_key(LLM_MODEL, CLASSIFY_PROMPT_VERSION, subject, body)
+            cached = self.cache.get(cache_key)
+            metrics.LLM_CACHE.inc(operation="classify", result="hit" if cached else "miss")
+            if cached:
+                return cached["category"], cached["confidence"]
+
         try:
             prompt = f"""Classify the following customer support email into ONE of these categories:
 {', '.join(self.categories)}
@@ -56,15 +200,16 @@ Respond in JSON format:
 {{"category": "CATEGORY_NAME", "confidence": 0.95}}
 """
             
-            response = self.openai.ChatCompletion.create(
-                model=LLM_MODEL,
-                messages=[
-                    {"role": "system", "content": "You are a customer support email classifier. Respond only in JSON format."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=100
-            )
+            with metrics.track_llm("classify"):
+                response = self.openai.ChatCompletion.create(
+                    model=LLM_MODEL,
+                    messages=[
+                        {"role": "system", "content": "You are a customer support email classifier. Respond only in JSON format."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.3,
+                    max_tokens=100
+                )
             
             result = json.loads(response.choices[0].message.content)
             category = result.get("category", "Other")
@@ -73,36 +218,159 @@ Respond in JSON format:
             if category not in self.categories:
                 category = "Other"
             
+            if cache_key:
+                self.cache.set(cache_key, {"category": category, "confidence": confidence})
             return category, confidence
             
         except Exception as e:
             logger.error(f"LLM classification failed: {e}, falling back to rule-based")
+            metrics.LLM_FALLBACKS.inc(operation="classify", reason="error")
             return self._classify_rule_based(subject, body)
 
-    def _classify_rule_based(self, subject: str, body: str) -> Tuple[str, float]:
-        """Simple rule-based classification"""
-        combined_text = (subject + " " + body).lower()
+    def classify_many(self, emails: Iterable[Tuple[str, str]]) -> List[Tuple[str, float]]:
+        """
+        Classify many (subject, body) pairs
         
-        rules = {
-            "Technical Issue": ["error", "bug", "crash", "not working", "broken", "issue", "problem"],
-            "Billing & Payment": ["invoice", "payment", "billing", "subscription", "charge", "refund", "price"],
-            "Product Inquiry": ["what is", "how does", "tell me about", "specifications", "features"],
-            "Feature Request": ["feature request", "request", "add", "implement", "could you", "would like"],
-        }
+        Args:
+            emails: Iterable of (subject, body) tuples
         
-        scores = {}
-        for category, keywords in rules.items():
-            score = sum(combined_text.count(keyword) for keyword in keywords)
-            scores[category] = score
+        Returns:
+            List of (category, confidence_score) tuples in input order
+        """
+        if self.use_llm or self.local_model or self.cascade:
+            return self.classify_batch(list(emails))
+        return [_score_rules((subject + " " + body).lower()) for subject, body in emails]
+
+    def classify_batch(self, emails: List[Tuple[str, str]],
+                       batch_size: int = LLM_CLASSIFY_BATCH_SIZE,
+                       token_budget: int = LLM_CLASSIFY_BATCH_TOKENS) -> List[Tuple[str, float]]:
+        """
+        Classify several emails per LLM request
         
-        if max(scores.values()) > 0:
-            category = max(scores, key=scores.get)
-            confidence = min(0.7, max(scores.values()) * 0.1)
-        else:
-            category = "Other"
-            confidence = 0.3
+        Emails answered confidently by the rules (cascade mode) or the local
+        model skip the LLM. The rest are packed into requests of at most
+        ``batch_size`` items whose estimated prompt size stays within
+        ``token_budget``. Items missing or malformed in a batch response fall
+        back to single-email classification.
+        
+        Args:
+            emails: List of (subject, body) tuples
+            batch_size: Maximum emails per request
+            token_budget: Approximate prompt token budget per request
         
-        return category, confidence
+        Returns:
+            List of (category, confidence_score) tuples in input order
+        """
+        results: List[Optional[Tuple[str, float]]] = [None] * len(emails)
+        unresolved = self._classify_cheap(emails, results)
+        if not self.use_llm or batch_size <= 1:
+            for index in unresolved:
+                results[index] = self._escalate(*emails[index])
+            return results
+        self.record_tier("llm", len(unresolved))
+
+        cache_keys = [None] * len(emails)
+        pending = []
+        for index in unresolved:
+            subject, body = emails[index]
+            if self.cache:
+                cache_keys[index] = LLMCache.make_key(LLM_MODEL, CLASSIFY_PROMPT_VERSION, subject, body)
+                cached = self.cache.get(cache_keys[index])
+                metrics.LLM_CACHE.inc(operation="classify", result="hit" if cached else "miss")
+                if cached:
+                    results[index] = (cached["category"], cached["confidence"])
+                    continue
+            pending.append(index)
+
+        batch, batch_tokens = [], 0
+        for index in pending:
+            subject, body = emails[index]
+            tokens = _estimate_tokens(subject) + _estimate_tokens(body) + 20
+            if batch and (len(batch) >= batch_size or batch_tokens + tokens > token_budget):
+                self._classify_packed(emails, batch, results, cache_keys)
+                batch, batch_tokens = [], 0
+            batch.append(index)
+            batch_tokens += tokens
+        if batch:
+            self._classify_packed(emails, batch, results, cache_keys)
+
+        return results
+
+    def _classify_packed(self, emails: List[Tuple[str, str]], indexes: List[int],
+                         results: List, cache_keys: List):
+        """Classify the emails at ``indexes`` with one request and fill ``results`` in place"""
+        if len(indexes) == 1:
+            subject, body = emails[indexes[0]]
+            results[indexes[0]] = self._classify_with_llm(subject, body)
+            return
+
+        sections = []
+        for number, index in enumerate(indexes, start=1):
+            subject, body = emails[index]
+            sections.append(f"### Email {number}\nEmail Subject: {subject}\nEmail Body: {body}")
+        prompt = f"""Classify each of the following customer support emails into ONE of these categories:
+{', '.join(self.categories)}
+
+{chr(10).join(sections)}
+
+Respond with a JSON array containing one object per email, in any order:
+[{{"id": 1, "category": "CATEGORY_NAME", "confidence": 0.95}}]
+"""
+
+        try:
+            with metrics.track_llm("classify_batch"):
+                response = self.openai.ChatCompletion.create(
+                    model=LLM_MODEL,
+                    messages=[
+                        {"role": "system", "content": "You are a customer support email classifier. Respond only in JSON format."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.3,
+                    max_tokens=40 * len(indexes) + 20
+                )
+        except Exception as e:
+            logger.error(f"Batch LLM classification failed: {e}, falling back to rule-based")
+            metrics.LLM_FALLBACKS.inc(len(indexes), operation="classify_batch", reason="error")
+            for index in indexes:
+                results[index] = self._classify_rule_based(*emails[index])
+            return
+
+        parsed = {}
+        try:
+            content = _CODE_FENCE_RE.sub("", response.choices[0].message.content.strip())
+            items = json.loads(content)
+            if isinstance(items, dict):
+                items = items.get("results", [])
+            for item in items:
+                try:
+                    number = int(item["id"])
+                    confidence = float(item.get("confidence", 0.5))
+                except (KeyError, TypeError, ValueError, AttributeError):
+                    continue
+                category = item.get("category", "Other")
+                if category not in self.categories:
+                    category = "Other"
+                parsed[number] = (category, confidence)
+        except (ValueError, TypeError, AttributeError) as e:
+            logger.warning(f"Malformed batch classification response: {e}")
+
+        missing = 0
+        for number, index in enumerate(indexes, start=1):
+            if number in parsed:
+                results[index] = parsed[number]
+                if cache_keys[index]:
+                    category, confidence = parsed[number]
+                    self.cache.set(cache_keys[index], {"category": category, "confidence": confidence})
+            else:
+                missing += 1
+                results[index] = self._classify_with_llm(*emails[index])
+        if missing:
+            metrics.LLM_FALLBACKS.inc(missing, operation="classify_batch", reason="missing")
+            logger.warning(f"{missing} of {len(indexes)} batch items fell back to single-email classification")
+
+    def _classify_rule_based(self, subject: str, body: str) -> Tuple[str, float]:
+        """Simple rule-based classification"""
+        return _score_rules((subject + " " + body).lower())
 
 
 # Example usage
@@ -4,42 +4,312 @@ Fetches unread emails with full parsing
 """
 
 import imaplib
+import json
+import os
 import email
 import email.message
+import re
+import select
+import ssl
+import threading
+import time
 from email.header import decode_header
-from typing import List, Dict
+from typing import List, Dict, Generator, Iterable, Iterator, Optional, Tuple
 from config import (
     IMAP_SERVER, IMAP_PORT, IMAP_USE_SSL,
-    EMAIL_ADDRESS, EMAIL_APP_PASSWORD, PROCESS_UNSEEN_ONLY
+    EMAIL_ADDRESS, EMAIL_APP_PASSWORD, PROCESS_UNSEEN_ONLY,
+    IMAP_FETCH_BATCH_SIZE, IMAP_FETCH_BATCH_BYTES, IMAP_INCREMENTAL_SYNC,
+    IMAP_FETCH_MODE, IMAP_PARTIAL_BODY_BYTES, IMAP_IDLE_REFRESH_SECONDS,
+    MAILBOXES_FILE, EMAIL_BODY_MAX_CHARS,
 )
+from body_extractor import _MAX_SCAN_BYTES, decode_body, decode_bytes, extract_body
+from email_record import EmailRecord
+from review_database import ReviewDatabase
+import metrics
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+_FETCH_UID_RE = re.compile(rb"UID (\d+)")
+_LITERAL_MARKER_RE = re.compile(rb"\{\d+\}$")
+_IMAP_TOKEN_RE = re.compile(rb'\(|\)|"(?:[^"\\]|\\.)*"|[^\s()"\[]+(?:\[[^\]]*\])?(?:<[\d.]+>)?')
+_OPEN, _CLOSE = object(), object()
+_EXISTS_RE = re.compile(rb"^\* \d+ EXISTS")
+# How long past the refresh DONE a silent server is given before the connection counts as dead
+_IDLE_GRACE_SECONDS = 60
+
+_HEADER_FIELDS = "BODY.PEEK[HEADER.FIELDS (FROM SUBJECT DATE)]"
+
+
+def _wait_readable(server: imaplib.IMAP4, timeout: float) -> bool:
+    """
+    Wait up to ``timeout`` seconds for input on an imaplib connection.
+
+    Bytes already decrypted by the SSL layer or read ahead into imaplib's
+    buffered file are invisible to select(), so both are checked first.
+    Leaves the socket in timeout mode (_IDLE_GRACE_SECONDS) for the next readline.
+    """
+    sock = server.sock
+    if isinstance(sock, ssl.SSLSocket) and sock.pending():
+        return True
+    sock.setblocking(False)
+    try:
+        if server.file.peek(1):
+            return True
+    except ssl.SSLWantReadError:
+        pass
+    finally:
+        sock.settimeout(_IDLE_GRACE_SECONDS)
+    if timeout <= 0:
+        return False
+    readable, _, _ = select.select([sock], [], [], timeout)
+    return bool(readable)
+
+
 def _has_imap_config() -> bool:
     return bool(IMAP_SERVER and EMAIL_ADDRESS and EMAIL_APP_PASSWORD)
 
 
+def _chunked(items: List, size: int) -> Iterator[List]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _split_by_size(uids: List[int], sizes: Dict[int, int], limit: int) -> Iterator[List[int]]:
+    """Group UIDs into runs whose sizes add up to at most ``limit`` (a larger message goes alone)."""
+    group, total = [], 0
+    for uid in uids:
+        size = sizes.get(uid, 0)
+        if group and total + size > limit:
+            yield group
+            group, total = [], 0
+        group.append(uid)
+        total += size
+    if group:
+        yield group
+
+
+def _build_message_set(ids: Iterable[int]) -> str:
+    """Compress message numbers into an IMAP message set, e.g. ``1:500,502``."""
+    ranges = []
+    for num in sorted(set(ids)):
+        if ranges and num == ranges[-1][1] + 1:
+            ranges[-1][1] = num
+        else:
+            ranges.append([num, num])
+    return ",".join(str(lo) if lo == hi else f"{lo}:{hi}" for lo, hi in ranges)
+
+
+def _iter_fetch_literals(msg_data: List) -> Iterator[Tuple[bytes, bytes]]:
+    """
+    Yield ``(uid, literal)`` pairs from a multi-message UID FETCH response.
+
+    imaplib returns each message as a ``(header, literal)`` tuple followed by the
+    rest of the response line (usually just ``b")"``). Servers may send the UID
+    item before or after the literal, so both places are checked.
+    """
+    for index, item in enumerate(msg_data):
+        if not isinstance(item, tuple):
+            continue
+        match = _FETCH_UID_RE.search(item[0])
+        if not match and index + 1 < len(msg_data) and isinstance(msg_data[index + 1], bytes):
+            match = _FETCH_UID_RE.search(msg_data[index + 1])
+        if not match:
+            continue
+        yield match.group(1), item[1]
+
+
+def _iter_imap_tokens(msg_data: List) -> Iterator:
+    """Tokenize an imaplib response, splicing literals back in as bytes values."""
+    for item in msg_data:
+        if item is None:
+            continue
+        if isinstance(item, tuple):
+            text, literal = item[0], item[1]
+        else:
+            text, literal = item, None
+        text = _LITERAL_MARKER_RE.sub(b"", text.rstrip()) if literal is not None else text
+        for match in _IMAP_TOKEN_RE.finditer(text):
+            token = match.group(0)
+            if token == b"(":
+                yield _OPEN
+            elif token == b")":
+                yield _CLOSE
+            elif token.startswith(b'"'):
+                yield re.sub(rb'\\(.)', rb"\1", token[1:-1])
+            elif token.upper() == b"NIL":
+                yield None
+            else:
+                yield token
+        if literal is not None:
+            yield literal
+
+
+def _parse_fetch_items(msg_data: List) -> List[Dict[bytes, object]]:
+    """
+    Parse a FETCH response into one ``{ITEM: value}`` dict per message.
+
+    Parenthesized lists become nested Python lists, NIL becomes None and
+    strings/atoms/literals stay bytes. Item names are upper-cased.
+    """
+    stack = [[]]
+    for token in _iter_imap_tokens(msg_data):
+        if token is _OPEN:
+            stack.append([])
+        elif token is _CLOSE:
+            if len(stack) > 1:
+                done = stack.pop()
+                stack[-1].append(done)
+        else:
+            stack[-1].append(token)
+
+    messages = []
+    for entry in stack[0]:
+        if not isinstance(entry, list):
+            continue
+        items = {}
+        for key, value in zip(entry[::2], entry[1::2]):
+            if isinstance(key, bytes):
+                items[key.upper()] = value
+        messages.append(items)
+    return messages
+
+
+def _as_text(value) -> str:
+    if isinstance(value, bytes):
+        return value.decode("ascii", errors="ignore")
+    return ""
+
+
+def _find_text_section(structure, prefix: str = "") -> Optional[Tuple[str, str, str, str]]:
+    """
+    Pick the body section to download from a parsed BODYSTRUCTURE.
+
+    Returns ``(section, subtype, charset, transfer_encoding)`` for the first
+    inline text/plain part, else the first inline text/html part, or None.
+    Attached messages (message/rfc822) are not descended into.
+    """
+    candidates = []
+
+    def walk(node, section):
+        if not isinstance(node, list) or not node:
+            return
+        if isinstance(node[0], list):
+            children = [child for child in node if isinstance(child, list)]
+            for index, child in enumerate(children, start=1):
+                walk(child, f"{section}.{index}" if section else str(index))
+            return
+        if len(node) < 7:
+            return
+        main_type = _as_text(node[0]).lower()
+        subtype = _as_text(node[1]).lower()
+        if main_type != "text" or subtype not in ("plain", "html"):
+            return
+        # text parts: type subtype params id desc encoding size lines md5 disposition
+        disposition = node[9] if len(node) > 9 else None
+        if isinstance(disposition, list) and _as_text(disposition[0]).lower() == "attachment":
+            return
+        params = node[2] if isinstance(node[2], list) else []
+        charset = ""
+        for key, value in zip(params[::2], params[1::2]):
+            if _as_text(key).lower() == "charset":
+                charset = _as_text(value)
+        candidates.append((section or "1", subtype, charset, _as_text(node[5]).lower()))
+
+    walk(structure, prefix)
+    for wanted in ("plain", "html"):
+        for candidate in candidates:
+            if candidate[1] == wanted:
+                return candidate
+    return None
+
+
+def load_mailboxes(path: str = MAILBOXES_FILE) -> List[Dict]:
+    """
+    Read the mailbox list used for multi-mailbox runs
+    
+    The file is a JSON list of objects with ``email_address``, ``imap_server``
+    and ``app_password`` (or ``app_password_env``, the name of an environment
+    variable holding it), plus optional ``name``, ``imap_port``, ``use_ssl``
+    and ``folders`` (default ``["INBOX"]``). Without a file, the single
+    mailbox from IMAP_SERVER/EMAIL_ADDRESS/EMAIL_APP_PASSWORD is returned.
+    
+    Args:
+        path: JSON file (default: MAILBOXES_FILE)
+    
+    Returns:
+        List of mailbox dicts with every field filled in
+    """
+    if not path:
+        if not _has_imap_config():
+            return []
+        return [{
+            "name": EMAIL_ADDRESS, "email_address": EMAIL_ADDRESS, "app_password": EMAIL_APP_PASSWORD,
+            "imap_server": IMAP_SERVER, "imap_port": IMAP_PORT, "use_ssl": IMAP_USE_SSL, "folders": ["INBOX"],
+        }]
+
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)
+    mailboxes, names = [], set()
+    for index, entry in enumerate(entries, start=1):
+        password = entry.get("app_password") or os.getenv(entry.get("app_password_env", ""), "")
+        if not (entry.get("email_address") and entry.get("imap_server") and password):
+            raise ValueError(f"{path}: mailbox #{index} needs email_address, imap_server and app_password")
+        name = entry.get("name") or entry["email_address"]
+        if name in names:
+            raise ValueError(f"{path}: duplicate mailbox name {name!r}")
+        names.add(name)
+        mailboxes.append({
+            "name": name,
+            "email_address": entry["email_address"],
+            "app_password": password,
+            "imap_server": entry["imap_server"],
+            "imap_port": int(entry.get("imap_port", IMAP_PORT)),
+            "use_ssl": bool(entry.get("use_ssl", IMAP_USE_SSL)),
+            "folders": list(entry.get("folders") or ["INBOX"]),
+        })
+    return mailboxes
+
+
 class EmailReceiver:
-    def __init__(self):
+    def __init__(self, checkpoint_db: Optional[ReviewDatabase] = None, mailbox: Optional[Dict] = None):
+        """
+        Args:
+            checkpoint_db: Database holding the UID checkpoints (None disables them)
+            mailbox: An entry from load_mailboxes(); its name then prefixes email ids
+                ("name:folder:uidvalidity:uid") so UIDs of different mailboxes never collide.
+                Default: the single mailbox from IMAP_SERVER/EMAIL_ADDRESS/EMAIL_APP_PASSWORD
+        """
         self.server = None
-        self.email_address = EMAIL_ADDRESS
-        self.app_password = EMAIL_APP_PASSWORD
+        self.checkpoint_db = checkpoint_db
+        self.mailbox_name = mailbox["name"] if mailbox else ""
+        self.email_address = mailbox["email_address"] if mailbox else EMAIL_ADDRESS
+        self.app_password = mailbox["app_password"] if mailbox else EMAIL_APP_PASSWORD
+        self.imap_server = mailbox["imap_server"] if mailbox else IMAP_SERVER
+        self.imap_port = mailbox["imap_port"] if mailbox else IMAP_PORT
+        self.use_ssl = mailbox["use_ssl"] if mailbox else IMAP_USE_SSL
+        self._folder = "INBOX"
+        self._uidvalidity = None
+        # (folder, uid) of persisted emails still to be flagged \Seen; filled from any thread
+        self._processed: List[Tuple[str, int]] = []
+        self._processed_lock = threading.Lock()
+        # folder -> (uidvalidity, last_uid) last written by mark_processed
+        self._checkpoints: Dict[str, Tuple[int, int]] = {}
 
     def connect(self):
         """Connect to IMAP server"""
         try:
-            if not _has_imap_config():
+            if not (self.imap_server and self.email_address and self.app_password):
                 raise ValueError("Missing IMAP configuration (IMAP_SERVER/EMAIL_ADDRESS/EMAIL_APP_PASSWORD).")
-            if IMAP_USE_SSL:
-                self.server = imaplib.IMAP4_SSL(IMAP_SERVER, IMAP_PORT)
+            if self.use_ssl:
+                self.server = imaplib.IMAP4_SSL(self.imap_server, self.imap_port)
             else:
-                self.server = imaplib.IMAP4(IMAP_SERVER, IMAP_PORT)
+                self.server = imaplib.IMAP4(self.imap_server, self.imap_port)
             
             self.server.login(self.email_address, self.app_password)
-            logger.info(f"✅ Connected to {IMAP_SERVER} as {self.email_address}")
+            logger.info(f"✅ Connected to {self.imap_server} as {self.email_address}")
         except imaplib.IMAP4.error as e:
             logger.error(f"❌ IMAP login failed: {e}")
             raise
@@ -51,64 +321,247 @@ class EmailReceiver:
             self.server.logout()
             logger.info("Disconnected from IMAP server")
 
-    def fetch_emails(self, folder: str = "INBOX", unread_only: bool = True) -> List[Dict]:
+    def fetch_emails(self, folder: str = "INBOX", unread_only: bool = True,
+                     batch_size: int = IMAP_FETCH_BATCH_SIZE,
+                     incremental: bool = IMAP_INCREMENTAL_SYNC,
+                     keep_raw: bool = False,
+                     fetch_mode: str = IMAP_FETCH_MODE) -> List[EmailRecord]:
         """
         Fetch emails from specified folder
         
         Args:
             folder: Mailbox folder name (default: INBOX)
             unread_only: Only fetch unread emails (default: True)
+            batch_size: Messages requested per FETCH round trip
+            incremental: Resume from the stored UID checkpoint (default: IMAP_INCREMENTAL_SYNC)
+            keep_raw: Keep the parsed Message object under "raw_message"
+            fetch_mode: "full" (whole message) or "partial" (headers + text slice)
         
         Returns:
-            List of dictionaries with email data
+            List of EmailRecords (dict-compatible) with email data
         """
-        emails = []
+        emails = list(self.iter_emails(folder, unread_only, batch_size, incremental, keep_raw, fetch_mode))
+        logger.info(f"✅ Fetched {len(emails)} emails from {folder}")
+        return emails
+
+    def iter_emails(self, folder: str = "INBOX", unread_only: bool = True,
+                    batch_size: int = IMAP_FETCH_BATCH_SIZE,
+                    incremental: bool = IMAP_INCREMENTAL_SYNC,
+                    keep_raw: bool = False,
+                    fetch_mode: str = IMAP_FETCH_MODE) -> Iterator[EmailRecord]:
+        """
+        Yield emails from specified folder one at a time
+        
+        Messages are addressed by UID. With ``incremental`` and a checkpoint
+        database, only UIDs above the last processed checkpoint are searched.
+        Only one FETCH batch is held in memory at a time; if a batch cannot be
+        fetched, iteration stops there.
+        
+        Messages are read with BODY.PEEK, so fetching never sets \\Seen. Pass
+        the emails to mark_processed() once their reviews are persisted: that
+        advances the checkpoint and queues the \\Seen flags, so neither runs
+        ahead of what was actually saved.
+        
+        In "full" mode each batch is split by RFC822.SIZE so one FETCH holds at
+        most IMAP_FETCH_BATCH_BYTES of messages. In "partial" mode the
+        BODYSTRUCTURE is read first and only the headers plus a byte-limited
+        slice of the chosen text part are downloaded, so attachments are never
+        transferred.
+        
+        Args:
+            folder: Mailbox folder name (default: INBOX)
+            unread_only: Only fetch unread emails (default: True)
+            batch_size: Messages requested per FETCH round trip
+            incremental: Resume from the stored UID checkpoint (default: IMAP_INCREMENTAL_SYNC)
+            keep_raw: Keep the parsed Message object under "raw_message"
+            fetch_mode: "full" (whole message) or "partial" (headers + text slice)
         
+        Yields:
+            EmailRecords (dict-compatible) with email data
+
+        Raises:
+            imaplib.IMAP4.error, OSError: The IMAP session failed (logged, then re-raised)
+        """
         try:
+            # Flags of the previous folder's persisted emails are set while it is still selected
+            self.flush_processed()
             # Select the folder
+            self._folder = folder
             self.server.select(folder, readonly=False)
+            uidvalidity = self._uidvalidity = self._get_uidvalidity()
             
             # Search for emails
+            last_uid = 0
+            use_checkpoint = incremental and self.checkpoint_db is not None and uidvalidity is not None
+            if use_checkpoint:
+                checkpoint = self.checkpoint_db.get_checkpoint(self.email_address, folder)
+                if checkpoint and checkpoint[0] == uidvalidity:
+                    last_uid = checkpoint[1]
+                elif checkpoint:
+                    logger.warning(f"UIDVALIDITY of {folder} changed, resyncing from scratch")
+            
+            criteria = []
+            if last_uid:
+                criteria.append(f"UID {last_uid + 1}:*")
             if unread_only:
-                search_criteria = "UNSEEN"
-            else:
-                search_criteria = "ALL"
+                criteria.append("UNSEEN")
+            search_criteria = " ".join(criteria) or "ALL"
             
-            status, message_ids = self.server.search(None, search_criteria)
+            with metrics.track("imap_search"):
+                status, message_ids = self.server.uid("SEARCH", None, search_criteria)
             
-            if status != "OK" or not message_ids[0]:
+            # "UID n:*" always matches the highest UID, even when it is below n
+            uids = [uid for uid in (int(uid) for uid in (message_ids[0] or b"").split()) if uid > last_uid]
+            if status != "OK" or not uids:
                 logger.info(f"No {search_criteria} emails in {folder}")
-                return emails
+                return
             
-            # Fetch each email
-            for msg_id in message_ids[0].split():
-                status, msg_data = self.server.fetch(msg_id, "(RFC822)")
-                
-                if status != "OK":
-                    logger.warning(f"Failed to fetch email {msg_id}")
-                    continue
-                
-                raw_email = msg_data[0][1]
-                msg = email.message_from_bytes(raw_email)
-                
-                # Parse email
-                email_dict = self._parse_email(msg, msg_id.decode())
-                emails.append(email_dict)
-            
-            logger.info(f"✅ Fetched {len(emails)} emails from {folder}")
-            return emails
+            # Fetch in batches: one round trip per message set instead of per message
+            iter_batch = self._iter_partial_batch if fetch_mode == "partial" else self._iter_full_batch
+            for batch in _chunked(uids, batch_size):
+                self.flush_processed()
+                message_set = _build_message_set(batch)
+                if not (yield from iter_batch(message_set, keep_raw)):
+                    # Later batches would move the checkpoint past these UIDs; retry them next run
+                    logger.warning(f"Failed to fetch emails {message_set}, stopping")
+                    break
             
+        except (imaplib.IMAP4.error, OSError) as e:
+            # The session is unusable; callers reconnect or report the mailbox as failed
+            logger.error(f"❌ Error fetching emails: {e}")
+            raise
         except Exception as e:
             logger.error(f"❌ Error fetching emails: {e}")
-            return emails
 
-    def _parse_email(self, msg: email.message.Message, msg_id: str) -> Dict:
+    def _get_uidvalidity(self) -> Optional[int]:
+        """Read UIDVALIDITY from the untagged responses of the last SELECT."""
+        _, data = self.server.response("UIDVALIDITY")
+        if not data or data[0] is None:
+            return None
+        try:
+            return int(data[-1])
+        except (TypeError, ValueError):
+            return None
+
+    def _iter_full_batch(self, message_set: str, keep_raw: bool = False) -> Generator[EmailRecord, None, bool]:
+        """
+        Fetch one batch as whole messages, at most IMAP_FETCH_BATCH_BYTES per FETCH
+
+        RFC822.SIZE is read first so a batch of large messages is split into
+        smaller FETCH commands instead of being held in memory all at once.
+
+        Returns:
+            False if any FETCH of the batch failed
+        """
+        with metrics.track("imap_fetch"):
+            status, msg_data = self.server.uid("FETCH", message_set, "(UID RFC822.SIZE)")
+        if status != "OK":
+            return False
+        sizes = {}
+        for items in _parse_fetch_items(msg_data):
+            if items.get(b"UID") is not None:
+                size = items.get(b"RFC822.SIZE")
+                sizes[int(items[b"UID"])] = int(size) if isinstance(size, bytes) and size.isdigit() else 0
+
+        for uids in _split_by_size(sorted(sizes), sizes, IMAP_FETCH_BATCH_BYTES):
+            with metrics.track("imap_fetch", emails=len(uids)):
+                status, msg_data = self.server.uid("FETCH", _build_message_set(uids), "(UID BODY.PEEK[])")
+            if status != "OK":
+                return False
+            for msg_id, raw_email in _iter_fetch_literals(msg_data):
+                with metrics.track("mime_parse", emails=1):
+                    msg = email.message_from_bytes(raw_email)
+                    parsed = self._parse_email(msg, msg_id.decode(), keep_raw=keep_raw)
+                yield parsed
+            del msg_data
+        return True
+
+    def _iter_partial_batch(self, message_set: str, keep_raw: bool = False) -> Generator[EmailRecord, None, bool]:
+        """
+        Fetch one batch using BODYSTRUCTURE and BODY.PEEK partial sections
+
+        Returns:
+            False (before yielding anything) if any FETCH of the batch failed
+        """
+        with metrics.track("imap_fetch"):
+            status, msg_data = self.server.uid("FETCH", message_set, "(UID BODYSTRUCTURE)")
+        if status != "OK":
+            logger.warning(f"Failed to fetch BODYSTRUCTURE for {message_set}")
+            return False
+
+        # Group messages by their text section so each distinct section costs one round trip
+        sections = {}
+        for items in _parse_fetch_items(msg_data):
+            uid = items.get(b"UID")
+            if uid is None:
+                continue
+            text_part = _find_text_section(items.get(b"BODYSTRUCTURE"))
+            key = text_part[0] if text_part else None
+            sections.setdefault(key, {})[int(uid)] = text_part
+
+        fetched = {}
+        for section, parts in sections.items():
+            # A slice that reduces to no text (e.g. HTML whose <head>/<style> fills it)
+            # is fetched again, eight times larger, up to the extractor's scan limit
+            size = IMAP_PARTIAL_BODY_BYTES
+            while parts:
+                query = f"(UID {_HEADER_FIELDS}" if size == IMAP_PARTIAL_BODY_BYTES else "(UID"
+                if section:
+                    query += f" BODY.PEEK[{section}]<0.{size}>"
+                query += ")"
+                with metrics.track("imap_fetch", emails=len(parts)):
+                    status, msg_data = self.server.uid("FETCH", _build_message_set(parts), query)
+                if status != "OK":
+                    logger.warning(f"Failed to fetch section {section} for {message_set}")
+                    return False
+                retry = {}
+                for items in _parse_fetch_items(msg_data):
+                    uid = items.get(b"UID")
+                    if uid is None or int(uid) not in parts:
+                        continue
+                    uid = int(uid)
+                    headers, body_data = None, b""
+                    for key, value in items.items():
+                        if not key.startswith(b"BODY[") or not isinstance(value, bytes):
+                            continue
+                        if key.startswith(b"BODY[HEADER"):
+                            headers = value
+                        else:
+                            body_data = value
+                    text_part = parts[uid]
+                    with metrics.track("mime_parse", emails=1):
+                        body = ""
+                        if text_part and body_data:
+                            body = decode_body(body_data, text_part[3], text_part[2], text_part[1])
+                        header_msg = email.message_from_bytes(headers) if headers is not None else fetched[uid][0]
+                        fetched[uid] = (header_msg, body)
+                    if not body and text_part and len(body_data) >= size and size < _MAX_SCAN_BYTES:
+                        retry[uid] = text_part
+                parts = retry
+                size = min(size * 8, _MAX_SCAN_BYTES)
+
+        for uid in sorted(fetched):
+            header_msg, body = fetched[uid]
+            yield self._build_email_record(header_msg, str(uid), body, keep_raw=keep_raw)
+        return True
+
+    def _parse_email(self, msg: email.message.Message, msg_id: str, keep_raw: bool = False) -> EmailRecord:
         """Parse email message into structured data"""
         
-        # Decode subject
-        subject, _ = decode_header(msg.get("Subject", ""))[0] if msg.get("Subject") else ("", None)
-        if isinstance(subject, bytes):
-            subject = subject.decode('utf-8', errors='ignore')
+        # Plain text preferred, else HTML reduced to text; only the bytes needed are decoded
+        body = extract_body(msg)
+        
+        return self._build_email_record(msg, msg_id, body, keep_raw=keep_raw)
+
+    def _build_email_record(self, msg: email.message.Message, msg_id: str, body: str,
+                            keep_raw: bool = False) -> EmailRecord:
+        """Combine decoded headers and an extracted body into the email record"""
+        
+        # Decode subject (every encoded-word, each with its own charset)
+        subject = "".join(
+            decode_bytes(fragment, charset) if isinstance(fragment, bytes) else fragment
+            for fragment, charset in decode_header(msg.get("Subject", ""))
+        )
         
         # Get sender
         from_addr = msg.get("From", "")
@@ -116,57 +569,178 @@ class EmailReceiver:
         # Get date
         date = msg.get("Date", "")
         
-        # Extract body (plain text preferred, fallback to HTML)
-        body = ""
-        if msg.is_multipart():
-            for part in msg.walk():
-                if part.get_content_type() == "text/plain":
-                    try:
-                        body = part.get_payload(decode=True).decode('utf-8', errors='ignore')
-                        break
-                    except:
-                        pass
-                elif part.get_content_type() == "text/html" and not body:
-                    try:
-                        body = part.get_payload(decode=True).decode('utf-8', errors='ignore')
-                    except:
-                        pass
-        else:
-            try:
-                body = msg.get_payload(decode=True).decode('utf-8', errors='ignore')
-            except:
-                body = msg.get_payload()
-        
         # Clean up body
-        body = body.strip()[:1000]  # First 1000 chars
+        body = body.strip()[:EMAIL_BODY_MAX_CHARS]
         
-        return {
-            "id": msg_id,
-            "from": from_addr,
-            "subject": subject,
-            "body": body,
-            "date": date,
-            "raw_message": msg
-        }
+        # A UID alone is only unique within one folder and UIDVALIDITY epoch
+        uid = int(msg_id)
+        msg_id = f"{self._folder}:{self._uidvalidity or 0}:{uid}"
+        if self.mailbox_name:
+            msg_id = f"{self.mailbox_name}:{msg_id}"
+        record = EmailRecord(msg_id, from_addr, subject, body, date)
+        record.folder, record.uidvalidity, record.uid = self._folder, self._uidvalidity, uid
+        if self.mailbox_name:
+            record.mailbox = self.mailbox_name
+        if keep_raw:
+            record.raw_message = msg
+        return record
+
+    def supports_idle(self) -> bool:
+        return "IDLE" in getattr(self.server, "capabilities", ())
+
+    def idle(self, timeout: float = IMAP_IDLE_REFRESH_SECONDS) -> bool:
+        """
+        Wait in IMAP IDLE (RFC 2177) until the server reports new mail or ``timeout`` passes
+        
+        imaplib on Python < 3.14 has no IDLE, so the command is driven by hand on
+        the selected folder. DONE is sent as soon as an EXISTS response arrives,
+        or once ``timeout`` passes without input so the session is refreshed
+        before servers drop it. Everything happens on the calling thread (an SSL
+        connection must not be written while another thread reads it). A server
+        that stays silent even after DONE leaves the socket timeout to fire, and
+        the connection must then be discarded.
+        
+        Args:
+            timeout: Seconds to stay idle before refreshing
+        
+        Returns:
+            True if new messages were announced, False on a plain refresh
+        
+        Raises:
+            imaplib.IMAP4.error / OSError when the command fails or the connection drops
+        """
+        server = self.server
+
+        def read_line() -> bytes:
+            line = server.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("socket error: EOF during IDLE")
+            return line
+
+        tag = server._new_tag()
+        server.send(tag + b" IDLE\r\n")
+        new_mail = False
+        # Untagged responses queued before the command may precede the continuation
+        line = read_line()
+        while not line.startswith(b"+"):
+            if line.startswith(tag):
+                raise imaplib.IMAP4.error(f"IDLE rejected: {line.decode(errors='replace').strip()}")
+            new_mail = new_mail or bool(_EXISTS_RE.match(line))
+            line = read_line()
+
+        done_sent = False
+
+        def send_done():
+            nonlocal done_sent
+            if done_sent:
+                return
+            done_sent = True
+            try:
+                server.send(b"DONE\r\n")
+            except OSError:
+                pass
+
+        if new_mail:
+            send_done()
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                if not done_sent and not _wait_readable(server, deadline - time.monotonic()):
+                    send_done()
+                    continue
+                line = read_line()
+                if line.startswith(tag):
+                    if not line[len(tag):].strip().upper().startswith(b"OK"):
+                        raise imaplib.IMAP4.error(f"IDLE failed: {line.decode(errors='replace').strip()}")
+                    break
+                if line.startswith(b"* BYE"):
+                    raise imaplib.IMAP4.abort(f"server closed IDLE: {line.decode(errors='replace').strip()}")
+                if _EXISTS_RE.match(line):
+                    new_mail = True
+                    send_done()
+        finally:
+            server.tagged_commands.pop(tag, None)
+            try:
+                server.sock.settimeout(None)
+            except OSError:
+                pass
+        return new_mail
+
+    def mark_processed(self, emails: Iterable):
+        """
+        Note that ``emails`` (records from this receiver) were persisted
+
+        Safe to call from any thread; call it in the order the emails were
+        fetched. The UID checkpoint of each folder is advanced right away, and
+        the emails are flagged \\Seen by the next flush_processed(), which
+        iter_emails runs between FETCH batches.
+        """
+        emails = [record for record in emails if record.get("uid") is not None]
+        with self._processed_lock:
+            self._processed.extend((record.get("folder"), record["uid"]) for record in emails)
+            if self.checkpoint_db is not None:
+                self._advance_checkpoints(emails)
+
+    def _advance_checkpoints(self, emails: List):
+        highest = {}
+        for record in emails:
+            key = (record.get("folder"), record.get("uidvalidity"))
+            if key[1] is not None:
+                highest[key] = max(highest.get(key, 0), record["uid"])
+        for (folder, uidvalidity), uid in highest.items():
+            saved = self._checkpoints.get(folder) or self.checkpoint_db.get_checkpoint(self.email_address, folder)
+            # Never move backwards, e.g. for an email replayed from an interrupted run
+            if saved and saved[0] == uidvalidity and saved[1] >= uid:
+                continue
+            self.checkpoint_db.save_checkpoint(self.email_address, folder, uidvalidity, uid)
+            self._checkpoints[folder] = (uidvalidity, uid)
+
+    def flush_processed(self):
+        """Flag persisted emails \\Seen; only call from the thread that uses the IMAP session."""
+        with self._processed_lock:
+            processed, self._processed = self._processed, []
+        if not processed or self.server is None:
+            return
+        by_folder = {}
+        for folder, uid in processed:
+            by_folder.setdefault(folder, []).append(uid)
+        current = self._folder
+        for folder, uids in by_folder.items():
+            if folder != current:
+                self.server.select(folder, readonly=False)
+            for chunk in _chunked(uids, IMAP_FETCH_BATCH_SIZE):
+                self.server.uid("STORE", _build_message_set(chunk), "+FLAGS.SILENT", "(\\Seen)")
+            if folder != current:
+                self.server.select(current, readonly=False)
 
     def mark_as_read(self, msg_id: str):
         """Mark email as read"""
         try:
-            self.server.store(msg_id, '+FLAGS', '\\Seen')
+            # Qualified ids ("folder:uidvalidity:uid") end with the UID
+            self.server.uid("STORE", msg_id.rsplit(":", 1)[-1], '+FLAGS', '\\Seen')
             logger.info(f"Marked email {msg_id} as read")
         except Exception as e:
             logger.error(f"Error marking email as read: {e}")
 
 
-def fetch_unread_emails(folder: str = "INBOX") -> List[Dict]:
+def fetch_unread_emails(folder: str = "INBOX") -> List[EmailRecord]:
     """Convenience wrapper to fetch unread emails with automatic connect/disconnect."""
-    receiver = EmailReceiver()
+    return list(iter_unread_emails(folder))
+
+
+def iter_unread_emails(folder: str = "INBOX", keep_raw: bool = False) -> Iterator[EmailRecord]:
+    """Streaming variant of fetch_unread_emails; the session stays open until the generator is exhausted or closed."""
     if not _has_imap_config():
         logger.warning("IMAP configuration missing. No emails fetched.")
-        return []
+        return
+    receiver = EmailReceiver(checkpoint_db=ReviewDatabase() if IMAP_INCREMENTAL_SYNC else None)
     try:
         receiver.connect()
-        return receiver.fetch_emails(folder=folder, unread_only=PROCESS_UNSEEN_ONLY)
+        for email_obj in receiver.iter_emails(folder=folder, unread_only=PROCESS_UNSEEN_ONLY, keep_raw=keep_raw):
+            yield email_obj
+            # The caller is done with it once it asks for the next one
+            receiver.mark_processed([email_obj])
+        receiver.flush_processed()
     finally:
         receiver.disconnect()
 
@@ -0,0 +1,186 @@
+"""
+Compact per-email record passed through the pipeline.
+
+EmailReceiver produces one EmailRecord per message; near-duplicate tagging,
+classification and drafting fill in their fields in place, and the CSV writer
+and ReviewDatabase.save_reviews serialize it straight into rows. It behaves
+like the email dicts used before (``record["from"]``, ``.get()``, ``in``,
+``{**record}``), so code written against dicts keeps working.
+"""
+
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, Mapping, Optional, Tuple
+
+# Dict key -> attribute ("from" is a Python keyword)
+_FIELDS = (
+    ("id", "id"),
+    ("from", "sender"),
+    ("subject", "subject"),
+    ("body", "body"),
+    ("date", "date"),
+    ("mailbox", "mailbox"),
+    # Where the message lives on the IMAP server, for flags and UID checkpoints
+    ("folder", "folder"),
+    ("uidvalidity", "uidvalidity"),
+    ("uid", "uid"),
+    ("raw_message", "raw_message"),
+    ("fingerprint", "fingerprint"),
+    ("cluster_id", "cluster_id"),
+    ("category", "category"),
+    ("confidence", "confidence"),
+    ("reply", "reply"),
+    ("risk_flag", "risk_flag"),
+)
+_ATTRS = dict(_FIELDS)
+
+# Review CSV columns, in the order of EmailRecord.csv_row()
+CSV_FIELDS = [
+    'email_id',
+    'from',
+    'subject',
+    'category',
+    'confidence',
+    'original_body',
+    'suggested_reply',
+    'status',  # pending_review, approved, rejected
+    'reviewer_notes',
+    'received_date',
+    'risk_flag',
+    'cluster_id',
+]
+# Characters of the body copied into the review CSV
+CSV_BODY_CHARS = 500
+
+
+class EmailRecord(MutableMapping):
+    """
+    One email with its classification, draft and risk fields
+
+    Fields that were never set are absent, exactly like a missing dict key.
+    Keys outside the known fields (e.g. "status" on a reviewed row) are kept
+    in a small side dict that is only created when needed.
+    """
+
+    __slots__ = tuple(attr for _, attr in _FIELDS) + ("extra",)
+
+    def __init__(self, id: str = "", sender: str = "", subject: str = "", body: str = "", date: str = "",
+                 **fields):
+        self.id = id
+        self.sender = sender
+        self.subject = subject
+        self.body = body
+        self.date = date
+        for key, value in fields.items():
+            self[key] = value
+
+    @classmethod
+    def from_mapping(cls, data: Mapping) -> "EmailRecord":
+        """Build a record from an email dict (or any mapping with the same keys)."""
+        record = cls.__new__(cls)
+        for key, value in data.items():
+            record[key] = value
+        return record
+
+    def __getitem__(self, key: str) -> Any:
+        attr = _ATTRS.get(key)
+        try:
+            if attr is not None:
+                return getattr(self, attr)
+            return self.extra[key]
+        except (AttributeError, KeyError):
+            raise KeyError(key) from None
+
+    def __setitem__(self, key: str, value: Any):
+        attr = _ATTRS.get(key)
+        if attr is not None:
+            setattr(self, attr, value)
+            return
+        extra = getattr(self, "extra", None)
+        if extra is None:
+            extra = self.extra = {}
+        extra[key] = value
+
+    def __delitem__(self, key: str):
+        attr = _ATTRS.get(key)
+        try:
+            if attr is not None:
+                delattr(self, attr)
+            else:
+                del self.extra[key]
+        except (AttributeError, KeyError):
+            raise KeyError(key) from None
+
+    def __iter__(self) -> Iterator[str]:
+        for key, attr in _FIELDS:
+            if hasattr(self, attr):
+                yield key
+        yield from getattr(self, "extra", None) or ()
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __contains__(self, key) -> bool:
+        attr = _ATTRS.get(key)
+        if attr is not None:
+            return hasattr(self, attr)
+        return key in (getattr(self, "extra", None) or ())
+
+    def get(self, key: str, default: Any = None) -> Any:
+        # Called for every field of every email; avoid the KeyError round trip of Mapping.get
+        attr = _ATTRS.get(key)
+        if attr is not None:
+            return getattr(self, attr, default)
+        extra = getattr(self, "extra", None)
+        return extra.get(key, default) if extra else default
+
+    def __repr__(self) -> str:
+        return f"EmailRecord({dict(self)!r})"
+
+    def copy(self) -> "EmailRecord":
+        return EmailRecord.from_mapping(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self)
+
+    def csv_row(self) -> Tuple:
+        """Values for the review CSV, in CSV_FIELDS order."""
+        return (
+            getattr(self, "id", ""),
+            getattr(self, "sender", ""),
+            getattr(self, "subject", ""),
+            getattr(self, "category", ""),
+            getattr(self, "confidence", ""),
+            getattr(self, "body", "")[:CSV_BODY_CHARS],
+            getattr(self, "reply", ""),
+            "pending_review",
+            "",
+            getattr(self, "date", ""),
+            getattr(self, "risk_flag", ""),
+            getattr(self, "cluster_id", None) or "",
+        )
+
+    def db_row(self, created_at: str) -> Tuple:
+        """Values for an email_reviews insert, in ReviewDatabase.save_reviews column order."""
+        return (
+            getattr(self, "id", ""),
+            getattr(self, "sender", ""),
+            getattr(self, "subject", ""),
+            getattr(self, "category", ""),
+            getattr(self, "confidence", 0.0),
+            getattr(self, "body", ""),
+            getattr(self, "reply", ""),
+            self.get("status", "pending_review"),
+            self.get("reviewer_notes", ""),
+            getattr(self, "date", ""),
+            getattr(self, "risk_flag", ""),
+            created_at,
+            getattr(self, "fingerprint", None),
+            getattr(self, "cluster_id", None),
+        )
+
+
+def as_record(email: Optional[Mapping]) -> Optional[EmailRecord]:
+    """Return ``email`` itself if it is already an EmailRecord, else a record copied from the dict."""
+    if email is None or isinstance(email, EmailRecord):
+        return email
+    return EmailRecord.from_mapping(email)
@@ -2,18 +2,34 @@
 Generate intelligent email replies based on classification and history
 """
 
-from typing import Dict
-from config import OPENAI_API_KEY, LLM_MODEL, REPLY_TEMPLATE, TONE_GUIDANCE, DEFAULT_SIGNATURE
+from typing import Dict, Tuple
+from config import (
+    OPENAI_API_KEY, OPENAI_API_BASE, LLM_MODEL, REPLY_TEMPLATE, TONE_GUIDANCE, DEFAULT_SIGNATURE,
+    LLM_CACHE_ENABLED,
+)
+from llm_cache import LLMCache
+import metrics
 import logging
+import json
+import re
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Bump whenever the reply prompt changes so stale cache entries are ignored
+REPLY_PROMPT_VERSION = "reply-v1"
+COMBINED_PROMPT_VERSION = "classify-reply-v1"
+
+_CODE_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
 
 class ReplyGenerator:
-    def __init__(self):
+    def __init__(self, cache: LLMCache = None):
         self.use_llm = bool(OPENAI_API_KEY)
         self.custom_template = REPLY_TEMPLATE.strip()
+        self.cache = cache
+        if self.cache is None and self.use_llm and LLM_CACHE_ENABLED:
+            self.cache = LLMCache()
         
         # Template replies for each category
         self.templates = {
@@ -68,49 +84,159 @@ Customer Support Team"""
             return self._generate_with_llm(email_obj, category)
         return self._get_template(category, email_obj)
 
+    def _style_key(self, category: str = "") -> str:
+        """Category and style settings shape the draft, so they are part of cache keys"""
+        return "\x00".join((category, self.custom_template, TONE_GUIDANCE, DEFAULT_SIGNATURE))
+
+    def _reply_requirements(self) -> str:
+        template_hint = ""
+        if self.custom_template:
+            template_hint = (
+                "\n请遵循以下售后模板（可根据内容微调，但保持结构与关键措辞）：\n"
+                f"{self.custom_template}\n"
+            )
+        return (
+            f"{template_hint}"
+            "要求：\n"
+            "1. 简洁清晰，2-4 句为宜\n"
+            "2. 表达感谢并确认问题\n"
+            "3. 告知下一步处理（例如处理时效或需要的补充信息）\n"
+            f"4. 语气要求：{TONE_GUIDANCE}\n"
+            f"5. 署名使用：{DEFAULT_SIGNATURE}\n"
+        )
+
     def _generate_with_llm(self, email_obj: Dict, category: str) -> str:
         """Generate personalized reply using LLM"""
+        cache_key = None
+        if self.cache:
+            cache_key = LLMCache.make_key(
+                LLM_MODEL, REPLY_PROMPT_VERSION, email_obj.get("subject", ""), email_obj.get("body", ""),
+                self._style_key(category)
+            )
+            cached = self.cache.get(cache_key)
+            metrics.LLM_CACHE.inc(operation="reply", result="hit" if cached else "miss")
+            if cached:
+                return cached["reply"]
+
         try:
             import openai
             openai.api_key = OPENAI_API_KEY
-
-            template_hint = ""
-            if self.custom_template:
-                template_hint = (
-                    "\n请遵循以下售后模板（可根据内容微调，但保持结构与关键措辞）：\n"
-                    f"{self.custom_template}\n"
-                )
+            if OPENAI_API_BASE:
+                openai.api_base = OPENAI_API_BASE
 
             prompt = (
                 "请生成一封专业、友好且贴合语气要求的售后回复邮件。\n"
                 f"客户分类：{category}\n"
                 f"原始主题：{email_obj['subject']}\n"
                 f"原始内容：{email_obj['body'][:500]}\n"
-                f"{template_hint}"
-                "要求：\n"
-                "1. 简洁清晰，2-4 句为宜\n"
-                "2. 表达感谢并确认问题\n"
-                "3. 告知下一步处理（例如处理时效或需要的补充信息）\n"
-                f"4. 语气要求：{TONE_GUIDANCE}\n"
-                f"5. 署名使用：{DEFAULT_SIGNATURE}\n"
+                f"{self._reply_requirements()}"
             )
             
-            response = openai.ChatCompletion.create(
-                model=LLM_MODEL,
-                messages=[
-                    {"role": "system", "content": "你是专业的售后客服，写作风格稳重、友好、可信。"},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=200
-            )
+            with metrics.track_llm("reply"):
+                response = openai.ChatCompletion.create(
+                    model=LLM_MODEL,
+                    messages=[
+                        {"role": "system", "content": "你是专业的售后客服，写作风格稳重、友好、可信。"},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.7,
+                    max_tokens=200
+                )
             
-            return response.choices[0].message.content
+            reply = response.choices[0].message.content
+            if cache_key:
+                self.cache.set(cache_key, {"reply": reply})
+            return reply
             
         except Exception as e:
             logger.error(f"LLM reply generation failed: {e}")
+            metrics.LLM_FALLBACKS.inc(operation="reply", reason="error")
             return self._get_template(category, email_obj)
 
+    def classify_and_generate(self, email_obj: Dict, classifier) -> Tuple[str, float, str]:
+        """
+        Classify an email and draft its reply with a single LLM call
+        
+        The category is checked against the classifier's whitelist. If the
+        LLM is unavailable or the response is unusable, the separate
+        classify + generate_reply path is used instead.
+        
+        Args:
+            email_obj: Original email data
+            classifier: EmailClassifier providing the category list and fallback
+        
+        Returns:
+            Tuple of (category, confidence_score, reply_text)
+        """
+        subject = email_obj.get("subject", "")
+        body = email_obj.get("body", "")
+        # A confident rule/local-model answer only leaves the reply to the LLM
+        cheap = classifier.classify_without_llm(subject, body)
+        if cheap or not (self.use_llm and classifier.use_llm):
+            category, confidence = cheap or classifier.classify(subject, body)
+            return category, confidence, self.generate_reply(email_obj, category, use_llm=True)
+
+        cache_key = None
+        if self.cache:
+            cache_key = LLMCache.make_key(
+                LLM_MODEL, COMBINED_PROMPT_VERSION, subject, body,
+                self._style_key() + "\x00" + ",".join(classifier.categories)
+            )
+            cached = self.cache.get(cache_key)
+            metrics.LLM_CACHE.inc(operation="combined", result="hit" if cached else "miss")
+            if cached:
+                classifier.record_tier("llm")
+                return cached["category"], cached["confidence"], cached["reply"]
+
+        try:
+            import openai
+            openai.api_key = OPENAI_API_KEY
+            if OPENAI_API_BASE:
+                openai.api_base = OPENAI_API_BASE
+
+            prompt = (
+                "请先将以下售后邮件归入且仅归入一个分类，再生成一封专业、友好且贴合语气要求的售后回复邮件。\n"
+                f"可选分类（必须原样使用其中之一）：{', '.join(classifier.categories)}\n"
+                f"原始主题：{subject}\n"
+                f"原始内容：{body[:500]}\n"
+                f"{self._reply_requirements()}"
+                "请只返回 JSON：\n"
+                '{"category": "CATEGORY_NAME", "confidence": 0.95, "reply": "回复正文"}\n'
+            )
+
+            with metrics.track_llm("combined"):
+                response = openai.ChatCompletion.create(
+                    model=LLM_MODEL,
+                    messages=[
+                        {"role": "system", "content": "你是专业的售后客服，负责邮件分类并撰写回复，写作风格稳重、友好、可信。只返回 JSON。"},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.5,
+                    max_tokens=300
+                )
+
+            content = _CODE_FENCE_RE.sub("", response.choices[0].message.content.strip())
+            result = json.loads(content)
+            category = result.get("category", "Other")
+            confidence = float(result.get("confidence", 0.5))
+            reply = (result.get("reply") or "").strip()
+
+            if category not in classifier.categories:
+                category = "Other"
+            if not reply:
+                reply = self._get_template(category, email_obj)
+
+            if cache_key:
+                self.cache.set(cache_key, {"category": category, "confidence": confidence, "reply": reply})
+            classifier.record_tier("llm")
+            return category, confidence, reply
+
+        except Exception as e:
+            logger.error(f"Combined LLM classification/reply failed: {e}, using separate calls")
+            metrics.LLM_FALLBACKS.inc(operation="combined", reason="error")
+            category, confidence = classifier.classify(subject, body)
+            return category, confidence, self.generate_reply(email_obj, category, use_llm=True)
+
     def _get_template(self, category: str, email_obj: Dict) -> str:
         """Get template reply for category or render custom template."""
         if self.custom_template:
@@ -7,6 +7,8 @@ import os
 from datetime import datetime
 from typing import List, Dict
 from config import CSV_OUTPUT_DIR
+from email_record import CSV_FIELDS, EmailRecord, as_record
+import metrics
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -23,7 +25,7 @@ class ReviewManager:
         Generate CSV file for daily email review
         
         Args:
-            email_reviews: List of email review dictionaries
+            email_reviews: List of EmailRecords or email review dictionaries
         
         Returns:
             Path to generated CSV file
@@ -38,38 +40,12 @@ class ReviewManager:
         filename = os.path.join(self.output_dir, f"email_review_{timestamp}.csv")
         
         try:
-            with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-                fieldnames = [
-                    'email_id',
-                    'from',
-                    'subject',
-                    'category',
-                    'confidence',
-                    'original_body',
-                    'suggested_reply',
-                    'status',  # pending_review, approved, rejected
-                    'reviewer_notes',
-                    'received_date',
-                    'risk_flag'
-                ]
-                
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                writer.writeheader()
-                
-                for review in email_reviews:
-                    writer.writerow({
-                        'email_id': review.get('id', ''),
-                        'from': review.get('from', ''),
-                        'subject': review.get('subject', ''),
-                        'category': review.get('category', ''),
-                        'confidence': review.get('confidence', ''),
-                        'original_body': review.get('body', '')[:500],  # First 500 chars
-                        'suggested_reply': review.get('reply', ''),
-                        'status': 'pending_review',
-                        'reviewer_notes': '',
-                        'received_date': review.get('date', ''),
-                        'risk_flag': review.get('risk_flag', '')
-                    })
+            with metrics.track("csv_write", emails=len(email_reviews)), \
+                    open(filename, 'w', newline='', encoding='utf-8') as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(CSV_FIELDS)
+                # Records serialize themselves; dict reviews are converted first
+                writer.writerows(as_record(review).csv_row() for review in email_reviews)
             
             logger.info(f"✅ Review CSV generated: {filename}")
             return filename
@@ -120,6 +96,71 @@ class ReviewManager:
         return approved
 
 
+    def import_review_csv(self, filepath: str, review_db=None, batch_size: int = 1000,
+                          enqueue_approved: bool = False) -> Dict[str, int]:
+        """
+        Stream reviewer decisions from an edited review CSV into the database
+        
+        Rows are read one at a time and status/reviewer_notes are applied in
+        batched transactions keyed by email_id, so memory stays constant.
+        
+        Args:
+            filepath: Path to the edited review CSV
+            review_db: ReviewDatabase to update (default: a new instance)
+            batch_size: Rows applied per transaction
+            enqueue_approved: Queue newly approved replies in the outbox
+        
+        Returns:
+            Dict with "changed", "unchanged", "unknown" and "queued" counts
+        """
+        if review_db is None:
+            from review_database import ReviewDatabase
+            review_db = ReviewDatabase()
+        if enqueue_approved:
+            from email_sender import approved_reply_messages
+
+        report = {"changed": 0, "unchanged": 0, "unknown": 0, "queued": 0}
+        decisions = []
+        replies = {}
+
+        def flush():
+            result = review_db.apply_review_decisions(decisions)
+            for key in ("changed", "unchanged", "unknown"):
+                report[key] += result[key]
+            if enqueue_approved and result["approved"]:
+                report["queued"] += review_db.enqueue_outbox(
+                    replies[email_id] for email_id in result["approved"]
+                )
+            decisions.clear()
+            replies.clear()
+
+        try:
+            with open(filepath, 'r', encoding='utf-8', newline='') as csvfile:
+                for row in csv.DictReader(csvfile):
+                    email_id = (row.get('email_id') or '').strip()
+                    if not email_id:
+                        report["unknown"] += 1
+                        continue
+                    status = (row.get('status') or '').strip().lower() or 'pending_review'
+                    decisions.append((email_id, status, row.get('reviewer_notes') or ''))
+                    if enqueue_approved and status == 'approved':
+                        # The outbox sends the reply text as edited in the sheet
+                        replies[email_id] = approved_reply_messages([row])[0]
+                    if len(decisions) >= batch_size:
+                        flush()
+            if decisions:
+                flush()
+        except Exception as e:
+            logger.error(f"❌ Failed to import review CSV: {e}")
+            return report
+
+        logger.info(
+            f"✅ Imported {filepath}: {report['changed']} changed, {report['unchanged']} unchanged, "
+            f"{report['unknown']} unknown"
+        )
+        return report
+
+
 def append_to_review_csv(email: Dict, category: str, reply_draft: str, risk_flag: bool) -> str:
     """Append a single email review row to today's CSV file."""
     manager = ReviewManager()
@@ -131,38 +172,18 @@ def append_to_review_csv(email: Dict, category: str, reply_draft: str, risk_flag
     filename = os.path.join(manager.output_dir, f"email_review_{today}.csv")
 
     file_exists = os.path.exists(filename)
-    fieldnames = [
-        'email_id',
-        'from',
-        'subject',
-        'category',
-        'confidence',
-        'original_body',
-        'suggested_reply',
-        'status',
-        'reviewer_notes',
-        'received_date',
-        'risk_flag',
-    ]
+    # A copy, so the caller's record keeps its own fields
+    review = EmailRecord.from_mapping(email)
+    review.category = category
+    review.reply = reply_draft
+    review.risk_flag = 'high' if risk_flag else 'low'
 
     try:
-        with open(filename, 'a', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        with metrics.track("csv_write", emails=1), open(filename, 'a', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
             if not file_exists:
-                writer.writeheader()
-            writer.writerow({
-                'email_id': email.get('id', ''),
-                'from': email.get('from', ''),
-                'subject': email.get('subject', ''),
-                'category': category,
-                'confidence': email.get('confidence', ''),
-                'original_body': email.get('body', '')[:500],
-                'suggested_reply': reply_draft,
-                'status': 'pending_review',
-                'reviewer_notes': '',
-                'received_date': email.get('date', ''),
-                'risk_flag': 'high' if risk_flag else 'low',
-            })
+                writer.writerow(CSV_FIELDS)
+            writer.writerow(review.csv_row())
         logger.info(f"✅ Appended review row to {filename}")
         return filename
     except Exception as e:
@@ -3,25 +3,38 @@ SMTP sender for Tencent Enterprise Email
 Sends emails with proper formatting
 """
 
+import queue
 import smtplib
+import time
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from typing import List, Dict
+from typing import Iterable, List, Dict
 from config import (
     SMTP_SERVER, SMTP_PORT, SMTP_USE_TLS,
-    EMAIL_ADDRESS, EMAIL_APP_PASSWORD
+    EMAIL_ADDRESS, EMAIL_APP_PASSWORD,
+    SMTP_BULK_SESSIONS, SMTP_MAX_MESSAGES_PER_SESSION, SMTP_NOOP_IDLE_SECONDS,
 )
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def _reply_subject(original_subject: str) -> str:
+    if not original_subject.lower().startswith("re:"):
+        return f"Re: {original_subject}"
+    return original_subject
+
 
 class EmailSender:
     def __init__(self):
         self.email_address = EMAIL_ADDRESS
         self.app_password = EMAIL_APP_PASSWORD
         self.server = None
+        self.sent_in_session = 0
+        self.last_activity = 0.0
+        self.handshakes = 0
+        self.data_started = False
 
     def connect(self):
         """Connect to SMTP server"""
@@ -31,6 +44,9 @@ class EmailSender:
                 self.server.starttls()
             
             self.server.login(self.email_address, self.app_password)
+            self.sent_in_session = 0
+            self.last_activity = time.monotonic()
+            self.handshakes += 1
             logger.info(f"✅ Connected to SMTP server: {SMTP_SERVER}:{SMTP_PORT}")
         except smtplib.SMTPException as e:
             logger.error(f"❌ SMTP connection failed: {e}")
@@ -39,9 +55,58 @@ class EmailSender:
     def disconnect(self):
         """Disconnect from SMTP server"""
         if self.server:
-            self.server.quit()
+            try:
+                self.server.quit()
+            except OSError:
+                # SMTPException derives from OSError; a dead session just needs closing
+                self.server.close()
+            self.server = None
             logger.info("Disconnected from SMTP server")
 
+    def is_connected(self) -> bool:
+        """Check the session with NOOP; False if the server has dropped it"""
+        if not self.server:
+            return False
+        try:
+            code, _ = self.server.noop()
+        except (smtplib.SMTPException, OSError):
+            return False
+        self.last_activity = time.monotonic()
+        return code == 250
+
+    def ensure_connected(self):
+        """
+        Make sure an authenticated session is available
+        
+        A NOOP is only issued when the session has been idle for longer than
+        SMTP_NOOP_IDLE_SECONDS, so back-to-back sends cost no extra round trip.
+        Sessions are also recycled after SMTP_MAX_MESSAGES_PER_SESSION messages.
+        """
+        recycle = SMTP_MAX_MESSAGES_PER_SESSION and self.sent_in_session >= SMTP_MAX_MESSAGES_PER_SESSION
+        if self.server and not recycle:
+            if time.monotonic() - self.last_activity < SMTP_NOOP_IDLE_SECONDS or self.is_connected():
+                return
+            logger.warning("SMTP session went stale, reconnecting")
+        self.disconnect()
+        self.connect()
+
+    def _build_message(self, to_address: str, subject: str, body: str,
+                       is_html: bool = False, cc: List[str] = None) -> MIMEMultipart:
+        msg = MIMEMultipart("alternative")
+        msg["From"] = self.email_address
+        msg["To"] = to_address
+        msg["Subject"] = subject
+        
+        if cc:
+            msg["Cc"] = ", ".join(cc)
+        
+        # Attach body
+        if is_html:
+            msg.attach(MIMEText(body, "html"))
+        else:
+            msg.attach(MIMEText(body, "plain"))
+        return msg
+
     def send_email(self, to_address: str, subject: str, body: str, 
                    is_html: bool = False, cc: List[str] = None,
                    bcc: List[str] = None) -> bool:
@@ -60,23 +125,13 @@ class EmailSender:
             True if sent successfully, False otherwise
         """
         try:
-            msg = MIMEMultipart("alternative")
-            msg["From"] = self.email_address
-            msg["To"] = to_address
-            msg["Subject"] = subject
-            
-            if cc:
-                msg["Cc"] = ", ".join(cc)
-            
-            # Attach body
-            if is_html:
-                msg.attach(MIMEText(body, "html"))
-            else:
-                msg.attach(MIMEText(body, "plain"))
+            msg = self._build_message(to_address, subject, body, is_html, cc)
             
             # Send email
             recipients = [to_address] + (cc or []) + (bcc or [])
             self.server.sendmail(self.email_address, recipients, msg.as_string())
+            self.sent_in_session += 1
+            self.last_activity = time.monotonic()
             
             logger.info(f"✅ Email sent to {to_address} with subject: {subject}")
             return True
@@ -98,16 +153,176 @@ class EmailSender:
         """
         # Extract recipient from original email
         from_addr = original_email["from"]
-        original_subject = original_email["subject"]
-        
-        # Create reply subject
-        if not original_subject.lower().startswith("re:"):
-            reply_subject = f"Re: {original_subject}"
-        else:
-            reply_subject = original_subject
         
         # Send reply
-        return self.send_email(from_addr, reply_subject, reply_body)
+        return self.send_email(from_addr, _reply_subject(original_email["subject"]), reply_body)
+
+    def _rset(self):
+        try:
+            self.server.rset()
+        except smtplib.SMTPServerDisconnected:
+            pass
+
+    def _sendmail(self, recipients: List[str], msg: str):
+        """
+        server.sendmail() with the point of no return made visible
+
+        self.data_started is set once the DATA command is issued. From then on
+        the server may have accepted the message even if its reply never
+        arrives, so the send must not be repeated automatically.
+        """
+        self.data_started = False
+        self.server.ehlo_or_helo_if_needed()
+        code, resp = self.server.mail(self.email_address)
+        if code != 250:
+            self._rset()
+            raise smtplib.SMTPSenderRefused(code, resp, self.email_address)
+        refused = {}
+        for recipient in recipients:
+            code, resp = self.server.rcpt(recipient)
+            if code not in (250, 251):
+                refused[recipient] = (code, resp)
+        if len(refused) == len(recipients):
+            self._rset()
+            raise smtplib.SMTPRecipientsRefused(refused)
+        self.data_started = True
+        code, resp = self.server.data(msg)
+        if code != 250:
+            self._rset()
+            raise smtplib.SMTPDataError(code, resp)
+
+    def deliver(self, message: Dict) -> Dict:
+        """
+        Send one bulk message on the current session, reconnecting once if it dropped
+        
+        The send is only repeated when the session died before DATA. If it
+        dies after DATA was issued, the server may already have the message,
+        so the result is returned with "ambiguous" set instead of sending twice.
+        
+        Args:
+            message: Dict with "to", "subject", "body" and optional "id", "is_html", "cc", "bcc"
+        
+        Returns:
+            Result dict with "id", "to", "success", "error", "smtp_code", "ambiguous" and "attempts"
+        """
+        result = {"id": message.get("id"), "to": message.get("to"), "success": False,
+                  "error": None, "smtp_code": None, "ambiguous": False, "attempts": 0}
+        mime = self._build_message(message["to"], message["subject"], message["body"],
+                                   message.get("is_html", False), message.get("cc"))
+        recipients = [message["to"]] + (message.get("cc") or []) + (message.get("bcc") or [])
+
+        for attempt in range(2):
+            result["attempts"] = attempt + 1
+            self.data_started = False
+            try:
+                self.ensure_connected()
+                self._sendmail(recipients, mime.as_string())
+                self.sent_in_session += 1
+                self.last_activity = time.monotonic()
+                result["success"] = True
+                result["error"] = None
+                return result
+            except smtplib.SMTPServerDisconnected as e:
+                # The session died mid-conversation; retry once on a fresh one unless DATA was under way
+                result["error"] = str(e)
+                self.disconnect()
+                if self.data_started:
+                    result["ambiguous"] = True
+                    return result
+            except smtplib.SMTPResponseException as e:
+                result["error"] = str(e)
+                result["smtp_code"] = e.smtp_code
+                return result
+            except smtplib.SMTPRecipientsRefused as e:
+                result["error"] = str(e)
+                result["smtp_code"] = next(iter(e.recipients.values()))[0] if e.recipients else None
+                return result
+            except smtplib.SMTPException as e:
+                result["error"] = str(e)
+                return result
+            except OSError as e:
+                # Socket-level failure (reset, timeout); also worth one fresh session, before DATA
+                result["error"] = str(e)
+                self.disconnect()
+                if self.data_started:
+                    result["ambiguous"] = True
+                    return result
+        return result
+
+    def send_bulk(self, messages: Iterable[Dict]) -> List[Dict]:
+        """
+        Send many messages over this sender's session
+        
+        Args:
+            messages: Iterable of message dicts (see deliver)
+        
+        Returns:
+            List of per-message result dicts in input order
+        """
+        results = [self.deliver(message) for message in messages]
+        sent = sum(1 for result in results if result["success"])
+        logger.info(f"✅ Bulk send finished: {sent}/{len(results)} sent using {self.handshakes} SMTP session(s)")
+        return results
+
+
+def send_bulk(messages: Iterable[Dict], sessions: int = SMTP_BULK_SESSIONS) -> List[Dict]:
+    """
+    Send messages across ``sessions`` long-lived SMTP connections
+    
+    Each worker thread owns one EmailSender and pulls the next message from a
+    shared queue, so a slow or reconnecting session does not hold up the others.
+    
+    Returns:
+        List of per-message result dicts in input order
+    """
+    messages = list(messages)
+    if not messages:
+        return []
+    sessions = max(1, min(sessions, len(messages)))
+    work = queue.Queue()
+    for index, message in enumerate(messages):
+        work.put((index, message))
+    results: List[Dict] = [None] * len(messages)
+
+    def worker() -> int:
+        sender = EmailSender()
+        try:
+            while True:
+                try:
+                    index, message = work.get_nowait()
+                except queue.Empty:
+                    return sender.handshakes
+                results[index] = sender.deliver(message)
+        finally:
+            sender.disconnect()
+
+    with ThreadPoolExecutor(max_workers=sessions) as executor:
+        handshakes = sum(executor.map(lambda _: worker(), range(sessions)))
+
+    sent = sum(1 for result in results if result["success"])
+    logger.info(f"✅ Bulk send finished: {sent}/{len(results)} sent using {handshakes} SMTP session(s)")
+    return results
+
+
+def approved_reply_messages(approved_rows: Iterable[Dict]) -> List[Dict]:
+    """Turn approved review rows (ReviewManager.get_approved_replies) into bulk messages"""
+    return [
+        {
+            "id": row.get("email_id", ""),
+            "to": row.get("from", ""),
+            "subject": _reply_subject(row.get("subject", "")),
+            "body": row.get("suggested_reply", ""),
+        }
+        for row in approved_rows
+    ]
+
+
+def send_approved_replies(filepath: str, sessions: int = SMTP_BULK_SESSIONS) -> List[Dict]:
+    """Send every approved reply from a review CSV over reused SMTP sessions."""
+    from email_review_manager import ReviewManager
+
+    approved = ReviewManager().get_approved_replies(filepath)
+    return send_bulk(approved_reply_messages(approved), sessions=sessions)
 
 
 # Example usage
@@ -127,4 +342,4 @@ if __name__ == "__main__":
     else:
         print("❌ Failed to send test email")
     
-    sender.disconnect()
\ No newline at end of file
+    sender.disconnect()
@@ -0,0 +1,164 @@
+"""
+Persistent content-hash cache for LLM results.
+Identical or templated emails reuse a stored classification or draft instead of calling the API again.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from config import LLM_CACHE_PATH, LLM_CACHE_TTL_SECONDS, LLM_CACHE_MAX_ENTRIES, SQLITE_BUSY_TIMEOUT_SECONDS
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+# Stores between eviction passes; the table may exceed max_entries by this much
+_EVICTION_INTERVAL = 64
+
+
+def _normalize(text: str) -> str:
+    return _WHITESPACE_RE.sub(" ", (text or "").strip().lower())
+
+
+class LLMCache:
+    def __init__(self, db_path: str = LLM_CACHE_PATH, ttl_seconds: int = LLM_CACHE_TTL_SECONDS,
+                 max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._sets = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._init_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Return this thread's long-lived connection, opening it on first use.
+
+        Lookups happen on every classification and draft, so the connection
+        and its pragmas are set up once per thread; WAL keeps the pipeline's
+        parallel workers from blocking each other.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=SQLITE_BUSY_TIMEOUT_SECONDS)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """Close the calling thread's connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _init_schema(self):
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache (last_access)")
+            conn.commit()
+
+    @staticmethod
+    def make_key(model: str, prompt_version: str, subject: str, body: str, extra: str = "") -> str:
+        """
+        Build a cache key from the model, prompt version and normalized subject+body.
+
+        ``extra`` carries anything else that changes the output, such as the
+        category or reply template for drafts.
+        """
+        digest = hashlib.sha256()
+        for part in (model, prompt_version, extra, _normalize(subject), _normalize(body)):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\x00")
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return the cached value for ``key``, or None on a miss or expired entry."""
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT value, created_at FROM llm_cache WHERE cache_key = ?", (key,)
+                ).fetchone()
+                if row and self.ttl_seconds > 0 and now - row[1] > self.ttl_seconds:
+                    conn.execute("DELETE FROM llm_cache WHERE cache_key = ?", (key,))
+                    row = None
+                elif row:
+                    conn.execute("UPDATE llm_cache SET last_access = ? WHERE cache_key = ?", (now, key))
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache lookup failed: {e}")
+            row = None
+
+        with self._lock:
+            if row:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, value: Dict):
+        """
+        Store ``value``; on the first store and every _EVICTION_INTERVAL-th after,
+        evict the least recently used entries above max_entries.
+        """
+        now = time.time()
+        with self._lock:
+            evict = self._sets % _EVICTION_INTERVAL == 0
+            self._sets += 1
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO llm_cache (cache_key, value, created_at, last_access)
+                    VALUES (?, ?, ?, ?)
+                    """,
+                    (key, json.dumps(value, ensure_ascii=False), now, now),
+                )
+                overflow = 0
+                if evict:
+                    overflow = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] - self.max_entries
+                if overflow > 0:
+                    conn.execute(
+                        """
+                        DELETE FROM llm_cache WHERE cache_key IN (
+                            SELECT cache_key FROM llm_cache ORDER BY last_access ASC LIMIT ?
+                        )
+                        """,
+                        (overflow,),
+                    )
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache store failed: {e}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
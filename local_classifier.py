@@ -0,0 +1,318 @@
+"""
+Lightweight local email classifier trained from reviewed history.
+TF-IDF features with multinomial naive Bayes scoring, vectorized with NumPy.
+
+    python local_classifier.py train       # retrain from email_reviews
+    python local_classifier.py benchmark   # compare with rules and the LLM
+"""
+
+import json
+import math
+import os
+import random
+import re
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from config import (
+    EMAIL_CATEGORIES, LOCAL_MODEL_PATH, LOCAL_MODEL_THRESHOLD, LOCAL_MODEL_TRAIN_STATUSES,
+    LOCAL_MODEL_MIN_SAMPLES, LOCAL_MODEL_MAX_FEATURES,
+)
+import logging
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+|[\u4e00-\u9fff]")
+# Additive smoothing for the per-class feature weights
+_ALPHA = 0.1
+
+
+def _features(subject: str, body: str) -> List[str]:
+    """Unigrams and bigrams of words (single characters for Chinese)."""
+    tokens = _TOKEN_RE.findall(f"{subject} {body}".lower())
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+class LocalClassifier:
+    """
+    TF-IDF + multinomial naive Bayes over a fixed vocabulary.
+
+    Documents are turned into one CSR-style (indptr, indices, weights) batch so
+    training and prediction are a handful of NumPy operations regardless of
+    how many emails are scored at once.
+    """
+
+    def __init__(self, vocabulary: Sequence[str], classes: Sequence[str], idf, feature_log_prob,
+                 class_log_prior, meta: Optional[Dict] = None):
+        self.vocabulary = list(vocabulary)
+        self._index = {feature: i for i, feature in enumerate(self.vocabulary)}
+        self.classes = list(classes)
+        self.idf = idf
+        self.feature_log_prob = feature_log_prob
+        self.class_log_prior = class_log_prior
+        self.meta = meta or {}
+
+    @classmethod
+    def train(cls, examples: Sequence[Tuple[str, str, str]],
+              max_features: int = LOCAL_MODEL_MAX_FEATURES) -> "LocalClassifier":
+        """
+        Fit a model on (subject, body, category) examples
+
+        Args:
+            examples: Labeled emails
+            max_features: Keep only the most frequent features (by document frequency)
+
+        Returns:
+            Trained LocalClassifier
+        """
+        if np is None:
+            raise RuntimeError("numpy is required for the local classifier (pip install numpy)")
+        if not examples:
+            raise ValueError("no training examples")
+
+        documents = [Counter(_features(subject, body)) for subject, body, _ in examples]
+        document_frequency = Counter()
+        for counts in documents:
+            document_frequency.update(counts.keys())
+        # Drop features seen in a single email once there is enough data to afford it
+        min_df = 2 if len(examples) >= 200 else 1
+        vocabulary = [
+            feature for feature, df in document_frequency.most_common(max_features) if df >= min_df
+        ]
+        index = {feature: i for i, feature in enumerate(vocabulary)}
+
+        n = len(examples)
+        df = np.array([document_frequency[feature] for feature in vocabulary], dtype=np.float64)
+        idf = np.log((1 + n) / (1 + df)) + 1
+
+        classes = [c for c in EMAIL_CATEGORIES if any(label == c for _, _, label in examples)]
+        classes += sorted({label for _, _, label in examples} - set(classes))
+        class_index = {c: i for i, c in enumerate(classes)}
+        labels = np.array([class_index[label] for _, _, label in examples])
+
+        indptr, indices, weights = cls._vectorize(documents, index, idf)
+        rows = np.repeat(np.arange(n), np.diff(indptr))
+        feature_weight = np.zeros((len(classes), len(vocabulary)))
+        np.add.at(feature_weight, (labels[rows], indices), weights)
+        smoothed = feature_weight + _ALPHA
+        feature_log_prob = np.log(smoothed / smoothed.sum(axis=1, keepdims=True))
+        class_log_prior = np.log(np.bincount(labels, minlength=len(classes)) / n)
+
+        meta = {
+            "trained_at": datetime.now().isoformat(timespec="seconds"),
+            "samples": n,
+            "class_counts": {c: int(count) for c, count in zip(classes, np.bincount(labels, minlength=len(classes)))},
+        }
+        return cls(vocabulary, classes, idf, feature_log_prob, class_log_prior, meta)
+
+    @staticmethod
+    def _vectorize(documents: List[Counter], index: Dict[str, int], idf):
+        """L2-normalized sublinear TF-IDF rows in CSR form; unknown features are dropped."""
+        indptr, indices, counts = [0], [], []
+        for document in documents:
+            for feature, count in document.items():
+                i = index.get(feature)
+                if i is not None:
+                    indices.append(i)
+                    counts.append(count)
+            indptr.append(len(indices))
+
+        indptr = np.array(indptr, dtype=np.int64)
+        indices = np.array(indices, dtype=np.int64)
+        weights = (1 + np.log(np.array(counts, dtype=np.float64))) * idf[indices]
+        rows = np.repeat(np.arange(len(documents)), np.diff(indptr))
+        norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=len(documents)))
+        weights /= np.where(norms > 0, norms, 1)[rows]
+        return indptr, indices, weights
+
+    def predict_many(self, emails: Sequence[Tuple[str, str]]) -> List[Tuple[str, float]]:
+        """
+        Classify (subject, body) pairs
+
+        Returns:
+            List of (category, probability) tuples in input order. Emails with no
+            known feature get probability 0 so they are always escalated.
+        """
+        if not emails:
+            return []
+        documents = [Counter(_features(subject, body)) for subject, body in emails]
+        indptr, indices, weights = self._vectorize(documents, self._index, self.idf)
+
+        # Per-row sums of feature_log_prob[:, j] * weight via a cumulative sum over nonzeros
+        contributions = self.feature_log_prob[:, indices] * weights
+        cumulative = np.concatenate(
+            [np.zeros((len(self.classes), 1)), np.cumsum(contributions, axis=1)], axis=1
+        )
+        joint = (cumulative[:, indptr[1:]] - cumulative[:, indptr[:-1]]).T + self.class_log_prior
+        joint -= joint.max(axis=1, keepdims=True)
+        probabilities = np.exp(joint)
+        probabilities /= probabilities.sum(axis=1, keepdims=True)
+
+        best = probabilities.argmax(axis=1)
+        empty = np.diff(indptr) == 0
+        return [
+            (self.classes[b], 0.0 if is_empty else float(probabilities[row, b]))
+            for row, (b, is_empty) in enumerate(zip(best, empty))
+        ]
+
+    def predict(self, subject: str, body: str) -> Tuple[str, float]:
+        return self.predict_many([(subject, body)])[0]
+
+    def save(self, path: str = LOCAL_MODEL_PATH):
+        """Write the model atomically so a running pipeline never loads a partial file."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(
+                f,
+                vocabulary=np.array(self.vocabulary, dtype=str),
+                classes=np.array(self.classes, dtype=str),
+                idf=self.idf,
+                feature_log_prob=self.feature_log_prob,
+                class_log_prior=self.class_log_prior,
+                meta=np.array(json.dumps(self.meta)),
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = LOCAL_MODEL_PATH) -> Optional["LocalClassifier"]:
+        """Load a saved model; returns None when numpy or the model file is missing."""
+        if np is None or not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                return cls(
+                    data["vocabulary"].tolist(),
+                    data["classes"].tolist(),
+                    data["idf"],
+                    data["feature_log_prob"],
+                    data["class_log_prior"],
+                    json.loads(str(data["meta"])),
+                )
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning(f"⚠️  Could not load local classifier from {path}: {e}")
+            return None
+
+
+def retrain(db=None, path: str = LOCAL_MODEL_PATH,
+            statuses: Sequence[str] = LOCAL_MODEL_TRAIN_STATUSES) -> Optional[LocalClassifier]:
+    """Train on labeled reviews and save the model; returns None if there is too little data."""
+    from review_database import ReviewDatabase
+
+    db = db or ReviewDatabase()
+    examples = db.labeled_reviews(statuses)
+    if len(examples) < LOCAL_MODEL_MIN_SAMPLES:
+        logger.warning(f"⚠️  Only {len(examples)} labeled review(s) with status {', '.join(statuses)}; "
+                       f"need {LOCAL_MODEL_MIN_SAMPLES} to train")
+        return None
+    model = LocalClassifier.train(examples)
+    model.save(path)
+    logger.info(f"✅ Local classifier trained on {len(examples)} reviews "
+                f"({len(model.vocabulary)} features), saved to {path}")
+    return model
+
+
+def _evaluate(label: str, predict, emails, expected) -> Dict:
+    start = time.perf_counter()
+    predictions = predict(emails)
+    elapsed = time.perf_counter() - start
+    correct = sum(category == truth for (category, _), truth in zip(predictions, expected))
+    return {
+        "method": label,
+        "emails": len(emails),
+        "accuracy": correct / len(emails),
+        "emails_per_sec": len(emails) / elapsed if elapsed else math.inf,
+        "predictions": predictions,
+    }
+
+
+def benchmark(db=None, holdout: float = 0.2, llm_sample: int = 0, threshold: float = LOCAL_MODEL_THRESHOLD,
+              statuses: Sequence[str] = LOCAL_MODEL_TRAIN_STATUSES, seed: int = 0) -> List[Dict]:
+    """
+    Compare the local model with the keyword rules (and optionally the LLM) on a held-out split
+
+    Args:
+        db: ReviewDatabase to read labeled reviews from
+        holdout: Fraction of labeled reviews kept for evaluation
+        llm_sample: Number of held-out emails also sent to the LLM (0 skips it)
+        threshold: Probability above which the local answer would be accepted
+        statuses: Review statuses used as labels
+        seed: Shuffle seed for the split
+
+    Returns:
+        One result dict per method
+    """
+    from email_classifier import EmailClassifier
+    from review_database import ReviewDatabase
+
+    examples = list((db or ReviewDatabase()).labeled_reviews(statuses))
+    random.Random(seed).shuffle(examples)
+    split = int(len(examples) * (1 - holdout))
+    train, test = examples[:split], examples[split:]
+    if not train or not test:
+        raise ValueError(f"not enough labeled reviews to benchmark ({len(examples)})")
+
+    start = time.perf_counter()
+    model = LocalClassifier.train(train)
+    train_seconds = time.perf_counter() - start
+
+    emails = [(subject, body) for subject, body, _ in test]
+    expected = [category for _, _, category in test]
+    rules = EmailClassifier(use_llm=False, use_local=False)
+    results = [
+        _evaluate("rules", lambda items: [rules._classify_rule_based(*item) for item in items], emails, expected),
+        _evaluate("local", model.predict_many, emails, expected),
+    ]
+
+    confident = [(p, truth) for p, truth in zip(results[1]["predictions"], expected) if p[1] >= threshold]
+    results[1]["coverage"] = len(confident) / len(emails)
+    results[1]["accuracy_when_confident"] = (
+        sum(category == truth for (category, _), truth in confident) / len(confident) if confident else None
+    )
+    results[1]["train_seconds"] = train_seconds
+
+    if llm_sample:
+        llm = EmailClassifier(use_llm=True, use_local=False)
+        llm.cache = None
+        if llm.use_llm:
+            sample = emails[:llm_sample]
+            results.append(_evaluate(
+                "llm", lambda items: [llm._classify_with_llm(*item) for item in items], sample, expected[:llm_sample]
+            ))
+
+    for result in results:
+        result.pop("predictions")
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local email classifier")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    subcommands.add_parser("train", help="retrain from reviewed history and save the model")
+    bench = subcommands.add_parser("benchmark", help="compare accuracy and throughput with rules and the LLM")
+    bench.add_argument("--holdout", type=float, default=0.2)
+    bench.add_argument("--llm-sample", type=int, default=0, help="held-out emails also sent to the LLM")
+    args = parser.parse_args()
+
+    if args.command == "train":
+        retrain()
+    else:
+        for result in benchmark(holdout=args.holdout, llm_sample=args.llm_sample):
+            line = (f"{result['method']:>6}: accuracy {result['accuracy']:.1%} on {result['emails']} emails, "
+                    f"{result['emails_per_sec']:,.0f} emails/sec")
+            if "coverage" in result:
+                confident = result["accuracy_when_confident"]
+                line += (f"; {result['coverage']:.0%} above threshold"
+                         + (f" at {confident:.1%} accuracy" if confident is not None else "")
+                         + f"; trained in {result['train_seconds']:.2f}s")
+            print(line)
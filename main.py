@@ -1,9 +1,30 @@
-from email_receiver import fetch_unread_emails
+import asyncio
+import imaplib
+import itertools
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+
+from email_receiver import EmailReceiver, load_mailboxes
+from email_record import as_record
 from email_classifier import EmailClassifier
 from email_reply_generator import ReplyGenerator
-from email_review_manager import ReviewManager
+from email_review_manager import ReviewManager, append_to_review_csv
 from review_database import ReviewDatabase
-from config import EMAIL_ADDRESS, EMAIL_APP_PASSWORD, IMAP_SERVER
+from near_duplicate import ClusterTracker, cluster_source, same_content
+from run_journal import RunJournal
+import metrics
+from config import (
+    EMAIL_ADDRESS, EMAIL_APP_PASSWORD, IMAP_SERVER,
+    PIPELINE_CONCURRENCY, PIPELINE_PERSIST_BATCH, LLM_CLASSIFY_BATCH_SIZE,
+    LLM_COMBINED_MODE, NEAR_DUP_ENABLED, NEAR_DUP_HISTORY_DAYS, PROFILE_DIR,
+    PROCESS_UNSEEN_ONLY, IMAP_IDLE_REFRESH_SECONDS, IMAP_POLL_SECONDS, IMAP_RECONNECT_MAX_SECONDS,
+    METRICS_PROM_FILE, MAILBOXES_FILE, INGEST_WORKERS, IMAP_INCREMENTAL_SYNC, PIPELINE_RESUME,
+)
 
 
 def _has_imap_config() -> bool:
@@ -35,47 +56,646 @@ def _demo_emails():
         },
     ]
 
-def run_daily_pipeline():
+
+def _load_clusters(review_db):
+    clusters = ClusterTracker()
+    if NEAR_DUP_HISTORY_DAYS:
+        since = (datetime.now() - timedelta(days=NEAR_DUP_HISTORY_DAYS)).isoformat(timespec="seconds")
+        clusters.load_history(review_db.recent_fingerprints(since))
+    return clusters
+
+
+def _build_reviews(emails, classifier, reply_generator, clusters=None, journal=None):
+    """
+    Build reviews for a chunk of emails.
+
+    With a ClusterTracker, only cluster leaders go through classification and
+    drafting; the other emails reuse their leader's category and confidence
+    (waiting for it if another worker is still producing it) and get their
+    own template draft, see _member_reply.
+    """
+    if clusters is None:
+        return _classify_and_draft(emails, classifier, reply_generator, journal)
+
+    leaders = [email for email in emails if clusters.is_leader(email)]
+    try:
+        leader_reviews = _classify_and_draft(leaders, classifier, reply_generator, journal) if leaders else []
+    except BaseException as e:
+        for email in leaders:
+            clusters.fail(email["cluster_id"], e)
+        raise
+    for review in leader_reviews:
+        clusters.resolve(review["cluster_id"], {
+            "category": review["category"],
+            "confidence": review["confidence"],
+            "reply": review["reply"],
+            "email": cluster_source(review),
+        })
+
+    leader_reviews = iter(leader_reviews)
+    reviews = []
+    for email in emails:
+        if clusters.is_leader(email):
+            reviews.append(next(leader_reviews))
+            continue
+        result = clusters.result(email["cluster_id"])
+        metrics.EMAILS.inc(stage="near_duplicate_reuse")
+        reply = _member_reply(email, result, reply_generator)
+        review = _make_review(email, result["category"], result["confidence"], reply or
+                              reply_generator.generate_reply(email, result["category"]))
+        if reply:
+            # Someone else's draft, word for word: always worth a human look
+            review.risk_flag = "high"
+        reviews.append(review)
+    return reviews
+
+
+def _member_reply(email, result, reply_generator):
+    """
+    The leader's draft if ``email`` may reuse it verbatim, else None.
+
+    Only an LLM draft of the very same normalized subject and body is reused
+    (the reply prompt sees nothing else, so it is what the LLM cache would
+    return). Near-identical emails still differ in names, order numbers and
+    dates, and template drafts carry the leader's {from}/{subject}/{date}.
+    """
+    leader = result.get("email")
+    if not leader or not same_content(leader, email):
+        return None
+    if reply_generator.generate_reply(leader, result["category"]) == result["reply"]:
+        return None
+    return result["reply"]
+
+
+def _classify_and_draft(emails, classifier, reply_generator, journal=None):
+    """
+    Classify a chunk of emails (one batched request when it holds several) and draft each reply.
+
+    Emails replayed from an interrupted run skip the stages they finished:
+    a record that has a category is not classified again, one with a reply
+    is not drafted again. Each finished stage is recorded in the journal.
+    """
+    reviews = [as_record(email) for email in emails]
+    unclassified = [review for review in reviews if "category" not in review]
+    if LLM_COMBINED_MODE:
+        for review in unclassified:
+            with metrics.track("classify_reply", emails=1):
+                _make_review(review, *reply_generator.classify_and_generate(review, classifier))
+            if journal:
+                journal.drafted([review])
+    elif unclassified:
+        with metrics.track("classify", emails=len(unclassified)):
+            if len(unclassified) == 1:
+                review = unclassified[0]
+                results = [classifier.classify(review.get("subject", ""), review.get("body", ""))]
+            else:
+                results = classifier.classify_batch(
+                    [(review.get("subject", ""), review.get("body", "")) for review in unclassified]
+                )
+        for review, (category, confidence) in zip(unclassified, results):
+            _set_classification(review, category, confidence)
+        if journal:
+            journal.classified(unclassified)
+
+    for review in reviews:
+        if "reply" not in review:
+            _draft(review, reply_generator)
+            if journal:
+                journal.drafted([review])
+    return reviews
+
+
+def _draft(review, reply_generator):
+    with metrics.track("reply", emails=1):
+        review.reply = reply_generator.generate_reply(review, review.category, use_llm=True)
+
+
+def _set_classification(email, category, confidence):
+    """Fill in the classification and risk fields of the email's record (plain dicts are copied)."""
+    risk_flag = category == "Other" or confidence < 0.6
+
+    review = as_record(email)
+    review.category = category
+    review.confidence = confidence
+    review.risk_flag = "high" if risk_flag else "low"
+    return review
+
+
+def _make_review(email, category, confidence, reply_draft):
+    review = _set_classification(email, category, confidence)
+    review.reply = reply_draft
+    return review
+
+
+def _print_cache_stats(classifier, reply_generator):
+    for label, cache in (("classification", classifier.cache), ("reply", reply_generator.cache)):
+        if cache:
+            stats = cache.stats()
+            print(f"LLM cache ({label}): {stats['hits']} hits, {stats['misses']} misses "
+                  f"({stats['hit_rate']:.0%} hit rate)")
+
+
+def _print_tier_stats(classifier):
+    stats = classifier.tier_stats()
+    if stats:
+        tiers = ", ".join(f"{tier} {stat['count']} ({stat['rate']:.0%})" for tier, stat in sorted(stats.items()))
+        print(f"Classification tiers: {tiers}")
+
+
+def _print_review(review):
+    print("\n" + "=" * 60)
+    print(f"From: {review.get('from')}")
+    print(f"Subject: {review.get('subject')}")
+    print(f"Category: {review['category']} (confidence {review['confidence']:.2f})")
+    print("Suggested reply:")
+    print(review["reply"])
+
+
+async def _process_emails_async(emails, classifier, reply_generator, review_db, concurrency,
+                                chunk_size=LLM_CLASSIFY_BATCH_SIZE, clusters=None, journal=None, receiver=None):
+    """
+    Fetch, classify, draft and persist emails as overlapping stages.
+
+    ``emails`` may be a lazy iterator; it is advanced from a dedicated thread so
+    IMAP fetching overlaps with the LLM calls. Emails are processed in chunks of
+    ``chunk_size`` (one batched classification request each) and at most
+    ``concurrency`` chunks are in flight at once. Finished reviews are collected
+    (and persisted in batches) in input order, so the CSV and the database see
+    the same ordering as the sequential pipeline. Near-duplicate clusters are
+    assigned on the fetch thread, in input order. With a RunJournal, each
+    email's finished stages are recorded as they complete. With a receiver,
+    emails are handed back to it to be flagged \\Seen once persisted.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+    # The email iterator must only be advanced by one thread at a time, and a
+    # single writer thread keeps persisted batches in order.
+    fetch_executor = ThreadPoolExecutor(max_workers=1)
+    persist_executor = ThreadPoolExecutor(max_workers=1)
+    ordered_tasks = asyncio.Queue(maxsize=concurrency * 2)
+    emails = iter(emails)
+
+    def save_reviews(batch):
+        _save_reviews(batch, review_db, journal, receiver)
+
+    def next_chunk():
+        chunk = list(itertools.islice(emails, chunk_size))
+        if clusters:
+            for email in chunk:
+                clusters.assign(email)
+        return chunk
+
+    async def process(chunk):
+        try:
+            return await asyncio.to_thread(_build_reviews, chunk, classifier, reply_generator, clusters, journal)
+        finally:
+            semaphore.release()
+
+    async def produce():
+        try:
+            while True:
+                chunk = await loop.run_in_executor(fetch_executor, next_chunk)
+                if not chunk:
+                    break
+                await semaphore.acquire()
+                await ordered_tasks.put(asyncio.create_task(process(chunk)))
+        finally:
+            await ordered_tasks.put(None)
+
+    producer = asyncio.create_task(produce())
+    reviews = []
+    pending_batch = []
+    persist_futures = []
+
+    try:
+        while True:
+            task = await ordered_tasks.get()
+            if task is None:
+                break
+            for review in await task:
+                _print_review(review)
+                reviews.append(review)
+                pending_batch.append(review)
+            if len(pending_batch) >= PIPELINE_PERSIST_BATCH:
+                persist_futures.append(loop.run_in_executor(persist_executor, save_reviews, pending_batch))
+                pending_batch = []
+
+        await producer
+        if pending_batch:
+            persist_futures.append(loop.run_in_executor(persist_executor, save_reviews, pending_batch))
+        await asyncio.gather(*persist_futures)
+    finally:
+        producer.cancel()
+        fetch_executor.shutdown(wait=True)
+        persist_executor.shutdown(wait=True)
+
+    return reviews
+
+
+def _run_async(emails, classifier, reply_generator, review_db, concurrency, clusters=None, journal=None,
+               receiver=None):
+    async def runner():
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=concurrency))
+        return await _process_emails_async(
+            emails, classifier, reply_generator, review_db, concurrency, clusters=clusters, journal=journal,
+            receiver=receiver,
+        )
+
+    return asyncio.run(runner())
+
+
+def _run_sequential(emails, classifier, reply_generator, review_db, clusters=None, journal=None, receiver=None):
+    reviews = []
+    emails = iter(emails)
+    while True:
+        chunk = list(itertools.islice(emails, LLM_CLASSIFY_BATCH_SIZE))
+        if not chunk:
+            break
+        if clusters:
+            for email in chunk:
+                clusters.assign(email)
+        chunk_reviews = _build_reviews(chunk, classifier, reply_generator, clusters, journal)
+        # Saved before the next chunk is pulled, so an interruption loses at most this chunk
+        _save_reviews(chunk_reviews, review_db, journal, receiver)
+        for review in chunk_reviews:
+            _print_review(review)
+        reviews.extend(chunk_reviews)
+    return reviews
+
+
+def _save_reviews(reviews, review_db, journal=None, receiver=None):
+    """Persist reviews, then hand them back to the receiver so it flags them \\Seen."""
+    if journal:
+        journal.save(reviews)
+    else:
+        review_db.save_reviews(reviews)
+    if receiver:
+        receiver.mark_processed(reviews)
+
+
+def _process_emails(emails, classifier, reply_generator, review_db, concurrency, clusters=None, journal=None,
+                    receiver=None):
+    """
+    Classify, draft and persist ``emails``; returns the reviews in input order.
+
+    With a RunJournal, the emails an interrupted run left unfinished are
+    processed first, and emails the run already handled are skipped. With the
+    EmailReceiver that fetched ``emails``, each email is flagged \\Seen only
+    after its review is persisted.
+    """
+    if journal:
+        on_persisted = receiver.mark_processed if receiver else None
+        emails = itertools.chain(journal.pending(), journal.track(emails, on_persisted))
+    if concurrency > 1:
+        return _run_async(emails, classifier, reply_generator, review_db, concurrency, clusters, journal, receiver)
+    return _run_sequential(emails, classifier, reply_generator, review_db, clusters, journal, receiver)
+
+
+def run_daily_pipeline(concurrency: int = PIPELINE_CONCURRENCY, workers: int = INGEST_WORKERS,
+                       profile_dir: str = None):
+    started = time.perf_counter()
+    metrics_server = metrics.start_configured_server()
+    try:
+        if MAILBOXES_FILE:
+            _run_mailboxes(load_mailboxes(), concurrency, workers, started, profile_dir)
+        else:
+            _run_pipeline(concurrency, started)
+    finally:
+        if metrics_server:
+            metrics_server.shutdown()
+            metrics_server.server_close()
+
+
+def _run_pipeline(concurrency, started):
+    review_db = ReviewDatabase()
+    receiver = None
     if _has_imap_config():
-        emails = fetch_unread_emails()
+        receiver = EmailReceiver(checkpoint_db=review_db if IMAP_INCREMENTAL_SYNC else None)
+        receiver.connect()
+        source = receiver.iter_emails(unread_only=PROCESS_UNSEEN_ONLY)
     else:
-        emails = _demo_emails()
+        source = iter(_demo_emails())
 
-    if not emails:
-        print("No emails to process.")
-        return
+    journal = RunJournal(review_db) if PIPELINE_RESUME else None
+    resumed = journal is not None and journal.resumed
+    try:
+        first = next(source, None)
+        if first is None and not resumed:
+            print("No emails to process.")
+            if journal:
+                journal.finish()
+            return
+        emails = itertools.chain([first], source) if first is not None else source
+        if resumed:
+            print(f"Resuming interrupted run: {journal.finished} email(s) already persisted, "
+                  f"{journal.unfinished} to finish")
+
+        classifier = EmailClassifier(use_llm=True)
+        reply_generator = ReplyGenerator()
+        review_manager = ReviewManager()
+        clusters = _load_clusters(review_db) if NEAR_DUP_ENABLED else None
+
+        reviews = _process_emails(
+            emails, classifier, reply_generator, review_db, concurrency, clusters, journal, receiver
+        )
+    finally:
+        close = getattr(source, "close", None)
+        if close:
+            close()
+        if receiver:
+            _close_receiver(receiver)
+
+    # Regenerated from the database so emails finished before an interruption are included
+    csv_path = review_manager.generate_review_csv(journal.reviews() if journal else reviews)
+    if csv_path:
+        print(f"\n✅ Review CSV generated: {csv_path}")
+    if journal:
+        journal.finish()
+    _print_cache_stats(classifier, reply_generator)
+    _print_tier_stats(classifier)
+    if clusters and clusters.reused:
+        print(f"Near-duplicates: {clusters.reused} email(s) reused a cluster's classification")
+
+    run_summary = {
+        "finished_at": datetime.now().isoformat(timespec="seconds"),
+        "duration_seconds": round(time.perf_counter() - started, 3),
+        "emails": len(reviews),
+        "concurrency": concurrency,
+    }
+    if resumed:
+        run_summary["resumed_run"] = journal.run_id
+    summary_path = metrics.export_run(run_summary)
+    if summary_path:
+        print(f"Metrics summary: {summary_path}")
+
+
+def _process_mailbox(mailbox, concurrency, profile_dir=None):
+    """
+    Worker process: fetch, classify, draft and persist every folder of one mailbox
+
+    Each worker owns its IMAP session, UID checkpoints, classifier and SQLite
+    connections; WAL and the busy timeout let the workers share the database.
+    With PIPELINE_RESUME, the mailbox's run journal is its own scope, so an
+    interrupted mailbox resumes without touching the others. With
+    ``profile_dir``, the worker profiles itself into a subfolder named after
+    the mailbox (a profiler in the parent does not see the worker processes).
 
+    Returns:
+        (summary dict, reviews); reviews are empty when the run is journaled,
+        as the parent reads them back from the database
+    """
+    if profile_dir:
+        import profiling
+
+        subfolder = re.sub(r"[^\w.@-]+", "_", mailbox["name"]) or "mailbox"
+        with profiling.profile_run(os.path.join(profile_dir, subfolder)):
+            return _process_mailbox(mailbox, concurrency)
+
+    # Pool processes are reused, so start each mailbox from empty metrics
+    metrics.REGISTRY.reset()
+    started = time.perf_counter()
+    summary = {"mailbox": mailbox["name"], "folders": {}, "error": None}
+    reviews = []
+    review_db = ReviewDatabase()
     classifier = EmailClassifier(use_llm=True)
     reply_generator = ReplyGenerator()
-    review_manager = ReviewManager()
-    review_db = ReviewDatabase()
-    reviews = []
+    clusters = _load_clusters(review_db) if NEAR_DUP_ENABLED else None
+    journal = RunJournal(review_db, scope=mailbox["name"]) if PIPELINE_RESUME else None
+    if journal:
+        summary["run_id"] = journal.run_id
+    receiver = EmailReceiver(checkpoint_db=review_db if IMAP_INCREMENTAL_SYNC else None, mailbox=mailbox)
+    try:
+        receiver.connect()
+        for folder in mailbox["folders"]:
+            emails = receiver.iter_emails(folder=folder, unread_only=PROCESS_UNSEEN_ONLY)
+            folder_reviews = _process_emails(
+                emails, classifier, reply_generator, review_db, concurrency, clusters, journal, receiver
+            )
+            summary["folders"][folder] = len(folder_reviews)
+            reviews.extend(folder_reviews)
+    except (imaplib.IMAP4.error, OSError, ValueError) as e:
+        summary["error"] = str(e)
+    finally:
+        _close_receiver(receiver)
 
-    for email in emails:
-        category, confidence = classifier.classify(email.get("subject", ""), email.get("body", ""))
-        reply_draft = reply_generator.generate_reply(email, category, use_llm=True)
-        risk_flag = category == "Other" or confidence < 0.6
-
-        reviews.append({
-            **email,
-            "category": category,
-            "confidence": confidence,
-            "reply": reply_draft,
-            "risk_flag": "high" if risk_flag else "low",
-        })
+    summary.update({
+        "emails": len(reviews),
+        "high_risk": sum(1 for review in reviews if review["risk_flag"] == "high"),
+        "seconds": round(time.perf_counter() - started, 3),
+        "tiers": classifier.tier_stats(),
+        "metrics": metrics.REGISTRY.summary(),
+    })
+    return summary, reviews if journal is None else []
+
+
+def _print_mailbox_summary(summaries):
+    print("\nMailbox summary:")
+    width = max(len(summary["mailbox"]) for summary in summaries)
+    for summary in summaries:
+        folders = ", ".join(f"{folder} {count}" for folder, count in summary["folders"].items()) or "-"
+        line = (f"  {summary['mailbox']:<{width}}  {summary.get('emails', 0):>6} emails  "
+                f"{summary.get('high_risk', 0):>5} high risk  {summary.get('seconds', 0):>8.1f}s  ({folders})")
+        if summary["error"]:
+            line += f"  ❌ {summary['error']}"
+        print(line)
 
-        print("\n" + "=" * 60)
-        print(f"From: {email.get('from')}")
-        print(f"Subject: {email.get('subject')}")
-        print(f"Category: {category} (confidence {confidence:.2f})")
-        print("Suggested reply:")
-        print(reply_draft)
 
-    csv_path = review_manager.generate_review_csv(reviews)
+def _run_mailboxes(mailboxes, concurrency, workers, started, profile_dir=None):
+    """
+    Shard the configured mailboxes across a pool of worker processes
+
+    Mailboxes are handed out one at a time, so a worker that finishes a small
+    inbox picks up the next one. Reviews from all mailboxes go into one CSV.
+    A mailbox whose worker crashed keeps its run open, to be resumed next time.
+    """
+    if not mailboxes:
+        print("No mailboxes configured.")
+        return
+    # Create or migrate the schema once, before the workers open the file
+    review_db = ReviewDatabase()
+    workers = min(workers, len(mailboxes))
+    summaries, reviews = [], []
+    # spawn: workers must not inherit the parent's SQLite handles or helper threads
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [pool.submit(_process_mailbox, mailbox, concurrency, profile_dir) for mailbox in mailboxes]
+        for mailbox, future in zip(mailboxes, futures):
+            try:
+                summary, mailbox_reviews = future.result()
+            except Exception as e:
+                summary, mailbox_reviews = {
+                    "mailbox": mailbox["name"], "folders": {}, "error": f"{type(e).__name__}: {e}",
+                }, []
+            summaries.append(summary)
+            reviews.extend(mailbox_reviews)
+            if summary.get("run_id"):
+                # Includes emails persisted before an earlier interruption
+                reviews.extend(review_db.iter_run_reviews(summary["run_id"]))
+
+    csv_path = ReviewManager().generate_review_csv(reviews)
     if csv_path:
         print(f"\n✅ Review CSV generated: {csv_path}")
+    for summary in summaries:
+        # A mailbox that failed part-way keeps its run open, so its unfinished emails are replayed next time
+        if summary.get("run_id") and not summary["error"]:
+            review_db.finish_run(summary["run_id"])
+    _print_mailbox_summary(summaries)
+
+    summary_path = metrics.export_run({
+        "finished_at": datetime.now().isoformat(timespec="seconds"),
+        "duration_seconds": round(time.perf_counter() - started, 3),
+        "emails": len(reviews),
+        "concurrency": concurrency,
+        "workers": workers,
+        "mailboxes": summaries,
+    })
+    if summary_path:
+        print(f"Metrics summary: {summary_path}")
+
+
+def _observe_arrival(review):
+    """Record how long after its Date header an email's draft was saved."""
+    try:
+        sent = parsedate_to_datetime(review.get("date", ""))
+    except (TypeError, ValueError):
+        return
+    if sent.tzinfo is None:
+        sent = sent.replace(tzinfo=timezone.utc)
+    metrics.ARRIVAL_TO_DRAFT.observe(max(0.0, (datetime.now(timezone.utc) - sent).total_seconds()))
+
+
+def _drain_new_emails(receiver, folder, classifier, reply_generator, review_db, concurrency, clusters=None):
+    """
+    Classify, draft and persist every email above the folder's checkpoint; returns how many.
+
+    The checkpoint and \\Seen flags follow the persisted reviews, so a crash in
+    the middle of a burst leaves the unsaved emails to the next drain.
+    """
+    emails = receiver.iter_emails(folder=folder, unread_only=PROCESS_UNSEEN_ONLY, incremental=True)
+    reviews = _process_emails(
+        emails, classifier, reply_generator, review_db, concurrency, clusters, receiver=receiver
+    )
+    # Before going back to IDLE, while this thread owns the session again
+    receiver.flush_processed()
+    for review in reviews:
+        append_to_review_csv(review, review["category"], review["reply"], review["risk_flag"] == "high")
+        _observe_arrival(review)
+    if reviews and METRICS_PROM_FILE:
+        metrics.write_prometheus(METRICS_PROM_FILE)
+    return len(reviews)
+
+
+def _close_receiver(receiver):
+    if receiver.server is None:
+        return
+    try:
+        # Emails persisted since the last FETCH batch still need their \Seen flag
+        receiver.flush_processed()
+        receiver.disconnect()
+    except (imaplib.IMAP4.error, OSError):
+        try:
+            receiver.server.shutdown()
+        except OSError:
+            pass
+
+
+def run_daemon(folder: str = "INBOX", concurrency: int = PIPELINE_CONCURRENCY):
+    """
+    Service mode: keep an IMAP session in IDLE and draft each email as it arrives
+
+    New mail is fetched as soon as the server announces it (EXISTS), then
+    classified, drafted, saved to SQLite and appended to today's review CSV.
+    Progress is tracked with the UID checkpoint, so a restart resumes where the
+    last session stopped. Servers without IDLE are polled instead.
+
+    Args:
+        folder: Mailbox folder to watch (default: INBOX)
+        concurrency: Chunks processed in parallel when a burst of mail arrives
+    """
+    if not _has_imap_config():
+        print("IMAP configuration missing; daemon mode needs IMAP_SERVER, EMAIL_ADDRESS and EMAIL_APP_PASSWORD.")
+        return
+
+    classifier = EmailClassifier(use_llm=True)
+    reply_generator = ReplyGenerator()
+    review_db = ReviewDatabase()
+    clusters, clusters_day = None, None
+    metrics_server = metrics.start_configured_server()
+    started = time.perf_counter()
+    processed = 0
+    backoff = 1.0
+
+    try:
+        while True:
+            receiver = EmailReceiver(checkpoint_db=review_db)
+            try:
+                receiver.connect()
+                backoff = 1.0
+                use_idle = receiver.supports_idle()
+                if not use_idle:
+                    print(f"Server has no IDLE support; polling every {IMAP_POLL_SECONDS:g}s")
+                while True:
+                    # Rebuilt daily so the near-duplicate index only spans the history window
+                    if NEAR_DUP_ENABLED and clusters_day != date.today():
+                        clusters, clusters_day = _load_clusters(review_db), date.today()
+                    count = _drain_new_emails(
+                        receiver, folder, classifier, reply_generator, review_db, concurrency, clusters
+                    )
+                    if count:
+                        processed += count
+                        print(f"\n✅ Drafted {count} new email(s); {processed} since start")
+                    if use_idle:
+                        receiver.idle(IMAP_IDLE_REFRESH_SECONDS)
+                    else:
+                        time.sleep(IMAP_POLL_SECONDS)
+            except (imaplib.IMAP4.error, OSError) as e:
+                print(f"⚠️  IMAP connection lost ({e}); reconnecting in {backoff:g}s")
+            finally:
+                _close_receiver(receiver)
+            time.sleep(backoff)
+            backoff = min(backoff * 2, IMAP_RECONNECT_MAX_SECONDS)
+    except KeyboardInterrupt:
+        print("\nStopping daemon")
+    finally:
+        if metrics_server:
+            metrics_server.shutdown()
+            metrics_server.server_close()
+        metrics.export_run({
+            "mode": "daemon",
+            "finished_at": datetime.now().isoformat(timespec="seconds"),
+            "duration_seconds": round(time.perf_counter() - started, 3),
+            "emails": processed,
+            "concurrency": concurrency,
+        })
 
-    review_db.save_reviews(reviews)
 
 if __name__ == "__main__":
-    run_daily_pipeline()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fetch, classify and draft replies for unread emails")
+    parser.add_argument("--profile", nargs="?", const=PROFILE_DIR, metavar="DIR",
+                        help=f"write per-stage cProfile and tracemalloc reports (default {PROFILE_DIR})")
+    parser.add_argument("--daemon", action="store_true",
+                        help="keep running and draft new emails as they arrive (IMAP IDLE)")
+    parser.add_argument("--folder", default="INBOX", help="folder watched in daemon mode")
+    args = parser.parse_args()
+
+    concurrency = PIPELINE_CONCURRENCY
+    if args.profile and concurrency > 1:
+        # Stages on worker threads can't be profiled on Python 3.12+ (one cProfile per process)
+        print(f"--profile: running sequentially instead of PIPELINE_CONCURRENCY={concurrency}")
+        concurrency = 1
+    if args.daemon:
+        run = lambda: run_daemon(args.folder, concurrency)
+    elif args.profile and MAILBOXES_FILE:
+        # The mailboxes run in worker processes, so each worker writes its own profile
+        run = lambda: run_daily_pipeline(concurrency, profile_dir=args.profile)
+    else:
+        run = lambda: run_daily_pipeline(concurrency)
+    if args.profile and (args.daemon or not MAILBOXES_FILE):
+        import profiling
+
+        with profiling.profile_run(args.profile):
+            run()
+    else:
+        run()
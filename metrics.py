@@ -0,0 +1,353 @@
+"""
+In-process metrics: counters, gauges and latency histograms per pipeline stage and LLM call.
+Exported as Prometheus text (file or local HTTP endpoint) and as a JSON run summary.
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, ContextManager, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from config import METRICS_ENABLED, METRICS_PROM_FILE, METRICS_HTTP_PORT, METRICS_SUMMARY_DIR
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Seconds; spans fast SQLite batches up to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labelnames: Sequence[str], labels: Dict[str, str]) -> Tuple[str, ...]:
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: Sequence[str], key: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, key)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        if not METRICS_ENABLED or not amount:
+            return
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def values(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        return super().render() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {value:g}"
+            for key, value in sorted(self.values().items())
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[_label_key(self.labelnames, labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def series(self) -> Dict[Tuple[str, ...], List[float]]:
+        with self._lock:
+            return {key: list(value) for key, value in self._series.items()}
+
+    def quantile(self, counts: List[float], q: float) -> Optional[float]:
+        """Estimate a quantile by linear interpolation inside the matching bucket."""
+        total = sum(counts[:-1])
+        if not total:
+            return None
+        rank, cumulative = q * total, 0
+        for index, count in enumerate(counts[:-1]):
+            if cumulative + count >= rank and count:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, counts in sorted(self.series().items()):
+            labels = _format_labels(self.labelnames, key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = 'le="%s"' % (bound if isinstance(bound, str) else f"{bound:g}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative:g}")
+            lines.append(f"{self.name}_sum{labels} {counts[-1]:.6f}")
+            lines.append(f"{self.name}_count{labels} {cumulative:g}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def reset(self):
+        """Forget every recorded value, e.g. when a worker process starts its next job."""
+        for metric in self._metrics:
+            metric.reset()
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict:
+        """JSON-friendly snapshot: counter/gauge values and histogram count, mean, p50, p99."""
+        result = {}
+        for metric in self._metrics:
+            entries = []
+            if isinstance(metric, Histogram):
+                for key, counts in sorted(metric.series().items()):
+                    count = sum(counts[:-1])
+                    entries.append({
+                        **dict(zip(metric.labelnames, key)),
+                        "count": count,
+                        "total_seconds": round(counts[-1], 4),
+                        "mean_seconds": round(counts[-1] / count, 4) if count else None,
+                        "p50_seconds": metric.quantile(counts, 0.5),
+                        "p99_seconds": metric.quantile(counts, 0.99),
+                    })
+            else:
+                for key, value in sorted(metric.values().items()):
+                    entries.append({**dict(zip(metric.labelnames, key)), "value": value})
+            if entries:
+                result[metric.name] = entries
+        return result
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "aftersale_stage_seconds", "Time spent per pipeline stage call", ("stage",)))
+STAGE_ERRORS = REGISTRY.register(Counter(
+    "aftersale_stage_errors_total", "Pipeline stage calls that raised", ("stage",)))
+STAGE_IN_FLIGHT = REGISTRY.register(Gauge(
+    "aftersale_stage_in_flight", "Pipeline stage calls currently running", ("stage",)))
+EMAILS = REGISTRY.register(Counter(
+    "aftersale_emails_total", "Emails passing through each pipeline stage", ("stage",)))
+
+LLM_SECONDS = REGISTRY.register(Histogram(
+    "aftersale_llm_request_seconds", "LLM API request latency", ("operation",)))
+LLM_REQUESTS = REGISTRY.register(Counter(
+    "aftersale_llm_requests_total", "LLM API requests by outcome", ("operation", "outcome")))
+LLM_IN_FLIGHT = REGISTRY.register(Gauge(
+    "aftersale_llm_in_flight", "LLM API requests currently waiting for a response", ("operation",)))
+LLM_CACHE = REGISTRY.register(Counter(
+    "aftersale_llm_cache_total", "LLM result cache lookups", ("operation", "result")))
+LLM_FALLBACKS = REGISTRY.register(Counter(
+    "aftersale_llm_fallbacks_total", "Results produced without a usable LLM answer", ("operation", "reason")))
+CLASSIFY_TIERS = REGISTRY.register(Counter(
+    "aftersale_classify_tier_total", "Emails classified per cascade tier", ("tier",)))
+ARRIVAL_TO_DRAFT = REGISTRY.register(Histogram(
+    "aftersale_arrival_to_draft_seconds", "Time from an email's Date header to its saved draft (daemon mode)",
+    buckets=(1, 2, 5, 10, 30, 60, 120, 300, 900, 3600, 4 * 3600, 24 * 3600)))
+
+
+# Extra context managers entered around every stage call (e.g. the profiler); empty unless installed
+_stage_hooks: List[Callable[[str], ContextManager]] = []
+
+
+def add_stage_hook(hook: Callable[[str], ContextManager]):
+    """Enter ``hook(stage)`` around every tracked stage call, even with metrics disabled."""
+    _stage_hooks.append(hook)
+
+
+def remove_stage_hook(hook: Callable[[str], ContextManager]):
+    if hook in _stage_hooks:
+        _stage_hooks.remove(hook)
+
+
+def track(stage: str, emails: int = 0) -> ContextManager:
+    """Time a pipeline stage call, keep its in-flight gauge and count errors and emails."""
+    if _stage_hooks:
+        return _track_with_hooks(stage, emails)
+    return _track(stage, emails)
+
+
+@contextmanager
+def _track_with_hooks(stage: str, emails: int) -> Iterator[None]:
+    with ExitStack() as hooks:
+        for hook in tuple(_stage_hooks):
+            hooks.enter_context(hook(stage))
+        with _track(stage, emails):
+            yield
+
+
+@contextmanager
+def _track(stage: str, emails: int) -> Iterator[None]:
+    if not METRICS_ENABLED:
+        yield
+        return
+    STAGE_IN_FLIGHT.inc(stage=stage)
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+        STAGE_IN_FLIGHT.dec(stage=stage)
+        EMAILS.inc(emails, stage=stage)
+
+
+@contextmanager
+def track_llm(operation: str) -> Iterator[None]:
+    """Time one LLM API request; an exception counts as an "error" outcome."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    LLM_IN_FLIGHT.inc(operation=operation)
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "success"
+    finally:
+        LLM_SECONDS.observe(time.perf_counter() - start, operation=operation)
+        LLM_REQUESTS.inc(operation=operation, outcome=outcome)
+        LLM_IN_FLIGHT.dec(operation=operation)
+
+
+def write_prometheus(path: str, registry: Registry = REGISTRY):
+    """Write the text exposition atomically (e.g. for node_exporter's textfile collector)."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(registry.render_prometheus())
+    os.replace(tmp_path, path)
+
+
+def write_summary(directory: str, extra: Optional[Dict] = None, registry: Registry = REGISTRY) -> str:
+    """Write a JSON summary of this run's metrics; returns the file path."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"run_{datetime.now():%Y-%m-%d_%H%M%S}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({**(extra or {}), "metrics": registry.summary()}, f, indent=2, ensure_ascii=False)
+    return path
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.registry.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_http_server(port: int, host: str = "127.0.0.1", registry: Registry = REGISTRY) -> ThreadingHTTPServer:
+    """Serve /metrics from a daemon thread; call shutdown() on the result to stop it."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    server.registry = registry
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"✅ Metrics available at http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+def start_configured_server() -> Optional[ThreadingHTTPServer]:
+    """Start the /metrics endpoint when METRICS_HTTP_PORT is set."""
+    if not (METRICS_ENABLED and METRICS_HTTP_PORT):
+        return None
+    try:
+        return start_http_server(METRICS_HTTP_PORT)
+    except OSError as e:
+        logger.warning(f"⚠️  Could not serve metrics on port {METRICS_HTTP_PORT}: {e}")
+        return None
+
+
+def export_run(extra: Optional[Dict] = None) -> Optional[str]:
+    """Write the configured Prometheus file and the JSON run summary; returns the summary path."""
+    if not METRICS_ENABLED:
+        return None
+    if METRICS_PROM_FILE:
+        write_prometheus(METRICS_PROM_FILE)
+    if METRICS_SUMMARY_DIR:
+        return write_summary(METRICS_SUMMARY_DIR, extra)
+    return None
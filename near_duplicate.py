@@ -0,0 +1,174 @@
+"""
+SimHash fingerprints for spotting near-duplicate customer emails.
+Used by the pipeline to classify each cluster of near-identical emails once.
+"""
+
+import hashlib
+import re
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+from config import NEAR_DUP_MAX_DISTANCE
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+|[\u4e00-\u9fff]")
+_BITS = 64
+_BANDS = 4
+_BAND_BITS = _BITS // _BANDS
+_BAND_MASK = (1 << _BAND_BITS) - 1
+# Shorter texts share too many shingles by chance to be fingerprinted reliably
+_MIN_FEATURES = 8
+
+
+def simhash(text: str) -> Optional[int]:
+    """
+    64-bit SimHash over word bigrams (single characters for Chinese).
+
+    Returns None when the text is too short to fingerprint reliably.
+    """
+    tokens = _TOKEN_RE.findall(text.lower())
+    features = [" ".join(pair) for pair in zip(tokens, tokens[1:])]
+    if len(features) < _MIN_FEATURES:
+        return None
+
+    weights = [0] * _BITS
+    for feature in features:
+        value = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(_BITS):
+            if value >> bit & 1:
+                weights[bit] += 1
+            else:
+                weights[bit] -= 1
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def email_fingerprint(subject: str, body: str) -> Optional[int]:
+    return simhash(f"{subject}\n{body}")
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def _normalize(text: str) -> str:
+    return " ".join((text or "").lower().split())
+
+
+def same_content(a: Dict, b: Dict) -> bool:
+    """True if two emails have the same subject and body up to case and whitespace."""
+    return (_normalize(a.get("subject", "")) == _normalize(b.get("subject", ""))
+            and _normalize(a.get("body", "")) == _normalize(b.get("body", "")))
+
+
+def cluster_source(email: Dict) -> Dict:
+    """The fields of a cluster leader that decide whether a member may reuse its draft."""
+    return {key: email.get(key, "") or "" for key in ("from", "subject", "body", "date")}
+
+
+class NearDuplicateIndex:
+    """
+    Maps fingerprints to cluster ids.
+
+    Fingerprints are split into four 16-bit bands; two fingerprints within
+    three bits of each other must agree on at least one band, so only
+    fingerprints sharing a band are compared. Larger distances are still
+    checked but may be missed when every band differs.
+    """
+
+    def __init__(self, max_distance: int = NEAR_DUP_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self._bands: List[Dict[int, List[tuple]]] = [{} for _ in range(_BANDS)]
+
+    def lookup(self, fingerprint: Optional[int]) -> Optional[str]:
+        """Return the cluster id of the closest indexed fingerprint within max_distance."""
+        if fingerprint is None:
+            return None
+        best, best_distance = None, self.max_distance + 1
+        for band, buckets in enumerate(self._bands):
+            for candidate, cluster_id in buckets.get(fingerprint >> (band * _BAND_BITS) & _BAND_MASK, ()):
+                distance = hamming_distance(fingerprint, candidate)
+                if distance < best_distance:
+                    best, best_distance = cluster_id, distance
+        return best
+
+    def add(self, fingerprint: Optional[int], cluster_id: str):
+        if fingerprint is None:
+            return
+        for band, buckets in enumerate(self._bands):
+            buckets.setdefault(fingerprint >> (band * _BAND_BITS) & _BAND_MASK, []).append((fingerprint, cluster_id))
+
+
+class ClusterTracker:
+    """
+    Assigns the emails of a run to near-duplicate clusters and shares each
+    cluster's result with its members.
+
+    The first email of a cluster (its leader) is processed normally; later
+    members wait for the leader's result (category, confidence, draft and the
+    leader's own fields) instead of calling the LLM. Clusters can be seeded
+    from recent history so a new email may reuse a stored classification.
+    Results are concurrent.futures.Future objects, so members may wait from
+    any worker thread.
+    """
+
+    def __init__(self, max_distance: int = NEAR_DUP_MAX_DISTANCE):
+        self.index = NearDuplicateIndex(max_distance)
+        self._results: Dict[str, Future] = {}
+        self._leaders = set()
+        self._lock = threading.Lock()
+        self.reused = 0
+
+    def load_history(self, rows: List[Dict]):
+        """Seed clusters from ReviewDatabase.recent_fingerprints rows (oldest first)."""
+        for row in rows:
+            cluster_id = row["cluster_id"] or row["email_id"]
+            self.index.add(int(row["fingerprint"], 16), cluster_id)
+            if cluster_id not in self._results:
+                future = Future()
+                future.set_result({
+                    "category": row["category"],
+                    "confidence": row["confidence"],
+                    "reply": row["suggested_reply"],
+                    "email": cluster_source({
+                        "from": row["sender"], "subject": row["subject"],
+                        "body": row["original_body"], "date": row["received_date"],
+                    }),
+                })
+                self._results[cluster_id] = future
+
+    def assign(self, email: Dict):
+        """
+        Tag ``email`` with "fingerprint" and "cluster_id".
+
+        Must be called in input order from a single thread so every cluster's
+        leader is assigned before its members.
+        """
+        fingerprint = email_fingerprint(email.get("subject", ""), email.get("body", ""))
+        email["fingerprint"] = f"{fingerprint:016x}" if fingerprint is not None else None
+        cluster_id = self.index.lookup(fingerprint)
+        if cluster_id is None:
+            cluster_id = email.get("id")
+            self.index.add(fingerprint, cluster_id)
+            self._leaders.add(cluster_id)
+            self._results[cluster_id] = Future()
+        email["cluster_id"] = cluster_id
+
+    def is_leader(self, email: Dict) -> bool:
+        return email.get("cluster_id") in self._leaders and email.get("cluster_id") == email.get("id")
+
+    def resolve(self, cluster_id: str, result: Dict):
+        self._results[cluster_id].set_result(result)
+
+    def fail(self, cluster_id: str, error: BaseException):
+        self._results[cluster_id].set_exception(error)
+
+    def result(self, cluster_id: str) -> Dict:
+        """Block until the cluster leader's result is available."""
+        with self._lock:
+            self.reused += 1
+        return self._results[cluster_id].result()
@@ -0,0 +1,177 @@
+"""
+Background sender that drains the SQLite outbox under the provider's rate limit.
+Run it as a separate process: python outbox_worker.py
+"""
+
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from config import (
+    OUTBOX_RATE_PER_MINUTE, OUTBOX_BURST, OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_BACKOFF_SECONDS, OUTBOX_MAX_BACKOFF_SECONDS, OUTBOX_POLL_SECONDS,
+)
+from email_sender import EmailSender, approved_reply_messages
+from review_database import ReviewDatabase
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 421 (service not available) and 450/451/452 are how providers signal throttling
+_THROTTLE_CODES = {421, 450, 451, 452}
+
+
+class TokenBucket:
+    """Token bucket refilled at ``rate`` tokens per second, holding at most ``capacity``."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Block until a token is available and take it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def release(self):
+        """Give back a token that was acquired but not used."""
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens for ``seconds`` and drop the accumulated burst."""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+
+class OutboxWorker:
+    def __init__(self, db: Optional[ReviewDatabase] = None, sender: Optional[EmailSender] = None,
+                 rate_per_minute: float = OUTBOX_RATE_PER_MINUTE, burst: int = OUTBOX_BURST,
+                 max_attempts: int = OUTBOX_MAX_ATTEMPTS):
+        self.db = db or ReviewDatabase()
+        self.sender = sender or EmailSender()
+        self.bucket = TokenBucket(rate_per_minute / 60.0, burst)
+        self.max_attempts = max_attempts
+        self.stats = {"sent": 0, "retried": 0, "failed": 0}
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(OUTBOX_MAX_BACKOFF_SECONDS, OUTBOX_BACKOFF_SECONDS * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.8, 1.2)
+
+    def _handle_result(self, row: Dict, result: Dict):
+        if result["success"]:
+            self.db.mark_outbox_sent(row["id"])
+            self.stats["sent"] += 1
+            return
+
+        code = result.get("smtp_code")
+        error = result.get("error") or "unknown error"
+        if result.get("ambiguous"):
+            # The connection dropped after DATA: the message may have gone out, so never resend it blindly
+            self.db.mark_outbox_failed(row["id"], f"connection lost during DATA, may have been delivered: {error}")
+            self.stats["failed"] += 1
+            logger.error(f"❌ Outbox message {row['id']} to {row['recipient']} may or may not have been sent "
+                         f"({error}); check the sent folder before requeueing")
+            return
+
+        # No SMTP code means the connection failed before DATA; 4xx is transient; 5xx is permanent
+        transient = code is None or 400 <= code < 500
+        if code in _THROTTLE_CODES:
+            # Back off the whole stream, not just this message, to avoid a throttling storm
+            self.bucket.pause(self._backoff(1))
+
+        if transient and row["attempts"] < self.max_attempts:
+            next_attempt = datetime.now() + timedelta(seconds=self._backoff(row["attempts"]))
+            self.db.mark_outbox_retry(row["id"], error, next_attempt)
+            self.stats["retried"] += 1
+            logger.warning(f"Outbox message {row['id']} to {row['recipient']} will retry at "
+                           f"{next_attempt:%H:%M:%S}: {error}")
+        else:
+            self.db.mark_outbox_failed(row["id"], error)
+            self.stats["failed"] += 1
+            logger.error(f"❌ Outbox message {row['id']} to {row['recipient']} failed: {error}")
+
+    def run_once(self, batch_size: int = 50) -> int:
+        """
+        Send up to ``batch_size`` messages that are currently due; returns how many were attempted.
+
+        Each message is claimed only once a token is in hand and is sent right
+        away, so a row sits in 'sending' for one SMTP transaction at most.
+        """
+        attempted = 0
+        while attempted < batch_size:
+            self.bucket.acquire()
+            rows = self.db.claim_outbox(1)
+            if not rows:
+                self.bucket.release()
+                break
+            row = rows[0]
+            result = self.sender.deliver({
+                "id": row["email_id"],
+                "to": row["recipient"],
+                "subject": row["subject"] or "",
+                "body": row["body"] or "",
+            })
+            self._handle_result(row, result)
+            attempted += 1
+        return attempted
+
+    def run(self, stop_event: Optional[threading.Event] = None, until_empty: bool = False):
+        """
+        Drain the outbox continuously
+
+        Args:
+            stop_event: Set to stop the loop between batches
+            until_empty: Return once nothing is due instead of polling forever
+        """
+        stop_event = stop_event or threading.Event()
+        try:
+            while not stop_event.is_set():
+                # Claims whose lease ran out belong to a worker that died mid-send
+                recovered = self.db.recover_outbox()
+                if recovered:
+                    logger.warning(f"{recovered} outbox message(s) were interrupted mid-send and marked failed")
+                if self.run_once() == 0:
+                    if until_empty:
+                        break
+                    stop_event.wait(OUTBOX_POLL_SECONDS)
+        finally:
+            self.sender.disconnect()
+        logger.info(f"Outbox worker stopped: {self.stats}")
+
+
+def enqueue_approved_replies(filepath: str, db: Optional[ReviewDatabase] = None) -> int:
+    """Queue every approved reply from a review CSV; returns the number newly queued."""
+    from email_review_manager import ReviewManager
+
+    db = db or ReviewDatabase()
+    queued = db.enqueue_outbox(approved_reply_messages(ReviewManager().get_approved_replies(filepath)))
+    logger.info(f"✅ Queued {queued} message(s) in the outbox")
+    return queued
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1:
+        enqueue_approved_replies(sys.argv[1])
+    OutboxWorker().run()
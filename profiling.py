@@ -0,0 +1,243 @@
+"""
+Opt-in profiling of pipeline stages: cProfile hotspot tables and tracemalloc
+allocation sites per stage (the stages marked by metrics.track).
+
+Enabled with ``python main.py --profile [DIR]``. This module is only imported
+when the switch is given, so a normal run pays nothing for it.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import metrics
+from config import PROFILE_DIR, PROFILE_TOP_N, PROFILE_TRACE_FRAMES
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Time spent on profiled threads outside any tracked stage
+OUTSIDE_STAGES = "outside_stages"
+# From 3.12 cProfile sits on sys.monitoring, which allows one active profiler per process, not per thread
+_ONE_PROFILER_PER_PROCESS = sys.version_info >= (3, 12)
+# A new allocation snapshot is taken when a stage ends with traced memory this much above its last one
+_SNAPSHOT_GROWTH = 1.1
+# Allocation sites that are bookkeeping rather than pipeline work
+_IGNORED_FILES = frozenset((
+    tracemalloc.__file__, "<frozen importlib._bootstrap>", "<frozen importlib._bootstrap_external>", "<unknown>",
+))
+
+
+def _mib(size: int) -> str:
+    return f"{size / (1024 * 1024):.1f} MiB"
+
+
+class StageProfiler:
+    """
+    Collect one cProfile profile per stage and thread, plus the tracemalloc
+    snapshot taken at each stage's traced-memory high-water mark
+
+    On Python 3.12+ only the thread that called start() is profiled, so run
+    the pipeline sequentially (main.py does this for ``--profile``).
+
+    Args:
+        output_dir: Folder for the reports (created on write)
+        top_n: Rows per hotspot / allocation table
+        trace_frames: Frames stored per allocation; 0 disables tracemalloc
+    """
+
+    def __init__(self, output_dir: str, top_n: int = PROFILE_TOP_N, trace_frames: int = PROFILE_TRACE_FRAMES):
+        self.output_dir = output_dir
+        self.top_n = top_n
+        self.trace_frames = trace_frames
+        self._lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        self._local = threading.local()
+        self._profiles: Dict[Tuple[str, int], cProfile.Profile] = {}
+        self._calls: Dict[str, int] = {}
+        self._memory_high: Dict[str, int] = {}
+        self._snapshots: Dict[str, tracemalloc.Snapshot] = {}
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._started_tracemalloc = False
+        self._peak_memory: Optional[int] = None
+        self._owner: Optional[int] = None
+
+    def start(self):
+        self._owner = threading.get_ident()
+        if self.trace_frames and not tracemalloc.is_tracing():
+            tracemalloc.start(self.trace_frames)
+            self._started_tracemalloc = True
+        if tracemalloc.is_tracing():
+            self._baseline = tracemalloc.take_snapshot()
+        metrics.add_stage_hook(self.stage)
+        self._push(self._profile(OUTSIDE_STAGES))
+
+    def stop(self):
+        metrics.remove_stage_hook(self.stage)
+        stack = self._stack()
+        while stack:
+            stack.pop().disable()
+        if tracemalloc.is_tracing():
+            self._snapshots["run"] = tracemalloc.take_snapshot()
+            self._memory_high["run"], self._peak_memory = tracemalloc.get_traced_memory()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+    def _stack(self) -> List[cProfile.Profile]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _profile(self, stage: str) -> cProfile.Profile:
+        key = (stage, threading.get_ident())
+        with self._lock:
+            profile = self._profiles.get(key)
+            if profile is None:
+                profile = self._profiles[key] = cProfile.Profile()
+            return profile
+
+    def _push(self, profile: cProfile.Profile):
+        # Only one profiler can be active per thread: pause the enclosing one
+        stack = self._stack()
+        if stack:
+            stack[-1].disable()
+        stack.append(profile)
+        profile.enable()
+
+    def _pop(self):
+        stack = self._stack()
+        stack.pop().disable()
+        if stack:
+            stack[-1].enable()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        if _ONE_PROFILER_PER_PROCESS and threading.get_ident() != self._owner:
+            # enable() would raise "Another profiling tool is already active"
+            yield
+            return
+        profile = self._profile(name)
+        if profile in self._stack():
+            yield
+            return
+        with self._lock:
+            self._calls[name] = self._calls.get(name, 0) + 1
+        self._push(profile)
+        try:
+            yield
+        finally:
+            self._pop()
+            if tracemalloc.is_tracing():
+                self._sample_memory(name)
+
+    def _sample_memory(self, name: str):
+        current = tracemalloc.get_traced_memory()[0]
+        if current <= self._memory_high.get(name, 0) * _SNAPSHOT_GROWTH:
+            return
+        # Snapshots are expensive; skip rather than queue behind another thread's
+        if not self._snapshot_lock.acquire(blocking=False):
+            return
+        try:
+            self._memory_high[name] = current
+            self._snapshots[name] = tracemalloc.take_snapshot()
+        finally:
+            self._snapshot_lock.release()
+
+    def _stage_stats(self) -> Dict[str, pstats.Stats]:
+        merged: Dict[str, pstats.Stats] = {}
+        with self._lock:
+            profiles = list(self._profiles.items())
+        for (stage, _), profile in profiles:
+            profile.create_stats()
+            if not profile.stats:
+                continue
+            if stage in merged:
+                merged[stage].add(profile)
+            else:
+                merged[stage] = pstats.Stats(profile)
+        return merged
+
+    def _hotspots(self, stats: pstats.Stats) -> str:
+        out = io.StringIO()
+        stats.stream = out
+        for sort in ("cumulative", "tottime"):
+            out.write(f"=== Top {self.top_n} by {sort} ===\n")
+            stats.sort_stats(sort).print_stats(self.top_n)
+        return out.getvalue()
+
+    def _top(self, statistics) -> List[str]:
+        # Filtering the statistics is much cheaper than Snapshot.filter_traces() on every trace
+        kept = (stat for stat in statistics if stat.traceback[0].filename not in _IGNORED_FILES)
+        return [str(stat) for _, stat in zip(range(self.top_n), kept)]
+
+    def _allocations(self, name: str, snapshot: tracemalloc.Snapshot) -> str:
+        lines = [f"Traced memory at snapshot: {_mib(self._memory_high[name])}", ""]
+        lines.append(f"=== Top {self.top_n} allocation sites (live at snapshot) ===")
+        lines.extend(self._top(snapshot.statistics("lineno")))
+        if self._baseline is not None:
+            lines += ["", f"=== Top {self.top_n} growth since run start ==="]
+            lines.extend(self._top(snapshot.compare_to(self._baseline, "lineno")))
+        if self.trace_frames > 1 and name == "run":
+            top = snapshot.statistics("traceback")[:3]
+            for index, stat in enumerate(top, start=1):
+                lines += ["", f"=== Traceback #{index}: {stat.count} blocks, {_mib(stat.size)} ==="]
+                lines.extend(stat.traceback.format())
+        return "\n".join(lines) + "\n"
+
+    def write_reports(self) -> str:
+        """Write <stage>.prof, <stage>_hotspots.txt, <stage>_allocations.txt and summary.txt."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        stage_stats = self._stage_stats()
+        summary = [f"{'stage':<20} {'calls':>8} {'seconds':>10} {'functions':>10}  {'traced memory':>14}"]
+        ranked = sorted(stage_stats.items(), key=lambda item: item[1].total_tt, reverse=True)
+        for stage, stats in ranked:
+            stats.dump_stats(os.path.join(self.output_dir, f"{stage}.prof"))
+            with open(os.path.join(self.output_dir, f"{stage}_hotspots.txt"), "w", encoding="utf-8") as f:
+                f.write(self._hotspots(stats))
+            memory = _mib(self._memory_high[stage]) if stage in self._memory_high else "-"
+            summary.append(f"{stage:<20} {self._calls.get(stage, 1):>8} {stats.total_tt:>10.3f} "
+                           f"{len(stats.stats):>10}  {memory:>14}")
+
+        for name, snapshot in self._snapshots.items():
+            with open(os.path.join(self.output_dir, f"{name}_allocations.txt"), "w", encoding="utf-8") as f:
+                f.write(self._allocations(name, snapshot))
+        if self._peak_memory is not None:
+            summary += ["", f"Peak traced memory: {_mib(self._peak_memory)}"]
+
+        path = os.path.join(self.output_dir, "summary.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(summary) + "\n")
+        return path
+
+
+@contextmanager
+def profile_run(directory: str = PROFILE_DIR) -> Iterator[StageProfiler]:
+    """
+    Profile everything run inside the block and write the reports on exit
+
+    Args:
+        directory: Parent folder; each run gets its own run_<timestamp> subfolder
+
+    Returns:
+        The active StageProfiler
+    """
+    profiler = StageProfiler(os.path.join(directory, f"run_{datetime.now():%Y-%m-%d_%H%M%S}"))
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        try:
+            path = profiler.write_reports()
+            logger.info(f"✅ Profile written to {profiler.output_dir} (see {os.path.basename(path)})")
+        except OSError as e:
+            logger.error(f"❌ Could not write profile to {profiler.output_dir}: {e}")
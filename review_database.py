@@ -4,20 +4,61 @@ SQLite persistence for email reviews.
 
 import os
 import sqlite3
-from datetime import datetime
-from typing import Iterable, Dict
+import threading
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, Dict, List, Optional, Tuple
 
-from config import SQLITE_DB_PATH
+from config import (
+    SQLITE_DB_PATH, SQLITE_CACHE_SIZE_KB, SQLITE_BUSY_TIMEOUT_SECONDS, SQLITE_FTS_TOKENIZER, OUTBOX_LEASE_SECONDS,
+)
+from email_record import EmailRecord, as_record
+import metrics
+
+
+def _rows_to_dicts(cursor: sqlite3.Cursor) -> List[Dict]:
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def _fts_query(text: str) -> str:
+    """Quote each term so user input is matched literally (all terms must appear)."""
+    return " ".join('"' + term.replace('"', '""') + '"' for term in text.split())
 
 
 class ReviewDatabase:
     def __init__(self, db_path: str = SQLITE_DB_PATH):
         self.db_path = db_path
+        self._local = threading.local()
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
         self._init_schema()
 
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Return this thread's long-lived connection, opening it on first use.
+
+        WAL lets readers run alongside the pipeline's writer; synchronous=NORMAL
+        is durable across application crashes in WAL mode and avoids an fsync
+        per commit.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=SQLITE_BUSY_TIMEOUT_SECONDS)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """Close the calling thread's connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
     def _init_schema(self):
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             conn.execute(
                 """
                 CREATE TABLE IF NOT EXISTS email_reviews (
@@ -37,14 +78,187 @@ class ReviewDatabase:
                 )
                 """
             )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS mailbox_checkpoints (
+                    mailbox TEXT NOT NULL,
+                    folder TEXT NOT NULL,
+                    uidvalidity INTEGER NOT NULL,
+                    last_uid INTEGER NOT NULL,
+                    updated_at TEXT,
+                    PRIMARY KEY (mailbox, folder)
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    email_id TEXT UNIQUE,
+                    recipient TEXT NOT NULL,
+                    subject TEXT,
+                    body TEXT,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at TEXT,
+                    last_error TEXT,
+                    created_at TEXT,
+                    updated_at TEXT,
+                    sent_at TEXT
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_status_next ON outbox (status, next_attempt_at)")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS pipeline_runs (
+                    run_id TEXT PRIMARY KEY,
+                    scope TEXT NOT NULL,
+                    started_at TEXT,
+                    finished_at TEXT
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS pipeline_progress (
+                    run_id TEXT NOT NULL,
+                    email_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    stage TEXT NOT NULL,
+                    sender TEXT,
+                    subject TEXT,
+                    body TEXT,
+                    received_date TEXT,
+                    mailbox TEXT,
+                    folder TEXT,
+                    uidvalidity INTEGER,
+                    uid INTEGER,
+                    category TEXT,
+                    confidence REAL,
+                    suggested_reply TEXT,
+                    risk_flag TEXT,
+                    updated_at TEXT,
+                    PRIMARY KEY (run_id, email_id)
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_pipeline_progress_seq ON pipeline_progress (run_id, seq)")
+            self._ensure_review_columns(conn)
+            self._ensure_progress_columns(conn)
+            self._ensure_review_indexes(conn)
+            self._ensure_review_search(conn)
+            conn.commit()
+
+    def _ensure_review_columns(self, conn: sqlite3.Connection):
+        """Add columns introduced after the original schema to existing databases."""
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(email_reviews)")}
+        for column in ("fingerprint", "cluster_id"):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE email_reviews ADD COLUMN {column} TEXT")
+
+    def _ensure_progress_columns(self, conn: sqlite3.Connection):
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(pipeline_progress)")}
+        for column, column_type in (("folder", "TEXT"), ("uidvalidity", "INTEGER"), ("uid", "INTEGER")):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE pipeline_progress ADD COLUMN {column} {column_type}")
+
+    def _ensure_review_indexes(self, conn: sqlite3.Connection):
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_email_reviews_email_id'"
+        ).fetchone()
+        if not exists:
+            # Older databases keyed rows by per-session IMAP sequence numbers, so a repeated
+            # email_id is usually a different email from another day: give those rows
+            # unique ids rather than dropping them (and their review decisions)
+            conn.execute(
+                """
+                UPDATE email_reviews SET email_id = 'legacy:' || id
+                WHERE email_id IN (
+                    SELECT email_id FROM email_reviews
+                    WHERE email_id IS NOT NULL
+                    GROUP BY email_id HAVING COUNT(*) > 1
+                )
+                """
+            )
+            conn.execute("CREATE UNIQUE INDEX idx_email_reviews_email_id ON email_reviews (email_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_email_reviews_status ON email_reviews (status)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_email_reviews_category ON email_reviews (category)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_email_reviews_created_at ON email_reviews (created_at)")
+
+    def _ensure_review_search(self, conn: sqlite3.Connection):
+        """Create the FTS5 index over reviews and the triggers that keep it in sync."""
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'email_reviews_fts'"
+        ).fetchone()
+        conn.execute(
+            f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS email_reviews_fts USING fts5(
+                subject, original_body, suggested_reply,
+                content='email_reviews', content_rowid='id', tokenize='{SQLITE_FTS_TOKENIZER}'
+            )
+            """
+        )
+        conn.executescript(
+            """
+            CREATE TRIGGER IF NOT EXISTS email_reviews_fts_insert AFTER INSERT ON email_reviews BEGIN
+                INSERT INTO email_reviews_fts (rowid, subject, original_body, suggested_reply)
+                VALUES (new.id, new.subject, new.original_body, new.suggested_reply);
+            END;
+            CREATE TRIGGER IF NOT EXISTS email_reviews_fts_delete AFTER DELETE ON email_reviews BEGIN
+                INSERT INTO email_reviews_fts (email_reviews_fts, rowid, subject, original_body, suggested_reply)
+                VALUES ('delete', old.id, old.subject, old.original_body, old.suggested_reply);
+            END;
+            CREATE TRIGGER IF NOT EXISTS email_reviews_fts_update
+            AFTER UPDATE OF subject, original_body, suggested_reply ON email_reviews BEGIN
+                INSERT INTO email_reviews_fts (email_reviews_fts, rowid, subject, original_body, suggested_reply)
+                VALUES ('delete', old.id, old.subject, old.original_body, old.suggested_reply);
+                INSERT INTO email_reviews_fts (rowid, subject, original_body, suggested_reply)
+                VALUES (new.id, new.subject, new.original_body, new.suggested_reply);
+            END;
+            """
+        )
+        if not exists:
+            # Index rows written before search existed
+            conn.execute("INSERT INTO email_reviews_fts (email_reviews_fts) VALUES ('rebuild')")
+
+    def get_checkpoint(self, mailbox: str, folder: str) -> Optional[Tuple[int, int]]:
+        """Return ``(uidvalidity, last_uid)`` for a mailbox folder, or None if never synced."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT uidvalidity, last_uid FROM mailbox_checkpoints WHERE mailbox = ? AND folder = ?",
+                (mailbox, folder),
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def save_checkpoint(self, mailbox: str, folder: str, uidvalidity: int, last_uid: int):
+        updated_at = datetime.now().isoformat(timespec="seconds")
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO mailbox_checkpoints (
+                    mailbox, folder, uidvalidity, last_uid, updated_at
+                ) VALUES (?, ?, ?, ?, ?)
+                """,
+                (mailbox, folder, uidvalidity, last_uid, updated_at),
+            )
             conn.commit()
 
-    def save_reviews(self, reviews: Iterable[Dict]):
+    def save_reviews(self, reviews: Iterable[Dict], run_id: Optional[str] = None):
+        """
+        Upsert reviews keyed by email_id.
+
+        Re-running the pipeline refreshes the draft fields of rows that are
+        still pending review; reviewer status and notes are never overwritten.
+        Accepts EmailRecords (serialized directly) or review dicts. With a
+        ``run_id``, the emails are marked persisted in that run's progress in
+        the same transaction.
+        """
         reviews_list = list(reviews)
         if not reviews_list:
             return
         created_at = datetime.now().isoformat(timespec="seconds")
-        with sqlite3.connect(self.db_path) as conn:
+        with metrics.track("sqlite_write", emails=len(reviews_list)), self._connect() as conn:
             conn.executemany(
                 """
                 INSERT INTO email_reviews (
@@ -59,25 +273,426 @@ class ReviewDatabase:
                     reviewer_notes,
                     received_date,
                     risk_flag,
-                    created_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    created_at,
+                    fingerprint,
+                    cluster_id
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (email_id) DO UPDATE SET
+                    sender = excluded.sender,
+                    subject = excluded.subject,
+                    category = excluded.category,
+                    confidence = excluded.confidence,
+                    original_body = excluded.original_body,
+                    suggested_reply = excluded.suggested_reply,
+                    received_date = excluded.received_date,
+                    risk_flag = excluded.risk_flag,
+                    fingerprint = excluded.fingerprint,
+                    cluster_id = excluded.cluster_id
+                WHERE email_reviews.status = 'pending_review'
+                """,
+                [as_record(review).db_row(created_at) for review in reviews_list],
+            )
+            if run_id is not None:
+                conn.executemany(
+                    """
+                    UPDATE pipeline_progress SET stage = 'persisted', updated_at = ?
+                    WHERE run_id = ? AND email_id = ?
+                    """,
+                    [(created_at, run_id, review.get("id", "")) for review in reviews_list],
+                )
+            conn.commit()
+
+    def open_run(self, scope: str) -> Tuple[str, bool]:
+        """
+        Return ``(run_id, resumed)``: the unfinished run of ``scope`` if one
+        exists (the last one was interrupted), else a newly started run.
+        """
+        started_at = datetime.now().isoformat(timespec="microseconds")
+        with self._connect() as conn:
+            row = conn.execute(
+                """
+                SELECT run_id FROM pipeline_runs
+                WHERE scope = ? AND finished_at IS NULL
+                ORDER BY started_at DESC LIMIT 1
+                """,
+                (scope,),
+            ).fetchone()
+            if row:
+                return row[0], True
+            run_id = f"{scope}@{started_at}"
+            conn.execute(
+                "INSERT INTO pipeline_runs (run_id, scope, started_at) VALUES (?, ?, ?)", (run_id, scope, started_at)
+            )
+            conn.commit()
+        return run_id, False
+
+    def finish_run(self, run_id: str):
+        """Close a run and drop its per-email progress (the reviews stay in email_reviews)."""
+        finished_at = datetime.now().isoformat(timespec="seconds")
+        with self._connect() as conn:
+            conn.execute("UPDATE pipeline_runs SET finished_at = ? WHERE run_id = ?", (finished_at, run_id))
+            conn.execute("DELETE FROM pipeline_progress WHERE run_id = ?", (run_id,))
+            conn.commit()
+
+    def record_fetched(self, run_id: str, seq: int, email: Dict):
+        """Store a fetched email as the run's ``seq``-th; committed before the caller moves on."""
+        updated_at = datetime.now().isoformat(timespec="seconds")
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO pipeline_progress (
+                    run_id, email_id, seq, stage, sender, subject, body, received_date, mailbox,
+                    folder, uidvalidity, uid, updated_at
+                ) VALUES (?, ?, ?, 'fetched', ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (run_id, email_id) DO NOTHING
+                """,
+                (
+                    run_id, email.get("id", ""), seq, email.get("from", ""), email.get("subject", ""),
+                    email.get("body", ""), email.get("date", ""), email.get("mailbox"),
+                    email.get("folder"), email.get("uidvalidity"), email.get("uid"), updated_at,
+                ),
+            )
+            conn.commit()
+
+    def record_stage(self, run_id: str, reviews: Iterable[Dict], stage: str):
+        """Store the classification ("classified") or classification and draft ("drafted") of reviews."""
+        updated_at = datetime.now().isoformat(timespec="seconds")
+        with self._connect() as conn:
+            conn.executemany(
+                """
+                UPDATE pipeline_progress
+                SET stage = ?, category = ?, confidence = ?, suggested_reply = ?, risk_flag = ?, updated_at = ?
+                WHERE run_id = ? AND email_id = ?
                 """,
                 [
                     (
-                        review.get("id", ""),
-                        review.get("from", ""),
-                        review.get("subject", ""),
-                        review.get("category", ""),
-                        review.get("confidence", 0.0),
-                        review.get("body", ""),
-                        review.get("reply", ""),
-                        review.get("status", "pending_review"),
-                        review.get("reviewer_notes", ""),
-                        review.get("date", ""),
-                        review.get("risk_flag", ""),
-                        created_at,
+                        stage, review.get("category"), review.get("confidence"), review.get("reply"),
+                        review.get("risk_flag"), updated_at, run_id, review.get("id", ""),
                     )
-                    for review in reviews_list
+                    for review in reviews
                 ],
             )
             conn.commit()
+
+    def run_progress(self, run_id: str) -> Tuple[Dict[str, str], int]:
+        """Return ``({email_id: stage}, last seq)`` for a run."""
+        with self._connect() as conn:
+            stages = dict(conn.execute(
+                "SELECT email_id, stage FROM pipeline_progress WHERE run_id = ?", (run_id,)
+            ))
+            last_seq = conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM pipeline_progress WHERE run_id = ?", (run_id,)
+            ).fetchone()[0]
+        return stages, last_seq
+
+    def iter_unfinished(self, run_id: str) -> Iterator[EmailRecord]:
+        """
+        Yield a run's emails that were not persisted yet, in fetch order, with
+        the classification and draft of the stages they finished and the IMAP
+        location they were fetched from.
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT email_id, sender, subject, body, received_date, mailbox, folder, uidvalidity, uid,
+                       stage, category, confidence, suggested_reply, risk_flag
+                FROM pipeline_progress
+                WHERE run_id = ? AND stage != 'persisted'
+                ORDER BY seq
+                """,
+                (run_id,),
+            ).fetchall()
+        for (email_id, sender, subject, body, date, mailbox, folder, uidvalidity, uid,
+             stage, category, confidence, reply, risk) in rows:
+            record = EmailRecord(email_id, sender or "", subject or "", body or "", date or "")
+            if mailbox is not None:
+                record.mailbox = mailbox
+            if uid is not None:
+                record.folder, record.uidvalidity, record.uid = folder, uidvalidity, uid
+            if stage in ("classified", "drafted"):
+                record.category, record.confidence, record.risk_flag = category, confidence, risk
+            if stage == "drafted":
+                record.reply = reply
+            yield record
+
+    def iter_run_reviews(self, run_id: str) -> Iterator[EmailRecord]:
+        """Yield the stored reviews of a run's persisted emails, in fetch order."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT r.email_id, r.sender, r.subject, r.original_body, r.received_date, r.category,
+                       r.confidence, r.suggested_reply, r.risk_flag, r.fingerprint, r.cluster_id
+                FROM pipeline_progress p
+                JOIN email_reviews r ON r.email_id = p.email_id
+                WHERE p.run_id = ? AND p.stage = 'persisted'
+                ORDER BY p.seq
+                """,
+                (run_id,),
+            ).fetchall()
+        for email_id, sender, subject, body, date, *fields in rows:
+            record = EmailRecord(email_id, sender or "", subject or "", body or "", date or "")
+            (record.category, record.confidence, record.reply, record.risk_flag,
+             record.fingerprint, record.cluster_id) = fields
+            yield record
+
+    def apply_review_decisions(self, decisions: List[Tuple[str, str, str]]) -> Dict[str, object]:
+        """
+        Apply reviewer (email_id, status, reviewer_notes) decisions in one transaction.
+
+        Returns:
+            Dict with "changed", "unchanged" and "unknown" counts, plus
+            "approved": email_ids whose status changed to approved
+        """
+        result = {"changed": 0, "unchanged": 0, "unknown": 0, "approved": []}
+        if not decisions:
+            return result
+        email_ids = list({decision[0] for decision in decisions})
+        with self._connect() as conn:
+            current = {}
+            for start in range(0, len(email_ids), 500):
+                chunk = email_ids[start:start + 500]
+                current.update(
+                    (row[0], (row[1], row[2])) for row in conn.execute(
+                        f"SELECT email_id, status, reviewer_notes FROM email_reviews "
+                        f"WHERE email_id IN ({','.join('?' * len(chunk))})",
+                        chunk,
+                    )
+                )
+            updates = []
+            for email_id, status, notes in decisions:
+                if email_id not in current:
+                    result["unknown"] += 1
+                    continue
+                old_status, old_notes = current[email_id]
+                if (old_status or "", old_notes or "") == (status, notes):
+                    result["unchanged"] += 1
+                    continue
+                result["changed"] += 1
+                if status == "approved" and old_status != "approved":
+                    result["approved"].append(email_id)
+                current[email_id] = (status, notes)
+                updates.append((status, notes, email_id))
+            conn.executemany(
+                "UPDATE email_reviews SET status = ?, reviewer_notes = ? WHERE email_id = ?", updates
+            )
+            conn.commit()
+        return result
+
+    def recent_fingerprints(self, since: str) -> List[Dict]:
+        """Fingerprinted, non-rejected reviews created since ``since`` (ISO), oldest first."""
+        with self._connect() as conn:
+            return _rows_to_dicts(conn.execute(
+                """
+                SELECT email_id, fingerprint, cluster_id, category, confidence, suggested_reply,
+                       sender, subject, original_body, received_date
+                FROM email_reviews
+                WHERE created_at >= ? AND fingerprint IS NOT NULL AND status != 'rejected'
+                ORDER BY id
+                """,
+                (since,),
+            ))
+
+    def labeled_reviews(self, statuses: Iterable[str]) -> List[Tuple[str, str, str]]:
+        """(subject, original_body, category) for reviews in ``statuses``, oldest first."""
+        statuses = list(statuses)
+        if not statuses:
+            return []
+        with self._connect() as conn:
+            return conn.execute(
+                f"""
+                SELECT COALESCE(subject, ''), COALESCE(original_body, ''), category
+                FROM email_reviews
+                WHERE status IN ({", ".join("?" * len(statuses))}) AND category IS NOT NULL
+                ORDER BY id
+                """,
+                statuses,
+            ).fetchall()
+
+    def get_review(self, email_id: str) -> Optional[Dict]:
+        """Look up a stored review by email_id (uses the unique index)."""
+        with self._connect() as conn:
+            rows = _rows_to_dicts(conn.execute("SELECT * FROM email_reviews WHERE email_id = ?", (email_id,)))
+        return rows[0] if rows else None
+
+    def count_by_status(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM email_reviews GROUP BY status").fetchall())
+
+    def query_reviews(self, status: Optional[str] = None, category: Optional[str] = None,
+                      risk_flag: Optional[str] = None, since: Optional[str] = None,
+                      until: Optional[str] = None, limit: int = 50,
+                      cursor: Optional[int] = None) -> Tuple[List[Dict], Optional[int]]:
+        """
+        Page through stored reviews, newest first.
+
+        Args:
+            status / category / risk_flag: Exact-match filters
+            since / until: ISO timestamps bounding created_at (inclusive / exclusive)
+            limit: Page size
+            cursor: ``next_cursor`` from the previous page
+
+        Returns:
+            Tuple of (rows, next_cursor); next_cursor is None on the last page
+        """
+        clauses, params = [], []
+        for column, value in (("status", status), ("category", category), ("risk_flag", risk_flag)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until:
+            clauses.append("created_at < ?")
+            params.append(until)
+        if cursor is not None:
+            clauses.append("id < ?")
+            params.append(cursor)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._connect() as conn:
+            rows = _rows_to_dicts(conn.execute(
+                f"SELECT * FROM email_reviews {where} ORDER BY id DESC LIMIT ?", (*params, limit)
+            ))
+        next_cursor = rows[-1]["id"] if len(rows) == limit else None
+        return rows, next_cursor
+
+    def search_reviews(self, text: str, status: Optional[str] = None, limit: int = 20,
+                       cursor: Optional[int] = None) -> Tuple[List[Dict], Optional[int]]:
+        """
+        Full-text search over subject, original body and suggested reply, newest first.
+
+        Returns:
+            Tuple of (rows, next_cursor) as in query_reviews
+        """
+        match = _fts_query(text)
+        if not match:
+            return [], None
+        clauses, params = ["email_reviews_fts MATCH ?"], [match]
+        if cursor is not None:
+            clauses.append("email_reviews_fts.rowid < ?")
+            params.append(cursor)
+        if status is not None:
+            clauses.append("r.status = ?")
+            params.append(status)
+        with self._connect() as conn:
+            rows = _rows_to_dicts(conn.execute(
+                f"""
+                SELECT r.* FROM email_reviews_fts
+                JOIN email_reviews AS r ON r.id = email_reviews_fts.rowid
+                WHERE {' AND '.join(clauses)}
+                ORDER BY email_reviews_fts.rowid DESC
+                LIMIT ?
+                """,
+                (*params, limit),
+            ))
+        next_cursor = rows[-1]["id"] if len(rows) == limit else None
+        return rows, next_cursor
+
+    # Outbox: queued -> sending -> sent | failed (or back to queued for a retry).
+    # A row is committed as 'sending' before SMTP is contacted, so a crash can
+    # leave it there but never causes it to be picked up and sent twice.
+
+    def enqueue_outbox(self, messages: Iterable[Dict]) -> int:
+        """Queue reply messages for sending; messages already in the outbox are skipped."""
+        now = datetime.now().isoformat(timespec="seconds")
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                """
+                INSERT OR IGNORE INTO outbox (
+                    email_id, recipient, subject, body, status, attempts,
+                    next_attempt_at, created_at, updated_at
+                ) VALUES (?, ?, ?, ?, 'queued', 0, ?, ?, ?)
+                """,
+                [
+                    (message.get("id"), message["to"], message.get("subject", ""), message.get("body", ""), now, now, now)
+                    for message in messages
+                ],
+            )
+            conn.commit()
+            return conn.total_changes - before
+
+    def claim_outbox(self, limit: int = 1) -> List[Dict]:
+        """
+        Atomically move up to ``limit`` due queued messages to 'sending' and return them.
+
+        updated_at records when the claim was taken, which starts its lease (see recover_outbox).
+        """
+        now = datetime.now().isoformat(timespec="seconds")
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.execute(
+                """
+                SELECT * FROM outbox
+                WHERE status = 'queued' AND next_attempt_at <= ?
+                ORDER BY next_attempt_at, id
+                LIMIT ?
+                """,
+                (now, limit),
+            )
+            rows = _rows_to_dicts(cursor)
+            conn.executemany(
+                "UPDATE outbox SET status = 'sending', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                [(now, row["id"]) for row in rows],
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return [{**row, "status": "sending", "attempts": row["attempts"] + 1} for row in rows]
+
+    def mark_outbox_sent(self, outbox_id: int):
+        now = datetime.now().isoformat(timespec="seconds")
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE outbox SET status = 'sent', last_error = NULL, sent_at = ?, updated_at = ? WHERE id = ?",
+                (now, now, outbox_id),
+            )
+            conn.commit()
+
+    def mark_outbox_retry(self, outbox_id: int, error: str, next_attempt_at: datetime):
+        now = datetime.now().isoformat(timespec="seconds")
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE outbox SET status = 'queued', last_error = ?, next_attempt_at = ?, updated_at = ? WHERE id = ?",
+                (error, next_attempt_at.isoformat(timespec="seconds"), now, outbox_id),
+            )
+            conn.commit()
+
+    def mark_outbox_failed(self, outbox_id: int, error: str):
+        now = datetime.now().isoformat(timespec="seconds")
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE outbox SET status = 'failed', last_error = ?, updated_at = ? WHERE id = ?",
+                (error, now, outbox_id),
+            )
+            conn.commit()
+
+    def recover_outbox(self, lease_seconds: float = OUTBOX_LEASE_SECONDS) -> int:
+        """
+        Fail messages left in 'sending' by a crashed worker.
+
+        Only claims older than ``lease_seconds`` are touched, so a message another
+        live worker is still sending is left alone. Whether the server accepted
+        them is unknown, so they are not retried automatically; requeue them by
+        hand after checking the sent folder.
+        """
+        now = datetime.now()
+        expired = (now - timedelta(seconds=lease_seconds)).isoformat(timespec="seconds")
+        with self._connect() as conn:
+            cursor = conn.execute(
+                """
+                UPDATE outbox
+                SET status = 'failed', last_error = 'interrupted while sending; not retried to avoid a duplicate',
+                    updated_at = ?
+                WHERE status = 'sending' AND updated_at < ?
+                """,
+                (now.isoformat(timespec="seconds"), expired),
+            )
+            conn.commit()
+            return cursor.rowcount
+
+    def outbox_counts(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
@@ -0,0 +1,83 @@
+"""
+Per-email stage checkpoints that make a pipeline run resumable.
+
+Each email is recorded in SQLite when it is fetched, classified, drafted and
+persisted. If a run dies part-way, the next run of the same scope picks up the
+open run: emails that were persisted are skipped, the unfinished ones are
+replayed from the journal (keeping the classification and draft they already
+have), and only then does fetching continue. The review CSV is regenerated
+from the database once the run completes.
+"""
+
+from typing import Callable, Iterable, Iterator, List, Optional
+
+from email_record import EmailRecord
+from review_database import ReviewDatabase
+
+
+class RunJournal:
+    """
+    Stage checkpoints of one pipeline run
+
+    Args:
+        review_db: Database holding the journal and the reviews
+        scope: Runs of the same scope resume each other (e.g. one per mailbox)
+    """
+
+    def __init__(self, review_db: ReviewDatabase, scope: str = "default"):
+        self.review_db = review_db
+        self.scope = scope
+        self.run_id, self.resumed = review_db.open_run(scope)
+        # email_id -> last finished stage, for every email this run has seen
+        self._stages, self._seq = review_db.run_progress(self.run_id) if self.resumed else ({}, 0)
+        self.finished = sum(1 for stage in self._stages.values() if stage == "persisted")
+        self.unfinished = len(self._stages) - self.finished
+        self._replayed = False
+
+    def pending(self) -> Iterator[EmailRecord]:
+        """Yield the emails an interrupted run fetched but did not persist, in fetch order (once)."""
+        if self.unfinished and not self._replayed:
+            self._replayed = True
+            yield from self.review_db.iter_unfinished(self.run_id)
+
+    def track(self, emails: Iterable, on_persisted: Optional[Callable[[List], None]] = None) -> Iterator:
+        """
+        Record each email as fetched before yielding it, skipping emails this run has already seen
+
+        The record (including the email's folder and UID) is committed before
+        the email is processed, so an email pending() replays can still be
+        flagged \\Seen and checkpointed once it is persisted.
+
+        Args:
+            emails: Freshly fetched emails
+            on_persisted: Called with each skipped email the run already persisted
+                (e.g. EmailReceiver.mark_processed, in case its flags never reached the server)
+        """
+        for email in emails:
+            email_id = email.get("id", "")
+            if email_id in self._stages:
+                if on_persisted and self._stages[email_id] == "persisted":
+                    on_persisted([email])
+                continue
+            self._seq += 1
+            self.review_db.record_fetched(self.run_id, self._seq, email)
+            self._stages[email_id] = "fetched"
+            yield email
+
+    def classified(self, reviews: List):
+        self.review_db.record_stage(self.run_id, reviews, "classified")
+
+    def drafted(self, reviews: List):
+        self.review_db.record_stage(self.run_id, reviews, "drafted")
+
+    def save(self, reviews: List):
+        """Persist reviews and mark them finished, in one transaction."""
+        self.review_db.save_reviews(reviews, run_id=self.run_id)
+
+    def reviews(self) -> List[EmailRecord]:
+        """All reviews the run persisted (including before an interruption), in fetch order."""
+        return list(self.review_db.iter_run_reviews(self.run_id))
+
+    def finish(self):
+        self.review_db.finish_run(self.run_id)
+